@@ -0,0 +1,163 @@
+"""
+A content-addressed store for checkpoint backups.
+
+The restart files are cut into chunks at content-defined boundaries (a gear rolling hash over a 32-byte window, so
+that an insertion or a deletion only changes the chunks around it), and each chunk is stored once under its SHA-256
+digest. A backup is then just the list of the digests of its chunks, kept in the backup manifest of the simulation.
+Identical checkpoints of the simulations of a parameter sweep, and the unchanged parts of successive checkpoints of a
+simulation, are stored only once.
+
+Chunks that are no longer referenced by any backup are deleted by gc().
+"""
+
+import os
+import time
+import hashlib
+import numpy as np
+
+
+class ChunkStore(object):
+
+    DIR_NAME = ".simon_chunks"  # the name of the directory of the store, under the root directory of the simulations
+    WINDOW = 32  # the width of the window of the rolling hash, in bytes
+
+    # random 32-bit values for each byte value, fixed so that the boundaries are the same across versions
+    GEAR = np.random.RandomState(0x5131).randint(0, 2 ** 32, size=256, dtype=np.uint64).astype(np.uint32)
+
+    def __init__(self, store_dir, avg_chunk_size=1024 * 1024, min_chunk_size=None, max_chunk_size=None,
+                 read_size=8 * 1024 * 1024):
+        """
+        :param store_dir: The directory of the store (created if it does not exist).
+        :param avg_chunk_size: The average chunk size, in bytes (rounded to a power of two).
+        :param min_chunk_size: The minimum chunk size [Default: avg_chunk_size / 4].
+        :param max_chunk_size: The maximum chunk size [Default: avg_chunk_size * 4].
+        :param read_size: The size of the blocks in which the files are read.
+        """
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        bits = max(int(round(np.log2(avg_chunk_size))), 1)
+        # the high bits of the gear hash depend on the whole window
+        self.mask = np.uint32(((1 << bits) - 1) << (32 - bits))
+        self.min_chunk_size = min_chunk_size if min_chunk_size is not None else (1 << bits) // 4
+        self.max_chunk_size = max_chunk_size if max_chunk_size is not None else (1 << bits) * 4
+        self.read_size = read_size
+        self.last_gc = 0
+
+    def get_chunk_path(self, digest):
+        return os.path.join(self.store_dir, digest[:2], digest[2:])
+
+    def find_boundaries(self, data, context):
+        """
+        :param data: The bytes to scan.
+        :param context: The (up to WINDOW - 1) bytes preceding `data`.
+        :return: The positions in `data` after which the hash allows a chunk boundary.
+        """
+        buf = np.frombuffer(context + data, dtype=np.uint8)
+        # The gear hash of byte i is sum_k GEAR[b[i - k]] << k over the window (mod 2**32). It is computed by
+        # doubling the span of partial sums, in log2(WINDOW) vectorized steps instead of WINDOW.
+        h = self.GEAR[buf]
+        shifted = np.empty_like(h)
+        n = len(h)
+        span = 1
+        while span < min(self.WINDOW, n):
+            np.left_shift(h[:n - span], np.uint32(span), out=shifted[:n - span])
+            np.add(h[span:], shifted[:n - span], out=h[span:])
+            span *= 2
+        candidates = np.flatnonzero((h[len(context):] & self.mask) == 0)
+        return candidates
+
+    def iter_chunks(self, path):
+        """
+        Cut a file into content-defined chunks, reading it in blocks.
+
+        :return: An iterator over the chunks (bytes).
+        """
+        pending = b""  # the bytes read but not yet emitted
+        context = b""  # the bytes preceding `pending`
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(self.read_size)
+                data = pending + block
+                start = 0
+                for pos in self.find_boundaries(data, context) if len(block) > 0 else ():
+                    end = int(pos) + 1
+                    while end - start > self.max_chunk_size:
+                        yield data[start:start + self.max_chunk_size]
+                        start += self.max_chunk_size
+                    if end - start >= self.min_chunk_size:
+                        yield data[start:end]
+                        start = end
+                while len(data) - start > self.max_chunk_size:
+                    yield data[start:start + self.max_chunk_size]
+                    start += self.max_chunk_size
+                if len(block) == 0:
+                    if start < len(data):
+                        yield data[start:]
+                    return
+                context = (context + data[:start])[-(self.WINDOW - 1):]
+                pending = data[start:]
+
+    def put(self, path):
+        """
+        Store a file in the store.
+
+        :return: A tuple (chunks, n_written): the list of [digest, size] of the chunks of the file, and the number of
+        bytes actually written to the store (i.e. of the chunks that were not already stored).
+        """
+        chunks = []
+        n_written = 0
+        for chunk in self.iter_chunks(path):
+            digest = hashlib.sha256(chunk).hexdigest()
+            chunks.append([digest, len(chunk)])
+            chunk_path = self.get_chunk_path(digest)
+            try:
+                # refresh the timestamp of a shared chunk, so that a concurrent gc() does not consider it unused
+                os.utime(chunk_path)
+            except OSError:
+                os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+                tmp_path = "%s.%d.tmp" % (chunk_path, os.getpid())
+                with open(tmp_path, "wb") as f:
+                    f.write(chunk)
+                os.replace(tmp_path, chunk_path)
+                n_written += len(chunk)
+        return chunks, n_written
+
+    def get(self, chunks, dst):
+        """
+        Reassemble a file from its chunks. The file is written to a temporary file and renamed.
+        """
+        with open(dst + ".tmp", "wb") as f:
+            for digest, size in chunks:
+                with open(self.get_chunk_path(digest), "rb") as f_chunk:
+                    data = f_chunk.read()
+                if len(data) != size:
+                    raise IOError("Chunk %s is corrupted" % digest)
+                f.write(data)
+        os.replace(dst + ".tmp", dst)
+
+    def gc(self, live_digests, grace_time=3600):
+        """
+        Delete the chunks that are not referenced anymore. Chunks modified (or reused) within the last `grace_time`
+        seconds are kept, as they may belong to a backup that is being written.
+
+        :param live_digests: The set of the digests of the chunks referenced by the backups.
+        :return: The number of bytes freed.
+        """
+        self.last_gc = time.time()
+        n_freed = 0
+        for prefix in os.listdir(self.store_dir):
+            prefix_dir = os.path.join(self.store_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            with os.scandir(prefix_dir) as entries:
+                for entry in entries:
+                    if prefix + entry.name in live_digests:
+                        continue
+                    try:
+                        st = entry.stat()
+                        if self.last_gc - st.st_mtime > grace_time:
+                            os.remove(entry.path)
+                            n_freed += st.st_size
+                    except OSError:
+                        pass
+        return n_freed
@@ -25,6 +25,18 @@ Error_file = "%s"
 # The name of the file used to restart the simulation
 Restart_file = "%s"
 
+# Compare a hash of samples of the restart file (in addition to its size and modification time) to decide whether it has
+# changed since the last backup
+Backup_hash = %s
+
+# Compress the backups of the restart file: "none", "gzip" or "zstd" (requires the zstandard package)
+Backup_compression = "%s"
+
+# Time-tiered retention of the backups, as a list of [max_age, spacing] pairs (in seconds, max_age = 0: no limit), e.g.
+# [[3600, 0], [86400, 3600], [0, 86400]] keeps all backups of the last hour, hourly ones for a day, then daily ones.
+# If empty, the newest 20 backups are kept
+Backup_retention = %s
+
 # The timestamp indicating the starting time of the simulation
 Timestamp_started = %f
 
@@ -34,6 +46,11 @@ Timestamp_last_updated = %f
 # The time (in second) beyond which a simulation is considered as stalled
 Stall_time = %d
 
+# How stalls are detected: "mtime" (no update of the output file for Stall_time seconds) or "rate" (the model time has
+# not advanced for Stall_factor times the longest gap between two advances in the recent history of the simulation)
+Stall_detection = "%s"
+Stall_factor = %g
+
 # The starting time
 T_start = %f
 
@@ -57,6 +74,15 @@ Stop_command = "%s"
 
 # The maximum number of times a simulation will be restarted (a simulation is marked as ERROR when exceeding this limit)
 Max_restarts = %d
+
+# The number of CPU cores used by the simulation (taken into account by the "resource" scheduler)
+Cores = %g
+
+# The memory (in GB) used by the simulation (taken into account by the "resource" scheduler)
+Memory_GB = %g
+
+# The estimated run time (in seconds) of the simulation, longer simulations are started first among equal priorities
+Walltime_estimate = %g
     """
 
     def __init__(self, conf_file):
@@ -123,6 +149,14 @@ Max_restarts = %d
         stop_cmd=None,
         niceness=0,
         max_restarts=None,
+        cores=1,
+        memory_gb=0,
+        walltime_estimate=0,
+        stall_detection=None,
+        stall_factor=None,
+        backup_hash=False,
+        backup_compression="none",
+        backup_retention=None,
     ):
         """
         Generate the initial condition of a simulation and write it to the given directory.
@@ -142,12 +176,25 @@ Max_restarts = %d
         :param niceness: The priority of the simulation, -20 to 19, lower are higher (optional, default: 0)
         :param max_restarts: The maximum number of attempts a simulation will be restarted, beyond which the simulation
                              is considered ERROR
+        :param cores: The number of CPU cores used by the simulation (optional, default: 1)
+        :param memory_gb: The memory (in GB) used by the simulation (optional, default: 0)
+        :param walltime_estimate: The estimated run time of the simulation in seconds (optional, default: 0)
+        :param stall_detection: The stall detector, "mtime" or "rate" (optional, default: from the global config)
+        :param stall_factor: The tolerance of the "rate" stall detector (optional, default: from the global config)
+        :param backup_hash: Whether to hash samples of the restart file to detect changes (optional, default: False)
+        :param backup_compression: The compression of the backups, "none", "gzip" or "zstd" (optional, default: "none")
+        :param backup_retention: The time-tiered retention policy of the backups, a list of (max_age, spacing) pairs
+                                 (optional, default: keep the newest 20 backups)
         :return: return 0 if succeed, -1 if failed.
         """
         if max_restarts is None:
             max_restarts = self.config['SiMon']['Max_restarts']
         if t_stall is None:
             t_stall = self.config['SiMon']['Stall_time']
+        if stall_detection is None:
+            stall_detection = self.config['SiMon'].get('Stall_detection', 'mtime')
+        if stall_factor is None:
+            stall_factor = self.config['SiMon'].get('Stall_factor', 5)
         if not os.path.isdir(os.path.join(self.config['SiMon']['Root_dir'], output_dir)):
             print(
                 "Creating directory: %s" % os.path.join(self.config['SiMon']['Root_dir'], output_dir)
@@ -164,9 +211,14 @@ Max_restarts = %d
                 output_file,
                 error_file,
                 restart_file,
+                "true" if backup_hash else "false",
+                backup_compression,
+                "[%s]" % ", ".join("[%d, %d]" % tuple(tier) for tier in (backup_retention or [])),
                 0,  # timestamp started
                 0,  # timestamp last modified
                 t_stall,
+                stall_detection,
+                stall_factor,
                 t_start,
                 t_end,
                 0,  # UNIX process ID (PID)
@@ -175,6 +227,9 @@ Max_restarts = %d
                 restart_cmd,
                 stop_cmd,
                 max_restarts,
+                cores,
+                memory_gb,
+                walltime_estimate,
             )
-        )  # max_restarts
+        )
         conf_file.close()
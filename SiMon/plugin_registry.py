@@ -0,0 +1,195 @@
+"""
+The registry of the simulation code modules (plugins).
+
+A plugin provides a subclass of Simulation for a simulation code, and declares the name of the code (the `Code_name`
+in the config files of the simulations) in its `__simulation__` attribute. Plugins are discovered in two ways:
+
+- files matching `module_*.py` in the SiMon package directory and in the current directory, and
+- entry points of installed packages in the group `simon.simulations`, named after the code, e.g. in setup.py::
+
+    entry_points={"simon.simulations": ["MyCode = mypackage.mycode:MyCode"]}
+
+Discovery does not import the plugin files: their `__simulation__` is read from the source, and the result is cached on
+disk, keyed by the modification times of the files (and of the directories where packages are installed), so that
+only new or modified plugins are read again. The classes are imported once per process, when first needed, without
+modifying sys.path.
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import importlib
+import importlib.util
+
+
+SIMULATION_NAME_REGEX = re.compile(r"""^__simulation__\s*=\s*["']([^"']+)["']""", re.MULTILINE)
+
+ENTRY_POINT_GROUP = "simon.simulations"
+
+# the classes resolved in this process ((kind, target, code name) => class), shared by all registries
+resolved_classes = dict()
+
+
+def get_cache_file():
+    """
+    :return: The default location of the discovery cache.
+    """
+    cache_dir = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(cache_dir, "simon", "plugin_registry.json")
+
+
+class PluginRegistry(object):
+
+    def __init__(self, module_dirs, module_pattern="module_*.py", cache_file=None, use_entry_points=True) -> None:
+        """
+        :param module_dirs: The directories in which the plugin files are searched.
+        :param module_pattern: The file name pattern of the plugin files.
+        :param cache_file: The file in which the discovery is cached [Default: see get_cache_file()]. If the file
+        cannot be written, the plugins are discovered again by each process.
+        :param use_entry_points: Also discover the plugins registered as entry points by installed packages.
+        """
+        self.module_dirs = list(dict.fromkeys(os.path.abspath(d) for d in module_dirs))  # unique, in order
+        self.module_pattern = module_pattern
+        self.cache_file = cache_file if cache_file is not None else get_cache_file()
+        self.use_entry_points = use_entry_points
+        self.plugins = dict()  # code name => ("file", path) or ("entry_point", "module:attribute")
+
+    def load_cache(self):
+        try:
+            with open(self.cache_file) as f:
+                cache = json.load(f)
+            if isinstance(cache.get("files"), dict):
+                return cache
+        except (IOError, OSError, ValueError, AttributeError):
+            pass
+        return {"files": dict(), "entry_points": None}
+
+    def save_cache(self, cache):
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_fn = "%s.%d.tmp" % (self.cache_file, os.getpid())
+            with open(tmp_fn, "w") as f:
+                json.dump(cache, f)
+            os.replace(tmp_fn, self.cache_file)
+        except (IOError, OSError):
+            pass  # e.g. read-only home directory
+
+    @staticmethod
+    def get_file_key(path):
+        st = os.stat(path)
+        return [st.st_mtime_ns, st.st_size]
+
+    @staticmethod
+    def get_entry_points_key():
+        """
+        :return: The modification times of the package directories on sys.path, which change when packages are
+        installed or removed.
+        """
+        key = []
+        for path in sys.path:
+            if os.path.basename(path) not in ("site-packages", "dist-packages"):
+                continue
+            try:
+                key.append([path, os.stat(path).st_mtime_ns])
+            except OSError:
+                pass
+        return key
+
+    @staticmethod
+    def read_simulation_name(path):
+        """
+        :return: The value of `__simulation__` in the source of a plugin file, or None if it is not a plugin.
+        """
+        try:
+            with open(path) as f:
+                res = SIMULATION_NAME_REGEX.search(f.read())
+        except (IOError, OSError, UnicodeDecodeError):
+            return None
+        return res.group(1) if res is not None else None
+
+    @staticmethod
+    def find_entry_points():
+        """
+        :return: A dict mapping the code names to the entry points ("module:attribute") registered by installed packages.
+        """
+        try:
+            from importlib import metadata
+        except ImportError:
+            return dict()
+        eps = metadata.entry_points()
+        if hasattr(eps, "select"):
+            eps = eps.select(group=ENTRY_POINT_GROUP)
+        else:
+            eps = eps.get(ENTRY_POINT_GROUP, [])  # Python < 3.10
+        return dict((ep.name, ep.value) for ep in eps)
+
+    def discover(self):
+        """
+        Discover the plugins, using the cache for the files that have not changed.
+
+        :return: A dict mapping the code names to the plugins.
+        """
+        cache = self.load_cache()
+        modified = False
+        plugins = dict()
+        if self.use_entry_points:
+            key = self.get_entry_points_key()
+            cached = cache.get("entry_points")
+            if cached is None or cached.get("key") != key:
+                cached = {"key": key, "plugins": self.find_entry_points()}
+                cache["entry_points"] = cached
+                modified = True
+            for code_name, value in cached["plugins"].items():
+                plugins[code_name] = ("entry_point", value)
+        # the plugin files take precedence over the entry points, the last directory over the first ones
+        for module_dir in self.module_dirs:
+            for path in sorted(glob.glob(os.path.join(module_dir, self.module_pattern))):
+                try:
+                    key = self.get_file_key(path)
+                except OSError:
+                    continue
+                cached = cache["files"].get(path)
+                if cached is None or cached.get("key") != key:
+                    cached = {"key": key, "code_name": self.read_simulation_name(path)}
+                    cache["files"][path] = cached
+                    modified = True
+                if cached["code_name"] is not None:
+                    plugins[cached["code_name"]] = ("file", path)
+        if modified:
+            self.save_cache(cache)
+        self.plugins = plugins
+        return plugins
+
+    def get_class(self, code_name):
+        """
+        Get the Simulation class of a simulation code. The class is imported on the first call in the process.
+
+        :return: The class, or None if there is no plugin for the code.
+        """
+        if code_name not in self.plugins:
+            return None
+        kind, target = self.plugins[code_name]
+        if (kind, target, code_name) in resolved_classes:
+            return resolved_classes[(kind, target, code_name)]
+        if kind == "file":
+            module_name = os.path.splitext(os.path.basename(target))[0]
+            module = sys.modules.get(module_name)
+            if module is None or os.path.abspath(getattr(module, "__file__", "") or "") != target:
+                spec = importlib.util.spec_from_file_location(module_name, target)
+                module = importlib.util.module_from_spec(spec)
+                sys.modules[module_name] = module
+                try:
+                    spec.loader.exec_module(module)
+                except BaseException:
+                    del sys.modules[module_name]
+                    raise
+            sim_class = getattr(module, code_name)
+        else:
+            module_name, _, attribute = target.partition(":")
+            sim_class = importlib.import_module(module_name)
+            for name in (attribute or code_name).split("."):
+                sim_class = getattr(sim_class, name)
+        resolved_classes[(kind, target, code_name)] = sim_class
+        return sim_class
@@ -3,82 +3,341 @@ from SiMon.scheduler import Scheduler
 from SiMon.simulation import Simulation
 from SiMon.simulation_container import SimulationContainer
 from SiMon import config 
+from SiMon import utilities
 import os 
-import numpy as np 
+import heapq
+from concurrent.futures import ThreadPoolExecutor
 
 
 class PriorityScheduler(Scheduler):
 
     def __init__(self, container: SimulationContainer = None, logger: Logger = None, config: dict = None, callbacks: list = None ) -> None:
         super().__init__(container, logger, config, callbacks)
+        self.pending_actions = []  # the actions decided by dispatch(), to be carried out by run_actions()
+        self.run_queue = []  # heap of (niceness, ID) of the simulations waiting to be started or restarted
+        self.queue_keys = dict()  # ID => the valid run queue entry of the simulation
+        self.active_ids = set()  # the IDs of the running or stalled simulations
+        self.max_jobs = int(self.config.get('Max_concurrent_jobs', 2)) if self.config is not None else 2
+        # the effective limit on the number of jobs, adapted to the load of the node if Adaptive_concurrency is set
+        self.concurrency_limit = self.max_jobs
+        self.executor = None
+        probe_workers = int(self.config.get('Probe_workers', 1)) if self.config is not None else 1
+        if probe_workers > 1:
+            # probe the simulations and carry out the actions in parallel (mostly waiting for file system I/O)
+            self.executor = ThreadPoolExecutor(max_workers=probe_workers)
+            if self.container is not None:
+                self.container.executor = self.executor
     
-    def schedule(self):
+    def schedule(self, full_rescan=False):
         """
         Schedule the simulations based on their priorities.
+
+        :param full_rescan: Rebuild the simulation tree by walking the whole root directory.
         """
-        super().schedule()
+        Simulation.new_status_cycle()
+        super().schedule(full_rescan)
 
-        self.container.build_simulation_tree()
-        schedule_list = []
-        # Sort jobs according to priority (niceness)
-        sim_niceness_vec = []
-        sim_id_vec = []
+        self.container.build_simulation_tree(full_rescan=full_rescan)
+        self.update_queue()
 
         # check how many simulations are running
+        concurrent_jobs = self.count_running_jobs()
+        self.update_concurrency_limit(self.get_job_count(concurrent_jobs))
+
+        # back up the running simulations and kill the stalled ones
+        for sim_id in sorted(self.active_ids):
+            concurrent_jobs = self.dispatch(self.container.sim_inst_dict[sim_id], concurrent_jobs)
+        # start or restart simulations in the order of priority (niceness), as long as there are free slots
+        concurrent_jobs = self.dispatch_queued(concurrent_jobs)
+        self.run_actions()
+        self.logger.info(
+            "SiMon routine checking completed. Machine load: %s" % self.format_load(concurrent_jobs)
+        )
+
+    @staticmethod
+    def is_runnable(inst):
+        """
+        :return: True if the simulation is waiting to be started (NEW) or restarted (a crashed top-level simulation).
+        """
+        return inst.status == Simulation.STATUS_NEW or (inst.status == Simulation.STATUS_STOP and inst.level == 1)
+
+    def update_queue(self):
+        """
+        Update the run queue and the set of active (running or stalled) simulations with the simulations that have
+        changed since the last update. The run queue is a heap of (niceness, ID) entries; entries that are no longer
+        valid are skipped when they are popped.
+        """
+        changed_ids = self.container.pop_changed_simulations()
+        if changed_ids is None:
+            # rebuild everything
+            self.queue_keys.clear()
+            self.active_ids.clear()
+            self.run_queue = []
+            changed_ids = self.get_candidate_ids()
+        for sim_id in changed_ids:
+            inst = self.container.sim_inst_dict.get(sim_id)
+            if inst is None or inst.id == 0:
+                self.queue_keys.pop(sim_id, None)
+                self.active_ids.discard(sim_id)
+                continue
+            if inst.status in (Simulation.STATUS_RUN, Simulation.STATUS_STALL):
+                self.active_ids.add(sim_id)
+            else:
+                self.active_ids.discard(sim_id)
+            if self.is_runnable(inst):
+                key = self.get_queue_key(inst)
+                if self.queue_keys.get(sim_id) != key:
+                    self.queue_keys[sim_id] = key
+                    heapq.heappush(self.run_queue, key)
+            else:
+                self.queue_keys.pop(sim_id, None)
+        if len(self.run_queue) > 2 * len(self.queue_keys) + 64:
+            # drop the invalid entries
+            self.run_queue = list(self.queue_keys.values())
+            heapq.heapify(self.run_queue)
+
+    def get_candidate_ids(self):
+        """
+        Select the simulations that may be active (running or stalled) or runnable, to rebuild the run queue (when the
+        tree has been restored or rebuilt, see SimulationContainer.build_simulation_tree()). With a state store, they
+        are selected by indexed queries on the status instead of looking at every simulation.
+
+        :return: The IDs of the candidates.
+        """
+        state_store = self.container.state_store
+        if state_store is None:
+            return self.container.sim_inst_dict.keys()
+        rows = (
+            state_store.query(status=(Simulation.STATUS_RUN, Simulation.STATUS_STALL))
+            + state_store.query(status=Simulation.STATUS_NEW)
+            + state_store.query(status=Simulation.STATUS_STOP, level=1)
+        )
+        sim_inst_parent_dict = self.container.sim_inst_parent_dict
+        return [sim_inst_parent_dict[row["path"]].id for row in rows if row["path"] in sim_inst_parent_dict]
+
+    def get_queue_key(self, inst):
+        """
+        :return: The run queue entry of a simulation. Entries are popped in ascending order, the last element must
+        be the ID of the simulation.
+        """
+        return (inst.niceness, inst.id)
+
+    def can_start(self, sim, concurrent_jobs):
+        """
+        :return: True if the machine has enough capacity left to start `sim`.
+        """
+        return concurrent_jobs < self.concurrency_limit
+
+    def add_job(self, sim, concurrent_jobs):
+        """
+        :return: The machine load after starting `sim`.
+        """
+        return concurrent_jobs + 1
+
+    def is_full(self, concurrent_jobs):
+        """
+        :return: True if no more simulation can be started.
+        """
+        return concurrent_jobs >= self.concurrency_limit
+
+    def format_load(self, concurrent_jobs):
+        return "%d/%d" % (concurrent_jobs, self.concurrency_limit)
+
+    def get_job_count(self, concurrent_jobs):
+        """
+        :return: The number of running jobs for the given machine load.
+        """
+        return concurrent_jobs
+
+    def update_concurrency_limit(self, n_running):
+        """
+        Adapt the effective concurrency limit to the load of the node, if Adaptive_concurrency is enabled. The limit
+        (never above Max_concurrent_jobs) is lowered below the number of running jobs when the node is overloaded
+        (the load per CPU exceeds Adaptive_max_load, the available memory fraction drops below
+        Adaptive_min_free_memory, or the CPU/memory/IO pressure exceeds Adaptive_max_pressure percent), and raised by
+        one when there is clear headroom. Running jobs are never killed to meet the limit.
+
+        :param n_running: The number of jobs currently running.
+        """
+        if self.config.get('Adaptive_concurrency', False) is not True or self.max_jobs is None:
+            return
+        min_jobs = int(self.config.get('Adaptive_min_jobs', 1))
+        max_load = float(self.config.get('Adaptive_max_load', 1.0))
+        min_free_memory = float(self.config.get('Adaptive_min_free_memory', 0.1))
+        max_pressure = float(self.config.get('Adaptive_max_pressure', 10.0))
+
+        system_load = utilities.get_system_load()
+        load = system_load['load']
+        mem_available = system_load['mem_available']
+        pressures = [
+            system_load[key] for key in ('cpu_pressure', 'memory_pressure', 'io_pressure')
+            if system_load[key] is not None
+        ]
+        pressure = max(pressures) if len(pressures) > 0 else None
+
+        old_limit = self.concurrency_limit
+        if (
+            (load is not None and load > max_load)
+            or (mem_available is not None and mem_available < min_free_memory)
+            or (pressure is not None and pressure > max_pressure)
+        ):
+            decision = "overloaded"
+            self.concurrency_limit = max(min_jobs, min(self.concurrency_limit, n_running) - 1)
+        elif (
+            (load is None or load < 0.8 * max_load)
+            and (mem_available is None or mem_available > 2 * min_free_memory)
+            and (pressure is None or pressure < 0.5 * max_pressure)
+        ):
+            decision = "headroom"
+            self.concurrency_limit = min(self.max_jobs, self.concurrency_limit + 1)
+        else:
+            decision = "steady"
+
+        def format_value(value, fmt):
+            return "n/a" if value is None else fmt % value
+
+        self.logger.info(
+            "Concurrency limit %d -> %d/%d (%s): load per CPU %s, available memory %s, pressure cpu/memory/io %s/%s/%s%%, "
+            "running jobs %d"
+            % (
+                old_limit, self.concurrency_limit, self.max_jobs, decision,
+                format_value(load, "%.2f"),
+                format_value(None if mem_available is None else 100 * mem_available, "%.1f%%"),
+                format_value(system_load['cpu_pressure'], "%.1f"),
+                format_value(system_load['memory_pressure'], "%.1f"),
+                format_value(system_load['io_pressure'], "%.1f"),
+                n_running,
+            )
+        )
+
+    def count_running_jobs(self):
+        """
+        :return: The number of running jobs (only the leaves of the restart trees are counted).
+        """
         concurrent_jobs = 0
-        for i in self.container.sim_inst_dict.keys():
-            inst = self.container.sim_inst_dict[i]
-            sim_niceness_vec.append(inst.niceness)
-            sim_id_vec.append(inst.id)
-            inst.sim_get_status()  # update its status
-            # test if the process is running
+        for sim_id in self.active_ids:
+            inst = self.container.sim_inst_dict[sim_id]
             if inst.status == Simulation.STATUS_RUN and inst.cid == -1:
                 concurrent_jobs += 1
+        return concurrent_jobs
+
+    def dispatch_queued(self, concurrent_jobs, skip_ids=()):
+        """
+        Dispatch the runnable simulations from the run queue, in the order of priority, until the slots are used up.
+
+        :param concurrent_jobs: The number of jobs currently running.
+        :param skip_ids: The IDs of the simulations that have already been dispatched.
 
-        index_niceness_sorted = np.argsort(sim_niceness_vec)
-        for _, i in enumerate(index_niceness_sorted):
-            ind = sim_id_vec[i]
-            if (
-                self.container.sim_inst_dict[ind].status != Simulation.STATUS_DONE
-                and self.container.sim_inst_dict[ind].id > 0
-            ):
-                schedule_list.append(self.container.sim_inst_dict[ind])
-
-        for sim in schedule_list:
-            if sim.id == 0:  # the root group, skip
+        :return: The number of jobs running after the actions.
+        """
+        dispatched_keys = []
+        while not self.is_full(concurrent_jobs) and len(self.run_queue) > 0:
+            key = heapq.heappop(self.run_queue)
+            sim_id = key[-1]
+            if self.queue_keys.get(sim_id) != key or key in dispatched_keys:
+                continue  # outdated or duplicated entry
+            dispatched_keys.append(key)
+            if sim_id in skip_ids:
                 continue
-            sim.sim_get_status()  # update its status
-            self.logger.debug("Checking instance #%d ==> %s [%s]" % (sim.id, sim.name, sim.status))
-            if sim.status == Simulation.STATUS_RUN:
-                sim.sim_backup_checkpoint()
-            elif sim.status == Simulation.STATUS_STALL:
-                sim.sim_kill()
-                self.container.build_simulation_tree()
-            elif sim.status == Simulation.STATUS_STOP and sim.level == 1:
-                self.logger.warning("STOP detected: " + sim.fulldir)
-                # check if there is available slot to restart the simulation
-                if concurrent_jobs < int(self.config['Max_concurrent_jobs']) and sim.level == 1:
-                    # search only top level instance to find the restart candidate
-                    # build restart path
-                    current_inst = sim
-                    # restart the simulation instance at the leaf node
-                    while current_inst.cid != -1:
-                        current_inst = self.container.sim_inst_dict[current_inst.cid]
-                    print(
-                        "RESTART: #%d ==> %s" % (current_inst.id, current_inst.fulldir)
-                    )
-                    self.logger.info(
-                        "RESTART: #%d ==> %s" % (current_inst.id, current_inst.fulldir)
-                    )
-                    current_inst.sim_restart()
-                    concurrent_jobs += 1
-            elif sim.status == Simulation.STATUS_NEW:
-                # check if there is available slot to start the simulation
-                if concurrent_jobs < int(self.config['Max_concurrent_jobs']):
-                    # Start new run
-                    sim.sim_start()
-                    concurrent_jobs += 1
+            concurrent_jobs = self.dispatch(self.container.sim_inst_dict[sim_id], concurrent_jobs)
+        # the entries stay in the queue until the simulations change their status
+        for key in dispatched_keys:
+            heapq.heappush(self.run_queue, key)
+        return concurrent_jobs
+
+    def reschedule(self, sim_dirs):
+        """
+        Re-evaluate only the simulations in the given directories (and their restart trees), then use any free slot
+        to start new simulations. Checkpoints are not backed up here; this is left to the periodic schedule().
+
+        :param sim_dirs: A collection of simulation directories (full paths) that have changed.
+        """
+        Simulation.new_status_cycle()
+        top_level_insts = self.container.refresh_simulation_dirs(sim_dirs)
+        if top_level_insts is None:
+            # the change cannot be attributed to known simulations
+            self.schedule()
+            return
+
+        self.update_queue()
+        concurrent_jobs = self.count_running_jobs()
+
+        affected_list = []
+        for top_level_inst in top_level_insts:
+            affected_list.extend(self.container.get_subtree(top_level_inst))
+        for sim in sorted(affected_list, key=lambda inst: inst.niceness):
+            concurrent_jobs = self.dispatch(sim, concurrent_jobs, backup=False)
+
+        # refill the free slots
+        concurrent_jobs = self.dispatch_queued(concurrent_jobs, skip_ids=set(inst.id for inst in affected_list))
+        self.run_actions()
         self.logger.info(
-            "SiMon routine checking completed. Machine load: %d/%d"
-            % (concurrent_jobs, int(self.config['Max_concurrent_jobs']))
-        )
\ No newline at end of file
+            "SiMon event handling completed (%d simulations affected). Machine load: %s"
+            % (len(affected_list), self.format_load(concurrent_jobs))
+        )
+
+    def dispatch(self, sim, concurrent_jobs, backup=True):
+        """
+        Decide the scheduling action for a single simulation according to its current status. The slots are
+        accounted for immediately, but the action itself is queued and carried out by run_actions().
+
+        :param sim: The simulation instance.
+        :param concurrent_jobs: The number of jobs currently running.
+        :param backup: Back up the checkpoint of a running simulation.
+
+        :return: The number of jobs running after the action.
+        """
+        sim.sim_get_status()  # update its status
+        if len(sim.restarts) > 0:
+            # the status of the simulation itself does not reflect its running restarts
+            self.container.propagate_status([sim])
+        self.logger.debug("Checking instance #%d ==> %s [%s]" % (sim.id, sim.name, sim.status))
+        if sim.status == Simulation.STATUS_RUN:
+            if backup:
+                self.pending_actions.append(("sim_backup_checkpoint", sim))
+        elif sim.status == Simulation.STATUS_STALL:
+            self.pending_actions.append(("sim_kill", sim))
+        elif sim.status == Simulation.STATUS_STOP and sim.level == 1:
+            self.logger.warning("STOP detected: " + sim.fulldir)
+            # check if there is available slot to restart the simulation
+            if self.can_start(sim, concurrent_jobs) and sim.level == 1:
+                # search only top level instance to find the restart candidate
+                # restart the simulation instance at the leaf node
+                current_inst = sim.leaf
+                print(
+                    "RESTART: #%d ==> %s" % (current_inst.id, current_inst.fulldir)
+                )
+                self.logger.info(
+                    "RESTART: #%d ==> %s" % (current_inst.id, current_inst.fulldir)
+                )
+                self.pending_actions.append(("sim_restart", current_inst))
+                concurrent_jobs = self.add_job(sim, concurrent_jobs)
+        elif sim.status == Simulation.STATUS_NEW:
+            # check if there is available slot to start the simulation
+            if self.can_start(sim, concurrent_jobs):
+                # Start new run
+                self.pending_actions.append(("sim_start", sim))
+                concurrent_jobs = self.add_job(sim, concurrent_jobs)
+        return concurrent_jobs
+
+    def run_actions(self):
+        """
+        Carry out the actions queued by dispatch(). The actions concern different simulations and are independent of
+        each other, so they are run in parallel if Probe_workers > 1. The simulation tree is updated afterwards.
+        """
+        actions, self.pending_actions = self.pending_actions, []
+        if len(actions) == 0:
+            return
+        if self.executor is None:
+            for action, sim in actions:
+                getattr(sim, action)()
+        else:
+            list(self.executor.map(lambda item: getattr(item[1], item[0])(), actions))
+
+        # make the changes visible in the simulation tree
+        if any(action == "sim_kill" for action, _ in actions):
+            self.container.build_simulation_tree()
+        else:
+            started_dirs = [sim.full_dir for action, sim in actions if action in ("sim_start", "sim_restart")]
+            if len(started_dirs) > 0:
+                self.container.refresh_simulation_dirs(started_dirs)
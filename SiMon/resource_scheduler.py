@@ -0,0 +1,85 @@
+"""
+A scheduler that takes the resource requirements of the simulations into account.
+
+Each simulation may declare the number of cores (`Cores`) and the amount of memory (`Memory_GB`) it needs, and
+optionally an estimate of its run time (`Walltime_estimate`, in seconds), in its SiMon.conf. The capacity of the node is
+declared in the global config (`Node_cores`, `Node_memory_GB`; by default the cores and the physical memory of the
+machine). Simulations are started in the order of priority as long as they fit into the remaining capacity; a
+simulation that does not fit is skipped in favor of smaller ones further down the queue (first-fit bin packing).
+"""
+
+import os
+from logging import Logger
+from SiMon.priority_scheduler import PriorityScheduler
+from SiMon.simulation import Simulation
+from SiMon.simulation_container import SimulationContainer
+
+
+class ResourceScheduler(PriorityScheduler):
+
+    def __init__(self, container: SimulationContainer = None, logger: Logger = None, config: dict = None, callbacks: list = None ) -> None:
+        super().__init__(container, logger, config, callbacks)
+        self.node_cores = float(self.config.get('Node_cores', os.cpu_count() or 1))
+        if 'Node_memory_GB' in self.config:
+            self.node_memory = float(self.config['Node_memory_GB'])
+        else:
+            self.node_memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024.0 ** 3
+        # the job limit still applies, if configured
+        self.max_jobs = int(self.config['Max_concurrent_jobs']) if 'Max_concurrent_jobs' in self.config else None
+        self.concurrency_limit = self.max_jobs
+        self.oversized_ids = set()  # the simulations that can never fit into the node (reported once)
+
+    @staticmethod
+    def get_requirements(sim):
+        """
+        :return: The number of cores and the memory (in GB) needed by the simulation.
+        """
+        return sim.cores, sim.memory_gb
+
+    def get_queue_key(self, inst):
+        # among the simulations with the same priority, start the longest ones first
+        return (inst.niceness, -inst.walltime_estimate, inst.id)
+
+    def count_running_jobs(self):
+        """
+        :return: The load of the machine: a dictionary with the number of running jobs, and the cores and the memory
+        they use. Stalled jobs still occupy their resources until they are killed.
+        """
+        load = {'jobs': 0, 'cores': 0.0, 'memory': 0.0}
+        for sim_id in self.active_ids:
+            inst = self.container.sim_inst_dict[sim_id]
+            if inst.status in (Simulation.STATUS_RUN, Simulation.STATUS_STALL) and inst.cid == -1:
+                load = self.add_job(inst, load)
+        return load
+
+    def can_start(self, sim, load):
+        cores, memory = self.get_requirements(sim)
+        if cores > self.node_cores or memory > self.node_memory:
+            if sim.id not in self.oversized_ids:
+                self.oversized_ids.add(sim.id)
+                self.logger.warning(
+                    "Simulation %s requires %g cores and %g GB of memory, which exceeds the capacity of the node "
+                    "(%g cores, %g GB). It will not be started." % (sim.name, cores, memory, self.node_cores,
+                                                                    self.node_memory)
+                )
+            return False
+        if self.concurrency_limit is not None and load['jobs'] >= self.concurrency_limit:
+            return False
+        return load['cores'] + cores <= self.node_cores and load['memory'] + memory <= self.node_memory
+
+    def add_job(self, sim, load):
+        cores, memory = self.get_requirements(sim)
+        return {'jobs': load['jobs'] + 1, 'cores': load['cores'] + cores, 'memory': load['memory'] + memory}
+
+    def is_full(self, load):
+        if self.concurrency_limit is not None and load['jobs'] >= self.concurrency_limit:
+            return True
+        return load['cores'] >= self.node_cores or load['memory'] >= self.node_memory
+
+    def get_job_count(self, load):
+        return load['jobs']
+
+    def format_load(self, load):
+        return "%d jobs, %g/%g cores, %.1f/%.1f GB" % (
+            load['jobs'], load['cores'], self.node_cores, load['memory'], self.node_memory
+        )
@@ -18,7 +18,22 @@ class Scheduler(ABC):
         self.config = config 
         self.callbacks = callbacks
 
-    def schedule(self):
+    def schedule(self, full_rescan=False):
+        """
+        Carry out a scheduling cycle.
+
+        :param full_rescan: Rebuild the simulation tree by walking the whole root directory, instead of rescanning
+        only the directories that have changed (e.g. after file system events have been lost).
+        """
         if self.callbacks is not None:
             for cb in self.callbacks:
                 cb.run()
+
+    def reschedule(self, sim_dirs):
+        """
+        Re-evaluate only the simulations in the given directories, e.g. after a file system event. Schedulers that
+        do not support targeted re-evaluation run a full scheduling cycle instead.
+
+        :param sim_dirs: A collection of simulation directories (full paths) that have changed.
+        """
+        self.schedule()
@@ -4,18 +4,17 @@ import sys
 import time
 import logging
 import glob
-# from daemonize import Daemonize
-
-import numpy as np
-
-import daemon 
-from daemon import pidfile
-from daemonize import Daemonize
 from SiMon import utilities
 from SiMon import config 
+from SiMon import watcher
+from SiMon.simulation import Simulation
 from SiMon.simulation_container import SimulationContainer
 from SiMon.priority_scheduler import PriorityScheduler
-from SiMon.visualization import VisualizationCallback 
+from SiMon.resource_scheduler import ResourceScheduler
+from SiMon.supervisor import Supervisor
+from SiMon.status_grid import StatusGridCallback
+# The optional components with heavy dependencies (numpy, matplotlib, sqlite3) are imported when they are enabled, so
+# that the interactive mode starts quickly.
 
 
 
@@ -105,6 +104,7 @@ class SiMon(object):
         self.simulations = None
         self.callbacks = []
         self.scheduler = None 
+        self.supervisor = None
 
         self.__inited = False 
 
@@ -117,17 +117,42 @@ class SiMon(object):
             self.logger=utilities.get_logger(log_dir=self.cwd, log_file='SiMon_daemon.log')
 
             # create a container for all simulations
-            self.simulations = SimulationContainer(root_dir=self.cwd)
+            state_store = None
+            if self.config.get('State_store', False) is True:
+                from SiMon.state_store import StateStore
+                state_store = StateStore(os.path.join(self.cwd, '.simon_state.db'))
+            chunk_store = None
+            if self.config.get('Checkpoint_store', False) is True:
+                from SiMon.chunk_store import ChunkStore
+                chunk_store = ChunkStore(os.path.join(self.cwd, ChunkStore.DIR_NAME))
+            # launch and reap the simulation processes in the daemon (the interactive mode launches them detached)
+            if self.mode == "daemon":
+                self.supervisor = Supervisor()
+            self.simulations = SimulationContainer(
+                root_dir=self.cwd, state_store=state_store, supervisor=self.supervisor, chunk_store=chunk_store,
+                max_depth=self.config.get('Max_depth', 0), exclude_patterns=self.config.get('Exclude_dirs', []),
+                full_scan_cycles=self.config.get('Full_scan_cycles', 100)
+            )
 
             # load the callbacks
             print(self.config)
             if 'Visualization' in self.config:
                 if self.config['Visualization']['Enabled'] is True:
+                    from SiMon.visualization import VisualizationCallback
                     self.callbacks.append(VisualizationCallback(container=self.simulations, 
-                                                                plot_dir=os.path.join(self.cwd, self.config['Visualization']['Dir'])))
+                                                                plot_dir=os.path.join(self.cwd, self.config['Visualization']['Dir']),
+                                                                max_plots=self.config['Visualization'].get('Max_plots', 10)))
+            if 'Status_grid' in self.config:
+                if self.config['Status_grid'].get('Enabled', False) is True:
+                    self.callbacks.append(StatusGridCallback(container=self.simulations,
+                                                             file=os.path.join(self.cwd, self.config['Status_grid'].get('File', 'status.html')),
+                                                             refresh=self.config['Status_grid'].get('Refresh', 60)))
 
             # create a scheduler 
-            self.scheduler = PriorityScheduler(self.simulations, self.logger, self.config, self.callbacks)
+            if self.config.get('Scheduler', 'priority') == 'resource':
+                self.scheduler = ResourceScheduler(self.simulations, self.logger, self.config, self.callbacks)
+            else:
+                self.scheduler = PriorityScheduler(self.simulations, self.logger, self.config, self.callbacks)
         
             self.__inited = True 
 
@@ -280,16 +305,110 @@ class SiMon(object):
             self.initialize()
             
         os.chdir(self.cwd)
+        # only the daemon keeps the progress history of the simulations
+        Simulation.record_progress = True
         self.simulations.build_simulation_tree()
+        if self.config.get("Event_driven", False) is True:
+            self.run_event_driven()
         while True:
             # print('[%s] Auto scheduled' % datetime.datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d %H:%M:%S'))
             self.scheduler.schedule()
             sys.stdout.flush()
             sys.stderr.flush()
             if "Daemon_sleep_time" in self.config:
-                time.sleep(self.config["Daemon_sleep_time"])
+                next_check = time.time() + self.config["Daemon_sleep_time"]
             else:
-                time.sleep(180)
+                next_check = time.time() + 180
+            # refill the slot of a simulation as soon as its process exits
+            while time.time() < next_check:
+                exited_dirs = self.supervisor.wait(next_check - time.time())
+                if len(exited_dirs) > 0:
+                    self.scheduler.reschedule(exited_dirs)
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+
+    def run_event_driven(self):
+        """
+        Event-driven daemon loop. The simulation directories are watched (with inotify if available, by polling
+        otherwise), and only the simulations affected by a change are re-evaluated. A full scheduling cycle, which
+        rescans the whole root directory, is still carried out every `Daemon_sleep_time` seconds as a safety net, and
+        as soon as file system events have been lost.
+        """
+        if "Daemon_sleep_time" in self.config:
+            sweep_interval = self.config["Daemon_sleep_time"]
+        else:
+            sweep_interval = 180
+        fs_watcher = watcher.create_watcher(
+            poll_interval=self.config.get("Event_poll_interval", 5),
+            use_inotify=self.config.get("Event_use_inotify", True),
+        )
+        self.logger.info("Event-driven mode enabled, using %s" % type(fs_watcher).__name__)
+        try:
+            full_rescan = False  # the tree has just been built by run()
+            while True:
+                self.scheduler.schedule(full_rescan=full_rescan)
+                full_rescan = True
+                self.update_watches(fs_watcher)
+                sys.stdout.flush()
+                sys.stderr.flush()
+                next_sweep = time.time() + sweep_interval
+                recheck_dirs = dict()  # directory => time of the follow-up check
+                while time.time() < next_sweep:
+                    timeout = next_sweep - time.time()
+                    if len(recheck_dirs) > 0:
+                        timeout = min(timeout, min(recheck_dirs.values()) - time.time())
+                    changed_dirs = fs_watcher.wait(timeout, wakeup_fds=[self.supervisor])
+                    if changed_dirs is None:
+                        self.logger.warning("File system events may have been lost, starting a full scan.")
+                        break
+                    # the processes launched by SiMon are reaped as soon as they exit
+                    changed_dirs |= set(self.supervisor.reap())
+                    # A process closes its output file before it has completely exited, so each change is checked
+                    # once more a little later.
+                    now = time.time()
+                    due_dirs = set(d for d, t in recheck_dirs.items() if t <= now)
+                    for d in due_dirs:
+                        del recheck_dirs[d]
+                    for d in changed_dirs:
+                        recheck_dirs[d] = now + 2.0
+                    changed_dirs |= due_dirs
+                    if len(changed_dirs) > 0:
+                        self.logger.debug("Changes detected in: %s" % ", ".join(sorted(changed_dirs)))
+                        self.scheduler.reschedule(changed_dirs)
+                        self.update_watches(fs_watcher)
+                        sys.stdout.flush()
+                        sys.stderr.flush()
+        finally:
+            fs_watcher.close()
+
+    def update_watches(self, fs_watcher):
+        """
+        Synchronize the watched directories with the current simulation tree. The root directory is watched for new
+        simulations, and each simulation directory for its PID file, output file, STOP/ERROR markers, config file and
+        new restart directories. The listed directories that are not simulations (yet) are watched for their config
+        files.
+        """
+        watches = dict()
+        watches[self.simulations.root_dir] = ((), "*")
+        for skipped in self.simulations.skipped_dirs.values():
+            for path in skipped:
+                watches[path] = ([Simulation.config_file], None)
+        for sim_inst in self.simulations.sim_inst_dict.values():
+            if sim_inst.id == 0:
+                continue
+            filenames = [".process.pid", "STOP", "ERROR", sim_inst.config_file]
+            if sim_inst.output_file is not None:
+                filenames.append(sim_inst.output_file)
+            watches[sim_inst.full_dir] = (filenames, "restart*")
+
+        for path in fs_watcher.watched_paths() - set(watches):
+            fs_watcher.unwatch(path)
+        for path, (filenames, subdir_pattern) in watches.items():
+            try:
+                fs_watcher.watch(path, filenames, subdir_pattern)
+            except OSError as err:
+                # e.g. the inotify watch limit is reached; the simulation is still covered by the periodic scan
+                self.logger.warning(str(err))
 
     def interactive_mode(self, autoquit=False):
         """
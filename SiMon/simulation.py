@@ -8,17 +8,21 @@ import datetime
 import abc
 import glob
 import os
-import subprocess
 import signal
+import subprocess
 import time
 import sys
 import re
+import json
 import shutil
 from abc import ABC 
 from SiMon import utilities
 
 import configparser as cp  # Python 3 only
 
+# By default, the model time is the first number on the last line of the output file
+MODEL_TIME_REGEX = re.compile("\\d+")
+
 
 class Simulation(ABC):
     """
@@ -48,6 +52,32 @@ class Simulation(ABC):
 
     STATUS_LABEL = ["NEW", "STOP", "RUN", "STALL", "DONE", "ERROR"]
 
+    PROGRESS_FILE = ".simon_progress"  # the file in which the history of the model time is kept
+    BACKUP_MANIFEST_FILE = ".simon_backups"  # the manifest of the checkpoint backups
+    STALL_MIN_SAMPLES = 4  # the number of samples needed before the progress rate is used to detect stalls
+
+    # The generation number of the current status cycle (see new_status_cycle())
+    current_status_cycle = 0
+
+    # Whether sim_probe() records the model time in the progress history. This is only enabled by SiMon.run() in the
+    # daemon, so that listing the simulations does not write to their directories
+    record_progress = False
+
+    config_file = "SiMon.conf"  # the file name of the config file to be placed in each simulation directory
+
+    # The attributes are declared as slots, so that a tree of 100k simulations does not carry a __dict__ per instance
+    # (subclasses should declare `__slots__ = ()`, or the slots of their own attributes, to keep this benefit)
+    __slots__ = (
+        "id", "name", "full_dir", "fulldir", "status", "logger", "error_type",
+        "t", "t_min", "t_max", "t_max_extended", "mtime", "ctime",
+        "status_cycle", "pid", "pid_running", "error_flagged", "stall_reason",
+        "state_store", "supervisor", "chunk_store", "cid", "leaf", "level", "parent_id", "mode", "niceness",
+        "maximum_number_of_checkpoints", "backup_manifest", "output_reader", "progress", "restarts",
+        "_config", "has_config", "config_hash", "output_file", "error_file", "started_pid", "started_pid_time",
+        "timestamp_started", "stall_time", "stall_detection", "stall_factor", "cores", "memory_gb",
+        "walltime_estimate", "restart_file", "backup_hash",
+    )
+
     __metaclass__ = abc.ABCMeta
 
     def __init__(
@@ -83,7 +113,7 @@ class Simulation(ABC):
         self.status = status
         self.logger = logger
         self.error_type = ""
-        self.config_file = "SiMon.conf"  # the file name of the config file to be placed in each simulation directory
+        self.fulldir = full_dir
 
         self.t = 0  # the current model time
         self.t_min = t_min  # minimum time for the simulation to start
@@ -94,10 +124,21 @@ class Simulation(ABC):
         )
         self.ctime = 0  # timestamp of the creation of the simulation output files
 
+        # status snapshot, taken once per status cycle by sim_probe()
+        self.status_cycle = -1  # the status cycle in which the snapshot was taken (-1: no valid snapshot)
+        self.pid = None  # the process ID in the .process.pid file (None: no PID file)
+        self.pid_running = False  # whether the process is running
+        self.error_flagged = False  # whether the simulation has been marked as ERROR
+        self.stall_reason = None  # why the simulation has been marked as STALL
+        self.state_store = None  # the StateStore to write the state to (set by the SimulationContainer)
+        self.supervisor = None  # the Supervisor launching the processes (set by the SimulationContainer)
+        self.chunk_store = None  # the ChunkStore keeping the checkpoint backups (set by the SimulationContainer)
+
         # the candidate instance ID to restart in case crashes
         # (-1: no candidate, restart from itself;)
         # (>0: restart from the candidate. If the candidate cannot restart, try siblings)
         self.cid = -1
+        self.leaf = self  # the active leaf of the restart chain, i.e. the instance to restart (set by the container)
 
         self.level = 0
         self.parent_id = -1
@@ -106,6 +147,28 @@ class Simulation(ABC):
             0  # Priority, same as UNIX (-20 ~ 19, the lower ==> higher priority)
         )
         self.maximum_number_of_checkpoints = 20
+        self.backup_manifest = None  # the list of the checkpoint backups, loaded on demand
+        self.output_reader = utilities.LastLineReader()  # reads the last line of the output file
+        # the config is loaded on demand (see the `config` property); the fields needed in every status cycle are
+        # extracted from it by parse_config_file()
+        self._config = None
+        self.has_config = False
+        self.config_hash = None
+        self.output_file = None
+        self.error_file = None
+        self.started_pid = None  # the PID recorded at launch
+        self.started_pid_time = None  # the start time of that process, to tell whether its PID has been reused
+        self.timestamp_started = None
+        self.stall_time = None  # the stall detection options (see sim_is_stalled())
+        self.stall_detection = "mtime"
+        self.stall_factor = 5.0
+        self.cores = 1.0  # the resources needed by the simulation (see ResourceScheduler)
+        self.memory_gb = 0.0
+        self.walltime_estimate = 0.0
+        self.restart_file = None
+        self.backup_hash = False
+        # the history of the model time, used to estimate the progress rate and the remaining time
+        self.progress = utilities.ProgressHistory(os.path.join(self.full_dir, Simulation.PROGRESS_FILE))
         if restarts is None:
             self.restarts = list()
         else:
@@ -114,14 +177,72 @@ class Simulation(ABC):
         self.sim_get_status()
 
     def parse_config_file(self):
+        """
+        Read the config file, and keep only the fields needed to determine the status of the simulation. The full
+        config is loaded again when an action needs it (see the `config` property).
+        """
         full_config_file_path = os.path.join(self.full_dir, self.config_file)
+        self._config = None
+        self.config_hash = None
+        conf = None
         if os.path.isfile(full_config_file_path):
-            self.config = utilities.parse_config_file(os.path.join(self.full_dir, self.config_file), section='Simulation')
-            self.t_max = self.config['T_end']
-            self.t_min = self.config['T_start']
-            self.niceness = self.config['Niceness']
-        else:
-            self.config = {}
+            conf = utilities.parse_config_file(full_config_file_path, section='Simulation', readonly=True)
+        if conf is not None:
+            self.t_max = conf['T_end']
+            self.t_min = conf['T_start']
+            self.niceness = conf['Niceness']
+        self.sim_cache_config_fields(conf if conf is not None else {})
+
+    def sim_cache_config_fields(self, conf):
+        """
+        Keep the fields of the config that are used in every status or scheduling cycle (see sim_probe(),
+        sim_is_stalled(), sim_backup_checkpoint() and ResourceScheduler), so that the full config is not loaded for
+        them.
+        """
+        self.has_config = len(conf) > 0
+        self.output_file = conf.get("Output_file")
+        self.error_file = conf.get("Error_file")
+        self.started_pid = conf.get("PID")
+        self.started_pid_time = conf.get("PID_start_time")
+        self.timestamp_started = conf.get("Timestamp_started")
+        self.stall_time = conf.get("Stall_time")
+        self.stall_detection = conf.get("Stall_detection", "mtime")
+        self.stall_factor = float(conf.get("Stall_factor", 5))
+        self.cores = float(conf.get("Cores", 1))
+        self.memory_gb = float(conf.get("Memory_GB", 0))
+        self.walltime_estimate = float(conf.get("Walltime_estimate", 0))
+        self.restart_file = conf.get("Restart_file")
+        self.backup_hash = conf.get("Backup_hash", False)
+
+    @property
+    def config(self):
+        """
+        The config of the simulation (the [Simulation] section of its config file), loaded on first access. It may be
+        modified, e.g. before writing it with utilities.update_config_file().
+        """
+        if self._config is None:
+            conf = utilities.parse_config_file(os.path.join(self.full_dir, self.config_file), section='Simulation')
+            self._config = conf if conf is not None else {}
+        return self._config
+
+    @config.setter
+    def config(self, conf):
+        self._config = conf
+        self.config_hash = None
+        self.sim_cache_config_fields(conf if conf is not None else {})
+
+    def sim_get_config_hash(self):
+        """
+        :return: A hash of the config of the simulation, to tell whether it has changed (None if there is no config).
+        """
+        if self.config_hash is None and self.has_config:
+            conf = self._config
+            if conf is None:
+                conf = utilities.parse_config_file(
+                    os.path.join(self.full_dir, self.config_file), section='Simulation', readonly=True
+                )
+            self.config_hash = utilities.get_config_hash(conf)
+        return self.config_hash
 
     def __repr__(self, level=0):
         if level == 0:
@@ -144,6 +265,12 @@ class Simulation(ABC):
                 int(self.t_max),
             )
             suffix = mtime_str
+            rate = self.sim_get_progress_rate()
+            if rate is not None:
+                suffix += " %.3g/s" % rate
+                eta = self.sim_get_eta()
+                if eta is not None and self.t < self.t_max:
+                    suffix += " ETA %s" % utilities.format_duration(eta)
             progress_bar = utilities.progress_bar(
                 self.t, self.t_max, self.t_min, prefix=prefix, suffix=suffix
                 )
@@ -201,6 +328,74 @@ class Simulation(ABC):
     #         # TODO: write default config file
     #     return 0
 
+    def sim_read_pid(self, sim_dir=None):
+        """
+        Read the process ID from the .process.pid file.
+
+        :param sim_dir: The directory containing the PID file (default: the simulation directory).
+
+        :return: The process ID, or None if there is no PID file.
+        """
+        if sim_dir is None:
+            sim_dir = self.full_dir
+        pid_fn = os.path.join(sim_dir, ".process.pid")
+        if not os.path.isfile(pid_fn):
+            return None
+        with open(pid_fn, "r") as f_pid:
+            return int(f_pid.readline().strip())
+
+    def sim_check_process(self, pid):
+        """
+        Check whether the process with the given PID (as read from the PID file of the simulation) is running.
+
+        :return: True if the process is running, False otherwise.
+        """
+        if self.supervisor is not None:
+            running = self.supervisor.is_running(pid)
+            if running is not None:
+                return running
+        # the start time recorded at launch tells whether the PID has been reused by another process
+        start_time = self.started_pid_time if self.started_pid == pid else None
+        try:
+            utilities.check_pid(pid, start_time=start_time)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def sim_launch(self, command, sim_dir):
+        """
+        Launch a shell command in the background in the given directory, and record its PID in the .process.pid file.
+
+        :return: The process ID.
+        """
+        if self.supervisor is not None:
+            return self.supervisor.launch(command, sim_dir)
+        subprocess.call("%s & echo $!>.process.pid" % command, shell=True, cwd=sim_dir)
+        # sleep for a little while to make sure that the pid file exist
+        time.sleep(0.5)
+        return self.sim_read_pid(sim_dir)
+
+    def sim_record_launch(self, pid):
+        """
+        Record the PID and the start time of a newly launched process in the config.
+        """
+        self.config["PID"] = pid
+        self.config["Timestamp_started"] = time.time()
+        start_time = utilities.get_process_start_time(pid)
+        if start_time is not None:
+            self.config["PID_start_time"] = start_time
+        else:
+            self.config.pop("PID_start_time", None)
+        self.sim_cache_config_fields(self.config)
+        self.config_hash = None
+
+    def sim_save_state(self):
+        """
+        Write the current state of the simulation (status, PID, timestamps) to the state store, if there is one.
+        """
+        if self.state_store is not None:
+            self.state_store.update(self)
+
     def sim_start(self):
         """
         Start a new simulation.
@@ -208,41 +403,28 @@ class Simulation(ABC):
         :return: Return 0 if succeed, -1 if failed. If the simulation is already started, then it will do nothing
         but return 1.
         """
-        start_script_template = "%s & echo $!>.process.pid"
-        orig_dir = os.getcwd()
-        os.chdir(self.full_dir)
+        self.sim_invalidate_status()
 
         # Test if the process is running accoding to the .process.pid file
-        if os.path.isfile(".process.pid"):
-            # if the PID file exists, try to read the process ID
-            f_pid = open(".process.pid", "r")
-            pid = int(f_pid.readline().strip())
-            f_pid.close()
-            if pid > 0:
-                try:
-                    os.kill(pid, 0)
-                    return 1  # if no exception, the process is already running
-                except (ValueError, OSError):
-                    pass  # process not started yet
+        pid = self.sim_read_pid()
+        if pid is not None and pid > 0 and self.sim_check_process(pid):
+            return 1  # the process is already running
         # If the process is not started yet, then start it in a normal way
         if "Start_command" in self.config:
             start_cmd = self.config["Start_command"]
-            # self.proc = subprocess.Popen(start_cmd, shell=True)
-            os.system(start_script_template % start_cmd)
-            # sleep for a little while to make sure that the pid file exist
-            time.sleep(0.5)
-            fpid = open(".process.pid", "r")
-            pid = int(fpid.readline())
-            fpid.close()
-            self.config["PID"] = pid
-            self.config["Timestamp_started"] = time.time()
-            utilities.update_config_file(self.config_file, self.config, section='Simulation')
+            pid = self.sim_launch(start_cmd, self.full_dir)
+            self.sim_record_launch(pid)
+            utilities.update_config_file(
+                os.path.join(self.full_dir, self.config_file), self.config, section='Simulation'
+            )
+            self.pid = pid
+            self.ctime = self.config["Timestamp_started"]
+            self.sim_save_state()
             if self.logger is not None:
                 msg = "Simulation %s started, PID = %d" % (self.name, pid)
                 self.logger.info(msg)
         else:
             return -1
-        os.chdir(orig_dir)
         return 0
 
     def sim_restart(self):
@@ -253,91 +435,86 @@ class Simulation(ABC):
         necessary, the method will do nothing but return 1. If the simulation is marked as 'STOP' or 'ERROR', then
         return 2 and do nothing.
         """
-        if os.path.isfile("STOP") or os.path.isfile("ERROR"):
+        self.sim_invalidate_status()
+        if os.path.isfile(os.path.join(self.full_dir, "STOP")) or os.path.isfile(
+            os.path.join(self.full_dir, "ERROR")
+        ):
             print(
                 "Restart skipped due to the existence of the STOP file or ERROR file."
             )
             return 2
         # Test if the process is running
-        restart_script_template = "%s & echo $!>.process.pid"
-        orig_dir = os.getcwd()
-        os.chdir(self.full_dir)
         print("The full dir is %s" % self.full_dir)
         print("restarting simulation: %s" % self.full_dir)
         if self.logger is not None:
             self.logger.info("Restarting simulation: %s" % self.full_dir)
         # Test if the process is running accoding to the .process.pid file
-        if os.path.isfile(".process.pid"):
-            # if the PID file exists, try to read the process ID
-            f_pid = open(".process.pid", "r")
-            pid = int(f_pid.readline().strip())
-            f_pid.close()
-            if pid > 0:
-                try:
-                    os.kill(pid, 0)
-                    return 1  # if no exception, the process is already running
-                except (ValueError, OSError):
-                    # process not started yet
-                    # check how many times the simulation has been restarted
-                    restarts = glob.glob("restart*/")
-                    n_restarts = len(restarts)
-                    # check whether it exceeds the maximum times of restarts specified in the per-sim config file
-                    if self.config["Max_restarts"]:
-                        if n_restarts > self.config["Max_restarts"]:
-                            # if exceed, create an empty file called 'ERROR'
-                            f_error = open("ERROR", "w")
-                            f_error.close()
-                            msg = (
-                                "Simulation %s has been restarted too many times. Further restart skipped..."
-                                % self.full_dir
-                            )
-                            print(msg)
-                            if self.logger is not None:
-                                self.logger.error(msg)
-                            return -2
-                    else:
-                        # if the config entry Max_restarts does not exist in the config file, there is no restart limit
-                        pass
-                    # now try to restart the simulation
-                    if "Restart_command" in self.config:
-                        restart_cmd = self.config["Restart_command"]
-                        if restart_cmd != "" and restart_cmd.strip() != "None":
-                            msg = "Restarting simulation: %s" % self.full_dir
-                            print(msg)
-                            if self.logger is not None:
-                                self.logger.info(msg)
-                            # create a restart dir
-                            restart_dir = "restart%d" % (n_restarts + 1)
-                            os.mkdir(restart_dir)
-                            os.chdir(restart_dir)
-                            os.system(restart_script_template % restart_cmd)
-                            # sleep for a little while to make sure that the pid file exist
-                            time.sleep(0.5)
-                            fpid = open(".process.pid", "r")
-                            pid = int(fpid.readline())
-                            fpid.close()
-                            self.config["PID"] = pid
-                            self.config["Timestamp_started"] = time.time()
-                            utilities.update_config_file(self.config_file, self.config, section='Simulation')
-                        else:
-                            msg = (
-                                "%s: unable to restart because the restart command is not properly configured."
-                                % self.name
-                            )
-                            print(msg)
-                            if self.logger is not None:
-                                self.logger.error(msg)
-                            return -1
+        pid = self.sim_read_pid()
+        if pid is not None and pid > 0:
+            if self.sim_check_process(pid):
+                return 1  # the process is already running
+            else:
+                # process not started yet
+                # check how many times the simulation has been restarted
+                restarts = glob.glob(os.path.join(self.full_dir, "restart*/"))
+                n_restarts = len(restarts)
+                # check whether it exceeds the maximum times of restarts specified in the per-sim config file
+                if self.config["Max_restarts"]:
+                    if n_restarts > self.config["Max_restarts"]:
+                        # if exceed, create an empty file called 'ERROR'
+                        f_error = open(os.path.join(self.full_dir, "ERROR"), "w")
+                        f_error.close()
+                        msg = (
+                            "Simulation %s has been restarted too many times. Further restart skipped..."
+                            % self.full_dir
+                        )
+                        print(msg)
+                        if self.logger is not None:
+                            self.logger.error(msg)
+                        return -2
+                else:
+                    # if the config entry Max_restarts does not exist in the config file, there is no restart limit
+                    pass
+                # now try to restart the simulation
+                if "Restart_command" in self.config:
+                    restart_cmd = self.config["Restart_command"]
+                    if restart_cmd != "" and restart_cmd.strip() != "None":
+                        msg = "Restarting simulation: %s" % self.full_dir
+                        print(msg)
+                        if self.logger is not None:
+                            self.logger.info(msg)
+                        # the restart file may be missing if the code crashed while writing it
+                        if "Restart_file" in self.config and not os.path.isfile(
+                            os.path.join(self.full_dir, self.config["Restart_file"])
+                        ):
+                            self.sim_restore_checkpoint()
+                        # create a restart dir
+                        restart_dir = os.path.join(self.full_dir, "restart%d" % (n_restarts + 1))
+                        os.mkdir(restart_dir)
+                        pid = self.sim_launch(restart_cmd, restart_dir)
+                        self.sim_record_launch(pid)
+                        # the restart directory inherits the config of the restarted simulation
+                        utilities.update_config_file(
+                            os.path.join(restart_dir, self.config_file), self.config, section='Simulation'
+                        )
                     else:
                         msg = (
-                            "%s: unable to restart because the restart command is not configured."
+                            "%s: unable to restart because the restart command is not properly configured."
                             % self.name
                         )
                         print(msg)
                         if self.logger is not None:
                             self.logger.error(msg)
                         return -1
-        os.chdir(orig_dir)
+                else:
+                    msg = (
+                        "%s: unable to restart because the restart command is not configured."
+                        % self.name
+                    )
+                    print(msg)
+                    if self.logger is not None:
+                        self.logger.error(msg)
+                    return -1
         return 0
 
     def sim_get_model_time(self):
@@ -349,21 +526,23 @@ class Simulation(ABC):
 
         :return: the current model time
         """
-        orig_dir = os.getcwd()
-        os.chdir(self.full_dir)
-        if "Output_file" in self.config:
-            output_file = self.config["Output_file"]
-            regex = re.compile("\\d+")
-            if os.path.isfile(output_file):
-                last_line = subprocess.check_output(["tail", "-1", output_file]).decode(
-                    "utf-8"
-                )
-                res = regex.findall(last_line)
-                if len(res) > 0:
-                    self.t = float(res[0])
-        os.chdir(orig_dir)
+        last_line = self.sim_read_last_output_line()
+        if last_line is not None:
+            res = MODEL_TIME_REGEX.findall(last_line)
+            if len(res) > 0:
+                self.t = float(res[0])
         return self.t
 
+    def sim_read_last_output_line(self):
+        """
+        Read the last line of the output file. The file is not read again if it has not changed since the last call.
+
+        :return: The last line of the output file, or None if there is no output file.
+        """
+        if self.output_file is not None:
+            return self.output_reader.read(os.path.join(self.full_dir, self.output_file))
+        return None
+
     def sim_get_model_start_time(self):
         """
         Get the t_min value of the current model
@@ -376,6 +555,22 @@ class Simulation(ABC):
         else:
             return 0.0
 
+    def sim_get_progress_rate(self):
+        """
+        Get the progress rate of the simulation, estimated from the recent history of its model time.
+
+        :return: The model time advanced per second of wall time, or None if it cannot be estimated yet.
+        """
+        return self.progress.get_rate()
+
+    def sim_get_eta(self):
+        """
+        Get the estimated remaining wall time until the simulation reaches t_max, at the current progress rate.
+
+        :return: The remaining time in seconds, or None if it cannot be estimated (e.g. the simulation does not advance).
+        """
+        return self.progress.get_eta(self.t_max)
+
     def sim_get_model_termination_time(self):
         """
 
@@ -386,87 +581,149 @@ class Simulation(ABC):
         """
         return self.t_max
 
-    def sim_get_status(self):
+    @classmethod
+    def new_status_cycle(cls):
         """
-        Get the current status of the simulation. Update the config file if necessary.
+        Start a new status cycle (e.g. a new scheduling cycle of the daemon). Within one cycle, the file system is
+        probed at most once per simulation by sim_get_status().
 
-        :return: The code of the current simulation status.
+        :return: The generation number of the new cycle.
+        """
+        cls.current_status_cycle += 1
+        return cls.current_status_cycle
+
+    def sim_invalidate_status(self):
+        """
+        Discard the status snapshot of the current cycle, so that the next call to sim_get_status() probes the file
+        system again. Actions that change the state of the simulation (start, restart, kill) call this method.
+        """
+        self.status_cycle = -1
+
+    def sim_probe(self):
+        """
+        Collect the information needed to determine the status of the simulation from the file system (the model time,
+        the modification time of the output, the PID file and whether the process is running), and store it as the
+        status snapshot of the current cycle.
         """
-        if self.config is None:
-            return 0
-        orig_dir = os.getcwd()
-        os.chdir(self.full_dir)
         self.t = self.sim_get_model_time()
         self.t_min = self.sim_get_model_start_time()
+        if self.has_config and Simulation.record_progress:
+            self.progress.add(time.time(), self.t)
 
         # Check the last output time from either the output file or the error file
-        output_file = ""
-        if "Output_file" in self.config:
-            output_file = self.config["Output_file"]
-            if os.path.isfile(output_file):
-                self.mtime = os.stat(output_file).st_mtime
-        elif "Error_file" in self.config:
-            error_file = self.config["Error_file"]
-            if os.path.isfile(error_file):
-                self.mtime = os.stat(error_file).st_mtime
+        output_file = self.output_file if self.output_file is not None else self.error_file
+        if output_file is not None:
+            try:
+                self.mtime = os.stat(os.path.join(self.full_dir, output_file)).st_mtime
+            except OSError:
+                pass
 
         # Get the starting time of the simulation
-        if "Timestamp_started" in self.config:
-            self.ctime = self.config["Timestamp_started"]
+        if self.timestamp_started is not None:
+            self.ctime = self.timestamp_started
 
         # Determine whether the simulation is running using the process ID
-        if os.path.isfile(".process.pid"):
-            # if the PID file exists, try to read the process ID
-            f_pid = open(".process.pid", "r")
-            pid = int(f_pid.readline().strip())
-            f_pid.close()
-            if pid == 0:
+        self.pid = self.sim_read_pid()
+        self.pid_running = False
+        self.error_flagged = False
+        if self.pid is not None and self.pid != 0:
+            # This just checks if the process is running. It doesn't kill the process
+            self.pid_running = self.sim_check_process(self.pid)
+            if not self.pid_running:
+                self.error_flagged = os.path.isfile(os.path.join(self.full_dir, "ERROR"))
+        self.status_cycle = Simulation.current_status_cycle
+
+    def sim_get_status(self, refresh=False):
+        """
+        Get the current status of the simulation. Update the config file if necessary.
+
+        The file system is probed only by the first call in each status cycle (see new_status_cycle()). Subsequent
+        calls in the same cycle evaluate the status from the snapshot of that probe.
+
+        :param refresh: Probe the file system even if it has already been probed in the current cycle.
+
+        :return: The code of the current simulation status.
+        """
+        probed = False
+        if refresh or self.status_cycle != Simulation.current_status_cycle:
+            self.sim_probe()
+            probed = True
+
+        if self.pid is not None:
+            if self.pid == 0:
                 if self.mtime == 0:
                     self.status = Simulation.STATUS_NEW
+            elif self.pid_running:
+                # It is running. Check if stalled.
+                if self.sim_is_stalled():
+                    self.status = Simulation.STATUS_STALL
+                    if self.logger is not None and probed:
+                        print(self.stall_reason)
+                        self.logger.info(self.stall_reason)
+                else:
+                    self.status = Simulation.STATUS_RUN
             else:
-                try:
-                    os.kill(
-                        pid, 0
-                    )  # This just checks if the process is running. It doesn't kill the process
-                    # It is running. Check if stalled.
-                    # The default value is large to prevent a slow simulation to be mistakenly killed
-                    stall_time = 6.0e6  # after 6.e6 seconds if the code doesn't advance, it is considered stalled
-                    if "Stall_time" in self.config:
-                        # Allow overriding the stall time using the per-simulation config file
-                        stall_time = self.config["Stall_time"]
-                    if time.time() - self.mtime > stall_time:
-                        self.status = Simulation.STATUS_STALL
-                        if self.logger is not None:
-                            mtime_str = datetime.datetime.fromtimestamp(
-                                self.mtime
-                            ).strftime("%m-%d %H:%M")
-                            msg = (
-                                "job %s is running [PID=%d], but no update in its output file (%s) since %s. "
-                                "The stall time of this task is %s sec. "
-                                "Marked as STALL"
-                                % (self.name, pid, output_file, mtime_str, stall_time)
-                            )
-                            print(msg)
-                            self.logger.info(msg)
+                # The process is not running, check if stopped or done
+                if (
+                    self.t >= self.t_max
+                    or self.status == Simulation.STATUS_DONE
+                ):
+                    self.status = Simulation.STATUS_DONE
+                else:
+                    if self.ctime == 0.0:
+                        self.status = Simulation.STATUS_NEW
+                    elif self.error_flagged:
+                        self.status = Simulation.STATUS_ERROR
                     else:
-                        self.status = Simulation.STATUS_RUN
-                except (OSError, ValueError) as e:
-                    # The process is not running, check if stopped or done
-                    if (
-                        self.t >= self.t_max
-                        or self.status == Simulation.STATUS_DONE
-                    ):
-                        self.status = Simulation.STATUS_DONE
-                    else:
-                        if self.ctime == 0.0:
-                            self.status = Simulation.STATUS_NEW
-                        elif os.path.isfile("ERROR"):
-                            self.status = Simulation.STATUS_ERROR
-                        else:
-                            self.status = Simulation.STATUS_STOP
-        os.chdir(orig_dir)
+                        self.status = Simulation.STATUS_STOP
         return self.status
 
+    def sim_is_stalled(self):
+        """
+        Determine whether the running simulation is stalled. Two detectors are available, selected with the
+        `Stall_detection` option of the simulation:
+
+        - "mtime" (default): the output file has not been modified for more than `Stall_time` seconds.
+        - "rate": the model time has not advanced for more than `Stall_factor` times the longest gap between two
+          advances in the recent history of the simulation, i.e. its current progress rate has dropped well below its
+          own slowest recent rate. Until the history holds enough samples, the "mtime" detector is used.
+
+        The reason is stored in `self.stall_reason`.
+
+        :return: True if the simulation is stalled.
+        """
+        # The default value is large to prevent a slow simulation to be mistakenly killed
+        stall_time = 6.0e6  # after 6.e6 seconds if the code doesn't advance, it is considered stalled
+        if self.stall_time is not None:
+            # Allow overriding the stall time using the per-simulation config file
+            stall_time = self.stall_time
+        now = time.time()
+        if self.stall_detection == "rate":
+            max_interval = self.progress.get_max_interval()
+            if max_interval is not None and self.progress.count >= Simulation.STALL_MIN_SAMPLES:
+                last_update = max(self.progress.get_last_update(), self.ctime)
+                threshold = self.stall_factor * max_interval
+                if now - last_update > threshold:
+                    self.stall_reason = (
+                        "job %s is running [PID=%d], but its model time (%g) has not advanced since %s, while it "
+                        "used to advance at least every %d sec. Marked as STALL"
+                        % (self.name, self.pid, self.t,
+                           datetime.datetime.fromtimestamp(last_update).strftime("%m-%d %H:%M"), max_interval)
+                    )
+                    return True
+                return False
+        # a simulation that has just been started may not have written its output file yet
+        if now - max(self.mtime, self.ctime) > stall_time:
+            mtime_str = datetime.datetime.fromtimestamp(self.mtime).strftime("%m-%d %H:%M")
+            self.stall_reason = (
+                "job %s is running [PID=%d], but no update in its output file (%s) since %s. "
+                "The stall time of this task is %s sec. "
+                "Marked as STALL"
+                % (self.name, self.pid, self.output_file or "", mtime_str, stall_time)
+            )
+            return True
+        return False
+
     def sim_kill(self):
         """
         Forcibly kill (i.e. terminate) the current simulation. Practically, this method terminates the process of
@@ -475,16 +732,19 @@ class Simulation(ABC):
         :return: Return 0 if succeed, -1 if failed. If the simulation is not running, then it cannot be killed, causing
         the method to do nothing but return 1.
         """
-        orig_dir = os.getcwd()
-        os.chdir(self.full_dir)
+        self.sim_invalidate_status()
         # Find the process by PID
-        if os.path.isfile(".process.pid"):
-            # if the PID file exists, try to read the process ID
-            f_pid = open(".process.pid", "r")
-            pid = int(f_pid.readline().strip())
-            f_pid.close()
+        pid = self.sim_read_pid()
+        if pid is not None:
+            if not self.sim_check_process(pid):
+                # do not kill another process that happens to have the same PID
+                return 1
             try:
-                os.kill(pid, signal.SIGKILL)
+                if os.getpgid(pid) == pid:
+                    # launched in its own session by the supervisor, kill the whole process group
+                    os.killpg(pid, signal.SIGKILL)
+                else:
+                    os.kill(pid, signal.SIGKILL)
                 msg = "Simulation %s (PID: %d) killed." % (self.name, pid)
                 print(msg)
                 if self.logger is not None:
@@ -498,7 +758,6 @@ class Simulation(ABC):
                 print(msg)
                 if self.logger is not None:
                     self.logger.error(msg)
-        os.chdir(orig_dir)
         return 0
 
     def sim_stop(self):
@@ -512,52 +771,130 @@ class Simulation(ABC):
         """
         # Create an empty file called 'STOP'. The integrator that detects this file will (hopefully) stop the
         # integration.
-        orig_dir = os.getcwd()
-        os.chdir(self.full_dir)
         stop_file = open(os.path.join(self.full_dir, "STOP"), "w")
         stop_file.close()
         msg = "A stop request has been sent to simulation %s" % self.name
         print(msg)
         if self.logger is not None:
             self.logger.info(msg)
-        os.chdir(orig_dir)
         return 0
 
+    def sim_load_backup_manifest(self):
+        """
+        Load the manifest of the checkpoint backups (oldest first). If there is no manifest (e.g. backups made by an
+        older version of SiMon), it is built from the existing backup files.
+
+        :return: The list of the backups, each a dictionary with the file name and the signature of the restart file.
+        """
+        if self.backup_manifest is None:
+            try:
+                self.backup_manifest = Simulation.read_backup_manifest(self.full_dir)
+            except ValueError:
+                pass
+            if self.backup_manifest is None:
+                self.backup_manifest = [
+                    {"file": os.path.basename(fn), "time": os.path.getmtime(fn)}
+                    for fn in sorted(glob.glob(os.path.join(self.full_dir, "restart.tmp.*")))
+                    if not fn.endswith(".tmp")
+                ]
+        return self.backup_manifest
+
+    @staticmethod
+    def read_backup_manifest(sim_dir):
+        """
+        Read the manifest of the checkpoint backups in a simulation directory.
+
+        :return: The list of the backups, or None if there is no manifest.
+        :raise ValueError: If the manifest exists but cannot be read.
+        """
+        try:
+            with open(os.path.join(sim_dir, Simulation.BACKUP_MANIFEST_FILE)) as f:
+                return json.load(f)["backups"]
+        except FileNotFoundError:
+            return None
+        except (IOError, OSError, KeyError, TypeError) as err:
+            raise ValueError("Cannot read the backup manifest in %s: %s" % (sim_dir, err))
+
+    def sim_save_backup_manifest(self):
+        manifest_fn = os.path.join(self.full_dir, Simulation.BACKUP_MANIFEST_FILE)
+        with open(manifest_fn + ".tmp", "w") as f:
+            json.dump({"backups": self.backup_manifest}, f)
+        os.replace(manifest_fn + ".tmp", manifest_fn)
+
     def sim_backup_checkpoint(self):
         """
         Back up a snapshot of the latest restart files or simulation snapshot. In case of code crash, the backup files
         can be used for restarting.
 
+        The backup is skipped if the restart file has the same signature (size, modification time and, if
+        `Backup_hash` is set, a hash of samples of its content) as when the newest backup was made. The backups are
+        listed in a small manifest file, which is used to delete the old ones: either all but the newest
+        `maximum_number_of_checkpoints`, or according to the time-tiered policy `Backup_retention` (see
+        utilities.select_retained()). With `Backup_compression` set to "gzip" or "zstd", the restart file is streamed
+        through the compressor. If the checkpoint store is enabled (see chunk_store.py), the backups are written to
+        the store instead, where they are deduplicated (and not compressed).
+
         :return: Return 0 if succeed, -1 if failed. If the existing simulation snapshot is already the latest version,
         backup is not necessary, causing the method to do nothing but return 1.
         """
         # Try to get the restartable checkpoint file name from the config file
-        orig_dir = os.getcwd()
-        os.chdir(self.full_dir)
-        if "Restart_file" in self.config:
-            restart_fn = self.config["Restart_file"]
+        if self.restart_file is not None:
+            restart_fn = os.path.join(self.full_dir, self.restart_file)
+            sig = utilities.file_signature(restart_fn, fast_hash=self.backup_hash)
+            if sig is None:
+                return 0  # no restart file yet
+            backups = self.sim_load_backup_manifest()
+            if len(backups) > 0 and backups[-1].get("signature") == sig:
+                return 1
             ts = (
                 time.time()
             )  # get the timestamp as part of the backup restart file name
             backup_restart_fn = "restart.tmp.%d" % int(ts)
-            if os.path.isfile(os.path.join(self.full_dir, restart_fn)):
-                shutil.copyfile(
-                    os.path.join(self.full_dir, restart_fn),
-                    os.path.join(self.full_dir, backup_restart_fn),
-                )
-                msg = "Restart file has been backup as " + backup_restart_fn
-                print(msg)
+            compression = self.config.get("Backup_compression", "none")
+            backup = {"time": ts, "signature": sig}
+            try:
+                if self.chunk_store is not None:
+                    backup["chunks"], n_written = self.chunk_store.put(restart_fn)
+                    backup_restart_fn = "the checkpoint store"
+                    method = "%d new bytes" % n_written
+                elif compression in utilities.COMPRESSION_SUFFIXES:
+                    backup_restart_fn += utilities.COMPRESSION_SUFFIXES[compression]
+                    utilities.compress_file(restart_fn, os.path.join(self.full_dir, backup_restart_fn), compression)
+                    method = compression
+                else:
+                    method = utilities.copy_file(restart_fn, os.path.join(self.full_dir, backup_restart_fn))
+            except (IOError, OSError, ImportError) as err:
                 if self.logger is not None:
-                    self.logger.info(msg)
-                # delete the oldest backup if there is a limit of maximum number of backup files
-                backup_file_list = sorted(
-                    glob.glob(os.path.join(self.full_dir, "restart.tmp.*"))
-                )
-                if 0 < self.maximum_number_of_checkpoints < len(backup_file_list):
-                    for backup_restart_del_fn in backup_file_list[
-                        : -abs(self.maximum_number_of_checkpoints)
-                    ]:
-                        os.remove(os.path.join(self.full_dir, backup_restart_del_fn))
+                    self.logger.error("Cannot back up the restart file of %s: %s" % (self.name, err))
+                return -1
+            if self.chunk_store is None:
+                backup["file"] = backup_restart_fn
+                if len(backups) > 0 and backups[-1].get("file") == backup_restart_fn:
+                    backups.pop()  # overwritten within the same second
+            backups.append(backup)
+            msg = "Restart file has been backup as %s (%s)" % (backup_restart_fn, method)
+            print(msg)
+            if self.logger is not None:
+                self.logger.info(msg)
+            # delete the old backups
+            retention = self.config.get("Backup_retention", [])
+            if len(retention) > 0:
+                keep = utilities.select_retained([backup["time"] for backup in backups], ts, retention)
+            elif 0 < self.maximum_number_of_checkpoints < len(backups):
+                keep = range(len(backups) - self.maximum_number_of_checkpoints, len(backups))
+            else:
+                keep = range(len(backups))
+            keep = set(keep)
+            for i, backup in enumerate(backups):
+                # backups in the checkpoint store are only dropped from the manifest, their chunks are deleted by
+                # ChunkStore.gc() once they are not referenced anymore
+                if i not in keep and "file" in backup:
+                    try:
+                        os.remove(os.path.join(self.full_dir, backup["file"]))
+                    except OSError:
+                        pass
+            backups[:] = [backup for i, backup in enumerate(backups) if i in keep]
+            self.sim_save_backup_manifest()
         else:
             # Without knowing the name of the restartable snapshot, SiMon will not be able to backup
             if self.logger is not None:
@@ -566,7 +903,41 @@ class Simulation(ABC):
                     % self.name
                 )
             return -1
-        os.chdir(orig_dir)
+        return 0
+
+    def sim_restore_checkpoint(self, backup_file=None):
+        """
+        Restore the restart file from a backup, decompressing it (or reassembling it from the checkpoint store) if
+        needed.
+
+        :param backup_file: The file name of the backup (default: the newest backup).
+        :return: Return 0 if succeed, -1 if there is no backup to restore.
+        """
+        if "Restart_file" not in self.config:
+            return -1
+        restart_fn = os.path.join(self.full_dir, self.config["Restart_file"])
+        backup = None
+        if backup_file is None:
+            backups = self.sim_load_backup_manifest()
+            if len(backups) == 0:
+                return -1
+            backup = backups[-1]
+            backup_file = backup.get("file", "the checkpoint store")
+        try:
+            if backup is not None and "chunks" in backup:
+                if self.chunk_store is None:
+                    raise IOError("the checkpoint store is not enabled")
+                self.chunk_store.get(backup["chunks"], restart_fn)
+            else:
+                utilities.decompress_file(os.path.join(self.full_dir, backup_file), restart_fn)
+        except (IOError, OSError, ImportError) as err:
+            if self.logger is not None:
+                self.logger.error("Cannot restore the restart file of %s from %s: %s" % (self.name, backup_file, err))
+            return -1
+        msg = "Restart file of %s has been restored from %s" % (self.name, backup_file)
+        print(msg)
+        if self.logger is not None:
+            self.logger.info(msg)
         return 0
 
     def sim_delete(self):
@@ -607,16 +978,13 @@ class Simulation(ABC):
             color='cyan',
             bold=True)
         )
-        original_dir = os.getcwd()
-        os.chdir(self.full_dir)
-        os.system(shell_command)
+        subprocess.call(shell_command, shell=True, cwd=self.full_dir)
         sys.stdout.write(utilities.highlighted_text(
             "========== [DONE] Command on #%d ==> %s (PWD=%s) ==========\n"
             % (self.id, self.full_dir, self.full_dir),
             color='cyan',
             bold=True)
         )
-        os.chdir(original_dir)
         return 0
 
     def sim_clean(self):
@@ -667,17 +1035,12 @@ class Simulation(ABC):
             print(utilities.highlighted_text("========== Diagnose for #%d ==> %s ==========\n" % (self.id, self.full_dir),
                 color='yellow',
                 bold=True))
-            check_dir_name = self.full_dir
-            original_dir = os.getcwd()
-            os.chdir(check_dir_name)
-            os.system("\ntail -%d %s" % (lines, output_file))
-            restart_dir = sorted(glob.glob("restart*/"))
+            subprocess.call("tail -%d %s" % (lines, output_file), shell=True, cwd=self.full_dir)
+            restart_dir = sorted(glob.glob(os.path.join(self.full_dir, "restart*/")))
             for r_dir in restart_dir:
-                os.chdir(r_dir)
                 sys.stdout.write(
-                    "========== Diagnose for restart ==> %s ==========\n" % r_dir
+                    "========== Diagnose for restart ==> %s ==========\n" % os.path.relpath(r_dir, self.full_dir)
                 )
-                os.system("\ntail -%d %s" % (lines, output_file))
-                os.chdir("..")
-            os.chdir(original_dir)
+                sys.stdout.flush()
+                subprocess.call("tail -%d %s" % (lines, output_file), shell=True, cwd=r_dir)
         return str()
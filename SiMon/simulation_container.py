@@ -3,16 +3,33 @@
 A container for simulations.
 
 """
+import logging
 import os 
+import time
 from fnmatch import fnmatch
 import configparser as cp 
 from SiMon.simulation import Simulation
 from SiMon import utilities
+from SiMon.plugin_registry import PluginRegistry
+
+# The columns of the status table (see SimulationContainer.get_status_table()), as a NumPy structured dtype
+STATUS_TABLE_DTYPE = [
+    ("id", "i8"),
+    ("parent", "i8"),
+    ("level", "i4"),
+    ("status", "i1"),
+    ("t", "f8"),
+    ("t_min", "f8"),
+    ("t_max", "f8"),
+    ("mtime", "f8"),
+    ("niceness", "i4"),
+]
 
 
 class SimulationContainer(object):
 
-    def __init__(self, root_dir=None) -> None:
+    def __init__(self, root_dir=None, state_store=None, supervisor=None, chunk_store=None, max_depth=0,
+                 exclude_patterns=None, full_scan_cycles=0) -> None:
 
         # The root directory on the file system containing all simulation data
         if root_dir is not None:
@@ -23,84 +40,359 @@ class SimulationContainer(object):
         self.selected_inst = []  # A list of the IDs of selected simulation instances
         self.sim_inst_dict = dict() # the container of all Simulation objects (ID to object mapping)
         self.sim_inst_parent_dict = dict() # given the current path, find out the instance of the parent
+        self.dir_signatures = dict() # the signature of each scanned directory (path to signature mapping)
+        # the listed directories that are not simulations (yet), e.g. created before their config files have been
+        # written (parent path to {path: config file signature} mapping)
+        self.skipped_dirs = dict()
+        self.full_scan_cycles = full_scan_cycles # the number of incremental builds between two full rescans (0: never)
+        self.incremental_builds = 0 # the number of incremental builds since the last full rescan
+        self.inst_id = 0
+        self.executor = None # an optional concurrent.futures executor to probe the simulations in parallel
+        self.state_store = state_store # an optional StateStore, written through whenever the tree is updated
+        self.supervisor = supervisor # an optional Supervisor, used by the simulations to launch their processes
+        self.chunk_store = chunk_store # an optional ChunkStore, used by the simulations to back up their checkpoints
+        self.chunk_store_gc_interval = 3600 # the minimum time (in seconds) between two garbage collections of the store
+        self.last_build_full = False # whether the last update of the tree was a full scan of the root directory
+        self.restart_pattern = "restart*" # the names of the restart directories of a simulation
+        self.max_depth = max_depth # the maximum level of the simulations in the tree (0: unlimited)
+        self.exclude_patterns = list(exclude_patterns or []) # the names of the directories never scanned (glob patterns)
+        self.status_keys = dict() # the (status, niceness, level) of each simulation at the last update (ID to key mapping)
+        self.changed_ids = None # the IDs of the simulations whose keys have changed (None: everything has changed)
+        self.status_table = None # the columnar snapshot of the simulations (see get_status_table())
+        self.status_table_dirty = None # the IDs of the rows to update in the snapshot (None: rebuild it)
+        self.status_rows = dict() # the rows of the snapshot as of the last update (ID to row mapping)
+
+        self.sim_tree = Simulation(0, "root", self.root_dir, Simulation.STATUS_NEW)
+        self.plugin_registry = PluginRegistry([utilities.get_simon_dir(), os.getcwd()])
+        self.plugin_registry.discover()
         
-        self.sim_tree = Simulation(0, "root", root_dir, Simulation.STATUS_NEW)
-        self.module_dict = utilities.register_simon_modules(module_dir=utilities.get_simon_dir(), user_shell_dir=os.getcwd())
-        
-    def traverse_simulation_dir_tree(self, pattern, base_dir, files):
-        """
-        Traverse the simulation file structure tree (Breadth-first search), until the leaf (i.e. no restart directory)
-        or the simulation is not restartable (directory with the 'STOP' file).
-        """
-        for filename in sorted(files):
-            if fnmatch(filename, pattern):
-                if os.path.isdir(os.path.join(base_dir, filename)):
-                    fullpath = os.path.join(base_dir, filename)
-                    self.inst_id += 1
-                    id = self.inst_id
-
-                    # Try to determine the simulation code type by reading the config file
-                    sim_config = utilities.parse_config_file(
-                        os.path.join(fullpath, "SiMon.conf"),
-                        section='Simulation'
+    def list_simulation_dirs(self, parent_inst):
+        """
+        List the sub-directories of `parent_inst` that may hold simulations: all the sub-directories of the root
+        directory, and the restart directories (matching `restart_pattern`) of the simulations. Directories matching
+        one of `exclude_patterns` and directories deeper than `max_depth` are skipped.
+
+        :return: The list of os.DirEntry objects, sorted by name.
+        """
+        level = parent_inst.level + 1
+        if 0 < self.max_depth < level:
+            return []
+        pattern = "*" if parent_inst.id == 0 else self.restart_pattern
+        try:
+            with os.scandir(parent_inst.full_dir) as it:
+                entries = [
+                    entry for entry in it
+                    if fnmatch(entry.name, pattern)
+                    and not any(fnmatch(entry.name, exclude) for exclude in self.exclude_patterns)
+                    and entry.is_dir()
+                    and (self.chunk_store is None or entry.path != self.chunk_store.store_dir)
+                ]
+        except OSError:
+            return []
+        return sorted(entries, key=lambda entry: entry.name)
+
+    def traverse_simulation_dir_tree(self, parent_inst):
+        """
+        Traverse the simulation file structure tree (Depth-first search), until the leaf (i.e. no restart directory).
+        Only the directories listed by list_simulation_dirs() are visited, so that the (possibly huge) data
+        directories of the simulations are never walked.
+        """
+        candidates = []
+        entries = self.list_simulation_dirs(parent_inst)
+        for entry in entries:
+            self.inst_id += 1
+            candidates.append((self.inst_id, entry.name, entry.path))
+
+        # instantiating a simulation parses its config file and probes its status
+        sim_insts = self.map_simulations(lambda candidate: self.create_simulation(*candidate), candidates)
+        children = []
+        skipped = dict()
+        for entry, sim_inst in zip(entries, sim_insts):
+            if sim_inst is None:
+                skipped[entry.path] = self.get_config_signature(entry.path)
+                continue
+            self.register_simulation(sim_inst, parent_inst)
+            self.dir_signatures[entry.path] = self.get_dir_signature(entry.path, entry.stat())
+
+            # Get simulation status
+            sim_inst.sim_get_status()
+            self.link_to_parent(sim_inst)
+            children.append(sim_inst)
+        self.set_skipped_dirs(parent_inst, skipped)
+        for sim_inst in children:
+            self.traverse_simulation_dir_tree(sim_inst)
+
+    def map_simulations(self, func, items):
+        """
+        Apply `func` to every item, using the executor (if any) to process the items in parallel.
+
+        :return: A list with the results, in the order of `items`.
+        """
+        if self.executor is None:
+            return [func(item) for item in items]
+        return list(self.executor.map(func, items))
+
+    def probe_simulations(self, sim_insts):
+        """
+        Probe the status of the given simulations, unless they have already been probed in the current status cycle.
+        """
+        sim_insts = [
+            inst for inst in sim_insts if inst.status_cycle != Simulation.current_status_cycle
+        ]
+        self.map_simulations(lambda inst: inst.sim_probe(), sim_insts)
+
+    def create_simulation(self, sim_id, filename, fullpath):
+        """
+        Instantiate the simulation in the given directory, using the code module specified in its config file.
+
+        :return: The Simulation object, or None if the directory is not a valid SiMon simulation directory.
+        """
+        # Try to determine the simulation code type by reading the config file
+        sim_config = utilities.parse_config_file(
+            os.path.join(fullpath, "SiMon.conf"),
+            section='Simulation',
+            readonly=True
+        )
+        sim_inst = None
+        if sim_config is not None:
+            try:
+                sim_class = self.plugin_registry.get_class(sim_config["Code_name"])
+                if sim_class is not None:
+                    sim_inst = sim_class(
+                        sim_id,
+                        filename,
+                        fullpath,
+                        Simulation.STATUS_NEW,
+                        logger=utilities.get_logger(),
                     )
-                    sim_inst = None
-                    if sim_config is not None:
-                        try:
-                            code_name = sim_config["Code_name"]
-                            if code_name in self.module_dict:
-                                sim_inst_mod = __import__(self.module_dict[code_name])
-                                sim_inst = getattr(sim_inst_mod, code_name)(
-                                    id,
-                                    filename,
-                                    fullpath,
-                                    Simulation.STATUS_NEW,
-                                    logger=utilities.get_logger(),
-                                )
-                        except (cp.NoOptionError, cp.NoSectionError):
-                            pass
-                    else:
-                        # If there is no SiMon.conf file, then it is not considered as a valid SiMon simulation directory
-                        continue
-                    if sim_inst is None:
-                        continue
-                    self.sim_inst_dict[id] = sim_inst
-                    sim_inst.id = id
-                    sim_inst.fulldir = fullpath
-                    sim_inst.name = filename
-
-                    # register child to the parent
-                    self.sim_inst_parent_dict[base_dir].restarts.append(sim_inst)
-                    sim_inst.level = self.sim_inst_parent_dict[base_dir].level + 1
-                    # register the node itself in the parent tree
-                    self.sim_inst_parent_dict[fullpath] = sim_inst
-                    sim_inst.parent_id = self.sim_inst_parent_dict[base_dir].id
-
-                    # Get simulation status
-                    sim_inst.sim_get_status()
-
-                    self.sim_inst_dict[sim_inst.parent_id].status = sim_inst.status
-
-                    if (
-                        sim_inst.t > self.sim_inst_dict[sim_inst.parent_id].t
-                        and not os.path.isfile(os.path.join(sim_inst.fulldir, "ERROR"))
-                    ) or sim_inst.status == Simulation.STATUS_RUN:
-                        # nominate as restart candidate
-                        self.sim_inst_dict[sim_inst.parent_id].cid = sim_inst.id
-                        self.sim_inst_dict[
-                            sim_inst.parent_id
-                        ].t_max_extended = sim_inst.t_max_extended
-
-    def build_simulation_tree(self):
+            except (cp.NoOptionError, cp.NoSectionError):
+                pass
+        # If there is no SiMon.conf file, then it is not considered as a valid SiMon simulation directory
+        return sim_inst
+
+    def register_simulation(self, sim_inst, parent_inst):
+        """
+        Register a newly created simulation in the tree as a child (restart) of `parent_inst`.
+        """
+        self.sim_inst_dict[sim_inst.id] = sim_inst
+        sim_inst.fulldir = sim_inst.full_dir
+        sim_inst.state_store = self.state_store
+        sim_inst.supervisor = self.supervisor
+        sim_inst.chunk_store = self.chunk_store
+
+        # register child to the parent
+        parent_inst.restarts.append(sim_inst)
+        sim_inst.level = parent_inst.level + 1
+        # register the node itself in the parent tree
+        self.sim_inst_parent_dict[sim_inst.full_dir] = sim_inst
+        sim_inst.parent_id = parent_inst.id
+
+    def unregister_simulation(self, sim_inst):
+        """
+        Remove a simulation and all its restarts from the tree, e.g. when its directory has been deleted.
+        """
+        for child in sim_inst.restarts:
+            self.unregister_simulation(child)
+        self.sim_inst_dict.pop(sim_inst.id, None)
+        if self.status_keys.pop(sim_inst.id, None) is not None and self.changed_ids is not None:
+            self.changed_ids.add(sim_inst.id)
+        if self.status_table_dirty is not None:
+            self.status_table_dirty.add(sim_inst.id)
+        self.status_rows.pop(sim_inst.id, None)
+        self.sim_inst_parent_dict.pop(sim_inst.full_dir, None)
+        self.dir_signatures.pop(sim_inst.full_dir, None)
+        self.skipped_dirs.pop(sim_inst.full_dir, None)
+        if self.state_store is not None:
+            self.state_store.remove([sim_inst.full_dir])
+
+    def link_to_parent(self, sim_inst):
+        """
+        Propagate the status of a (restarted) simulation to its parent, and nominate it as the restart candidate
+        of the parent if it has advanced further.
+        """
+        parent_inst = self.sim_inst_dict[sim_inst.parent_id]
+        parent_inst.status = sim_inst.status
+
+        if (
+            sim_inst.t > parent_inst.t
+            and not os.path.isfile(os.path.join(sim_inst.fulldir, "ERROR"))
+        ) or sim_inst.status == Simulation.STATUS_RUN:
+            # nominate as restart candidate
+            parent_inst.cid = sim_inst.id
+            parent_inst.t_max_extended = sim_inst.t_max_extended
+
+    @staticmethod
+    def get_dir_signature(fullpath, dir_stat=None):
+        """
+        The signature of a directory: the (st_mtime_ns, st_size) of the directory itself, of its SiMon.conf and of
+        its .process.pid. A directory is rescanned only when its signature changes.
+
+        :param dir_stat: The stat result of the directory, if already known (e.g. from os.scandir()).
+        """
+        signature = []
+        for path in (
+            fullpath,
+            os.path.join(fullpath, "SiMon.conf"),
+            os.path.join(fullpath, ".process.pid"),
+        ):
+            try:
+                st = dir_stat if path is fullpath and dir_stat is not None else os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    @staticmethod
+    def get_config_signature(fullpath):
+        """
+        The signature of the config file of a directory that is not a simulation: the (st_mtime_ns, st_size) of its
+        SiMon.conf, or None if there is no config file.
+        """
+        try:
+            st = os.stat(os.path.join(fullpath, "SiMon.conf"))
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def set_skipped_dirs(self, parent_inst, skipped):
+        """
+        Remember the sub-directories of `parent_inst` that have been listed but are not simulations.
+
+        :param skipped: The signatures of their config files (path to signature mapping).
+        """
+        if len(skipped) > 0:
+            self.skipped_dirs[parent_inst.full_dir] = skipped
+        else:
+            self.skipped_dirs.pop(parent_inst.full_dir, None)
+
+    def get_relist_dirs(self):
+        """
+        Check the config files of the listed directories that are not simulations. A config file may be written after
+        its directory has been created (and listed), which does not change the signature of the parent directory.
+
+        :return: The set of the directories to list again, as the config file of one of their sub-directories has
+        changed.
+        """
+        return set(
+            parent_dir for parent_dir, skipped in self.skipped_dirs.items()
+            if any(self.get_config_signature(path) != signature for path, signature in skipped.items())
+        )
+
+    def refresh_simulation(self, sim_inst):
+        """
+        Update a simulation that is already in the tree. The config file is re-parsed only if the directory
+        signature has changed since the last scan.
+
+        :return: True if the content of the directory may have changed (i.e. its restarts have to be listed again).
+        """
+        signature = self.get_dir_signature(sim_inst.full_dir)
+        last_signature = self.dir_signatures.get(sim_inst.full_dir)
+        if signature != last_signature:
+            self.dir_signatures[sim_inst.full_dir] = signature
+            sim_inst.parse_config_file()
+            sim_inst.sim_invalidate_status()  # the snapshot may have been taken with the old config
+        # evaluate the status from scratch, as a newly built instance would do
+        sim_inst.status = Simulation.STATUS_NEW
+        sim_inst.sim_get_status()
+        return last_signature is None or signature[0] != last_signature[0]
+
+    def sync_restarts(self, parent_inst):
+        """
+        Synchronize the children of `parent_inst` with the sub-directories on the file system: new simulation
+        directories are added to the tree, and simulations whose directories have disappeared are removed.
+        """
+        known_children = dict((child.name, child) for child in parent_inst.restarts)
+        restarts = []
+        skipped = dict()
+        for entry in self.list_simulation_dirs(parent_inst):
+            if entry.name in known_children:
+                restarts.append(known_children.pop(entry.name))
+                continue
+            sim_inst = self.create_simulation(self.inst_id + 1, entry.name, entry.path)
+            if sim_inst is None:
+                skipped[entry.path] = self.get_config_signature(entry.path)
+                continue
+            self.inst_id += 1
+            self.register_simulation(sim_inst, parent_inst)
+            restarts.append(sim_inst)
+        for sim_inst in known_children.values():
+            self.unregister_simulation(sim_inst)
+        parent_inst.restarts[:] = restarts
+        self.set_skipped_dirs(parent_inst, skipped)
+
+    def update_restarts(self, parent_inst, relist, relist_dirs=()):
+        """
+        Incrementally update the subtree below `parent_inst`. Directories are only listed again if `relist` is True
+        (for `parent_inst`), if their signatures have changed (for the descendants), or if they are in `relist_dirs`
+        (see get_relist_dirs()).
+        """
+        if relist or parent_inst.full_dir in relist_dirs:
+            self.sync_restarts(parent_inst)
+        parent_inst.cid = -1
+        parent_inst.t_max_extended = parent_inst.t_max
+        relist_children = []
+        for sim_inst in parent_inst.restarts:
+            relist_children.append(self.refresh_simulation(sim_inst))
+            self.link_to_parent(sim_inst)
+        for sim_inst, relist_child in zip(parent_inst.restarts, relist_children):
+            self.update_restarts(sim_inst, relist_child, relist_dirs)
+
+    def build_simulation_tree(self, full_rescan=False):
         """
         Generate the simulation tree data structure, so that a restarted simulation can trace back
         to its ancestor.
 
+        The tree is kept between calls. After the first call, only the directories whose signatures have changed
+        are rescanned, and the existing Simulation objects are updated in place. As a safety net, the tree is rebuilt
+        from scratch every `full_scan_cycles` calls. With a state store, the first call restores the tree from the
+        store (see load_simulation_tree()) instead of walking the root directory.
+
+        :param full_rescan: Discard the current tree and rebuild it by walking the whole root directory.
+
         :return: The method has no return. The result is stored in self.sim_tree.
         :type: None
         """
-        os.chdir(self.root_dir)
-        self.sim_inst_dict = dict()
+        if 0 < self.full_scan_cycles <= self.incremental_builds:
+            full_rescan = True
+        if not full_rescan and len(self.sim_inst_dict) == 0 and self.state_store is not None:
+            self.load_simulation_tree()
+        self.last_build_full = full_rescan or len(self.sim_inst_dict) == 0
+        if self.last_build_full:
+            self.incremental_builds = 0
+            self.reset_tree()
+            self.dir_signatures[self.root_dir] = self.get_dir_signature(self.root_dir)
+            self.traverse_simulation_dir_tree(self.sim_tree)
+            if self.state_store is not None:
+                # forget the simulations that have disappeared since the store was last written
+                self.state_store.prune([inst.full_dir for inst in self.sim_inst_dict.values() if inst.id > 0])
+            self.collect_chunk_garbage()
+        else:
+            self.incremental_builds += 1
+            root_signature = self.get_dir_signature(self.root_dir)
+            relist = root_signature != self.dir_signatures.get(self.root_dir)
+            self.dir_signatures[self.root_dir] = root_signature
+            # take the status snapshots of all known simulations at once, so that they can be probed in parallel
+            self.probe_simulations([inst for inst in self.sim_inst_dict.values() if inst.id > 0])
+            self.update_restarts(self.sim_tree, relist, self.get_relist_dirs())
+
+        self.propagate_status(self.sim_tree.restarts)
+        self.track_changes(self.sim_inst_dict.values())
+        self.save_state([inst for inst in self.sim_inst_dict.values() if inst.id > 0])
+        return 0
+
+    def reset_tree(self):
+        """
+        Discard the current tree, leaving only the root node.
+        """
+        # the simulations are numbered again, so everything has to be considered changed
+        self.status_keys.clear()
+        self.changed_ids = None
+        self.status_table_dirty = None
+        self.status_rows.clear()
+        self.sim_inst_dict.clear()
+        self.sim_inst_parent_dict.clear()
+        self.dir_signatures.clear()
+        self.skipped_dirs.clear()
 
         self.sim_tree = Simulation(
             0, "root", self.root_dir, Simulation.STATUS_NEW
@@ -112,36 +404,256 @@ class SimulationContainer(object):
         ] = self.sim_tree  # map the current dir to be the sim tree root
         self.inst_id = 0
 
-        for directory, dirnames, filenames in os.walk(self.root_dir):
-            self.traverse_simulation_dir_tree("*", directory, dirnames)
-
-        # Synchronize the status tree (status propagation)
-        update_needed = True
-        max_iter = 0
-        while update_needed and max_iter < 30:
-            max_iter += 1
-            inst_status_modified = False
-            for i in self.sim_inst_dict:
-                if i == 0:
-                    continue
-                inst = self.sim_inst_dict[i]
-                if (
-                    inst.status == Simulation.STATUS_RUN
-                    or inst.status == Simulation.STATUS_DONE
-                ):
-                    if (
-                        inst.parent_id > 0
-                        and self.sim_inst_dict[inst.parent_id].status != inst.status
-                    ):
+    def load_simulation_tree(self):
+        """
+        Restore the simulation tree from the state store, without listing the simulation directories. The simulations
+        are created from their stored paths, and the stored directory signatures are taken over, so that the next
+        update only lists the root directory and the directories that have changed since the store was written.
+        Stored simulations whose directories are no longer valid are removed from the store.
+
+        :return: True if the tree has been restored, False if the store is empty.
+        """
+        rows = self.state_store.query()
+        if len(rows) == 0:
+            return False
+        children = dict()  # parent path => the stored rows of its restarts
+        for row in rows:
+            children.setdefault(row["parent_path"] or self.root_dir, []).append(row)
+        self.reset_tree()
+        self.restore_restarts(self.sim_tree, children)
+        stale_paths = [row["path"] for row in rows if row["path"] not in self.sim_inst_parent_dict]
+        if len(stale_paths) > 0:
+            self.state_store.remove(stale_paths)
+        return True
+
+    def restore_restarts(self, parent_inst, children):
+        """
+        Create the stored restarts of `parent_inst` (in the order of traverse_simulation_dir_tree()), and their
+        descendants.
+
+        :param children: The stored rows, grouped by the path of their parents.
+        """
+        rows = sorted(children.get(parent_inst.full_dir, ()), key=lambda row: row["name"])
+        candidates = []
+        for row in rows:
+            self.inst_id += 1
+            candidates.append((self.inst_id, row["name"], row["path"]))
+        sim_insts = self.map_simulations(lambda candidate: self.create_simulation(*candidate), candidates)
+        restored = []
+        skipped = dict()
+        for row, sim_inst in zip(rows, sim_insts):
+            if sim_inst is None:
+                # not a simulation anymore, but its config file may be written again
+                skipped[row["path"]] = self.get_config_signature(row["path"])
+                continue
+            self.register_simulation(sim_inst, parent_inst)
+            self.dir_signatures[row["path"]] = row["signature"]
+            restored.append(sim_inst)
+        self.set_skipped_dirs(parent_inst, skipped)
+        for sim_inst in restored:
+            self.restore_restarts(sim_inst, children)
+
+    def collect_chunk_garbage(self, force=False):
+        """
+        Delete the chunks of the checkpoint store that are not referenced by the backups of any simulation anymore.
+        This is done at most once every `chunk_store_gc_interval` seconds, unless `force` is set.
+
+        The store is shared by all the backups ever written under the root directory, so the collection only takes
+        place right after a full scan without `max_depth` and `exclude_patterns` (i.e. when all the simulations are in
+        the tree), and it is abandoned if the manifest of a simulation cannot be read.
+
+        :return: The number of bytes freed.
+        """
+        if self.chunk_store is None:
+            return 0
+        if not self.last_build_full or self.max_depth > 0 or len(self.exclude_patterns) > 0:
+            return 0
+        if not force and time.time() - self.chunk_store.last_gc < self.chunk_store_gc_interval:
+            return 0
+        # the listed directories that are not simulations (e.g. whose config file is being rewritten) are included
+        sim_dirs = [inst.full_dir for inst in self.sim_inst_dict.values() if inst.id > 0]
+        sim_dirs.extend(path for skipped in self.skipped_dirs.values() for path in skipped)
+        live_digests = set()
+        for sim_dir in sim_dirs:
+            try:
+                backups = Simulation.read_backup_manifest(sim_dir)
+            except ValueError as err:
+                logging.getLogger("DaemonLog").warning("Checkpoint store garbage collection skipped. %s" % err)
+                return 0
+            for backup in backups or ():
+                live_digests.update(digest for digest, _ in backup.get("chunks", ()))
+        return self.chunk_store.gc(live_digests)
+
+    def track_changes(self, sim_insts):
+        """
+        Record the simulations whose status, niceness or level has changed since the last update, so that the
+        scheduler only needs to look at these (see pop_changed_simulations()), and the simulations whose rows of the
+        status table have changed (see get_status_table()).
+        """
+        for inst in sim_insts:
+            if inst.id == 0:
+                continue
+            if self.status_table_dirty is not None:
+                row = self.get_status_row(inst)
+                if self.status_rows.get(inst.id) != row:
+                    self.status_rows[inst.id] = row
+                    self.status_table_dirty.add(inst.id)
+            key = (inst.status, inst.niceness, inst.level)
+            if self.status_keys.get(inst.id) != key:
+                self.status_keys[inst.id] = key
+                if self.changed_ids is not None:
+                    self.changed_ids.add(inst.id)
+
+    def pop_changed_simulations(self):
+        """
+        :return: The set of the IDs of the simulations that have changed (or have been removed) since the last call,
+        or None if the whole tree has been rebuilt and every simulation has to be considered changed.
+        """
+        changed_ids = self.changed_ids
+        self.changed_ids = set()
+        return changed_ids
+
+    @staticmethod
+    def get_status_row(inst):
+        """
+        :return: The row of the status table for a simulation, as a tuple.
+        """
+        return (inst.id, inst.parent_id, inst.level, inst.status, inst.t, inst.t_min, inst.t_max, inst.mtime,
+                inst.niceness)
+
+    @staticmethod
+    def make_status_rows(sim_insts):
+        """
+        :return: The rows of the status table for the given simulations.
+        """
+        import numpy as np
+        return np.array(
+            [SimulationContainer.get_status_row(inst) for inst in sim_insts], dtype=STATUS_TABLE_DTYPE
+        )
+
+    def get_status_table(self):
+        """
+        Get a columnar snapshot of the simulations, for vectorized queries, e.g.::
+
+            table = container.get_status_table()
+            n_running = np.count_nonzero(table["status"] == Simulation.STATUS_RUN)
+            top = table[table["level"] == 1]
+            progress = np.divide(top["t"], top["t_max"], out=np.zeros(len(top)), where=top["t_max"] > 0)
+
+        The snapshot is a NumPy structured array (see STATUS_TABLE_DTYPE) with one row per simulation (the root is not
+        included), sorted by ID, as of the last update of the tree. It is kept between calls, and only the rows of the
+        simulations updated since the last call are written again. The array is updated in place: copy it to keep a
+        snapshot across updates.
+
+        :return: The structured array.
+        """
+        import numpy as np
+        dirty = self.status_table_dirty
+        self.status_table_dirty = set()
+        if self.status_table is None or dirty is None:
+            sim_insts = sorted((inst for inst in self.sim_inst_dict.values() if inst.id > 0), key=lambda inst: inst.id)
+            self.status_rows = dict((inst.id, self.get_status_row(inst)) for inst in sim_insts)
+            self.status_table = self.make_status_rows(sim_insts)
+            return self.status_table
+        if len(dirty) == 0:
+            return self.status_table
+        table = self.status_table
+        ids = np.array(sorted(dirty), dtype=np.int64)
+        rows = np.searchsorted(table["id"], ids)
+        present = rows < len(table)
+        present[present] = table["id"][rows[present]] == ids[present]
+        live = np.fromiter((sim_id in self.sim_inst_dict for sim_id in ids), dtype=bool, count=len(ids))
+        updated = present & live
+        if updated.any():
+            table[rows[updated]] = self.make_status_rows([self.sim_inst_dict[sim_id] for sim_id in ids[updated]])
+        removed = present & ~live
+        added = ~present & live
+        if removed.any() or added.any():
+            table = np.delete(table, rows[removed])
+            if added.any():
+                table = np.concatenate(
+                    (table, self.make_status_rows([self.sim_inst_dict[sim_id] for sim_id in ids[added]]))
+                )
+                table = table[np.argsort(table["id"], kind="stable")]
+            self.status_table = table
+        return self.status_table
+
+    def save_state(self, sim_insts):
+        """
+        Write the state of the given simulations to the state store (if any).
+        """
+        if self.state_store is None:
+            return
+        parent_paths = [
+            self.sim_inst_dict[inst.parent_id].full_dir if inst.parent_id > 0 else None for inst in sim_insts
+        ]
+        signatures = [self.dir_signatures.get(inst.full_dir) for inst in sim_insts]
+        self.state_store.save(sim_insts, parent_paths, signatures)
+
+    def propagate_status(self, sim_insts):
+        """
+        Synchronize the status tree (status propagation): the RUN/DONE status of restarted simulations is propagated
+        to their parents, in a single post-order pass over each subtree (children before their parents). The same
+        pass updates the pointer of each simulation to the active leaf of its restart chain (following the restart
+        candidates, see link_to_parent()).
+
+        :param sim_insts: The simulations whose subtrees are to be synchronized (typically the top-level ones).
+        """
+        for sim_inst in sim_insts:
+            # iterative pre-order traversal, as restart chains may be deeper than the recursion limit
+            order = []
+            stack = [sim_inst]
+            while stack:
+                inst = stack.pop()
+                order.append(inst)
+                stack.extend(inst.restarts)
+            for inst in reversed(order):
+                for child in inst.restarts:
+                    if child.status == Simulation.STATUS_RUN or child.status == Simulation.STATUS_DONE:
                         # propagate the status of children (restarted simulation) to parents' status
-                        self.sim_inst_dict[inst.parent_id].status = inst.status
-                        inst_status_modified = True
-            if inst_status_modified is True:
-                update_needed = True
-            else:
-                update_needed = False
-        return 0
-        print(self.sim_tree)
+                        inst.status = child.status
+                candidate = self.sim_inst_dict.get(inst.cid) if inst.cid != -1 else None
+                inst.leaf = inst if candidate is None else candidate.leaf
+
+    def refresh_simulation_dirs(self, sim_dirs):
+        """
+        Update only the simulations living in the given directories (e.g. after a file system event), together with
+        the other members of their restart trees.
+
+        :param sim_dirs: A collection of simulation directories (full paths).
+
+        :return: The list of affected top-level simulations, or None if a directory does not belong to a known
+        simulation (e.g. the root directory itself), in which case the whole tree has to be updated.
+        """
+        top_level_insts = []
+        for sim_dir in sim_dirs:
+            sim_inst = self.sim_inst_parent_dict.get(sim_dir)
+            if sim_inst is None or sim_inst.id == 0:
+                return None
+            if not os.path.isdir(sim_dir):
+                return None  # the simulation has been removed, its parent has to be listed again
+            while sim_inst.level > 1:
+                sim_inst = self.sim_inst_dict[sim_inst.parent_id]
+            if sim_inst not in top_level_insts:
+                top_level_insts.append(sim_inst)
+
+        self.probe_simulations([inst for sim_inst in top_level_insts for inst in self.get_subtree(sim_inst)])
+        for sim_inst in top_level_insts:
+            relist = self.refresh_simulation(sim_inst)
+            self.update_restarts(sim_inst, relist)
+            self.propagate_status([sim_inst])
+            self.track_changes(self.get_subtree(sim_inst))
+            self.save_state(self.get_subtree(sim_inst))
+        return top_level_insts
+
+    def get_subtree(self, sim_inst):
+        """
+        :return: A list containing `sim_inst` and all its restarts (recursively).
+        """
+        subtree = [sim_inst]
+        for child in sim_inst.restarts:
+            subtree.extend(self.get_subtree(child))
+        return subtree
 
     def __repr__(self, level=0):
         """
@@ -150,6 +662,7 @@ class SimulationContainer(object):
         :return: start and stop time
         :rtype: int
         """
+        Simulation.new_status_cycle()
         self.build_simulation_tree()
         # print(
             # self.sim_tree
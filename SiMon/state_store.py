@@ -0,0 +1,191 @@
+"""
+An optional SQLite database in the simulation root directory, holding the metadata and the last known status of all
+simulations.
+
+The store is written through by SimulationContainer and Simulation whenever a simulation is scanned or started. When
+SiMon starts, the simulation tree is restored from the store instead of walking the root directory, and only the
+directories whose signatures have changed since are listed again (see SimulationContainer.load_simulation_tree()). The
+store can also be queried (e.g. the NEW simulations ordered by niceness) without touching the file system.
+
+The per-directory files (SiMon.conf, .process.pid and the output files) remain the authoritative source: the status of
+every simulation is still probed from its files, and the tree is rebuilt from the files by a full rescan.
+"""
+
+import json
+import time
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS simulations (
+    path TEXT PRIMARY KEY,
+    name TEXT,
+    parent_path TEXT,
+    level INTEGER,
+    config_hash TEXT,
+    niceness INTEGER,
+    status INTEGER,
+    t REAL,
+    t_min REAL,
+    t_max REAL,
+    pid INTEGER,
+    mtime REAL,
+    ctime REAL,
+    signature TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS simulations_status ON simulations (status);
+CREATE INDEX IF NOT EXISTS simulations_niceness ON simulations (niceness);
+"""
+
+COLUMNS = ("path", "name", "parent_path", "level", "config_hash", "niceness", "status", "t", "t_min", "t_max", "pid",
+           "mtime", "ctime", "signature")
+
+
+class StateStore(object):
+
+    def __init__(self, db_file) -> None:
+        """
+        :param db_file: The path of the SQLite database file (created if it does not exist).
+        """
+        self.db_file = db_file
+        # the store is shared by the probe workers, so all accesses are serialized by the lock
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        # keep the journal file instead of deleting it after each transaction, so that writing to the store does
+        # not change the root directory (WAL mode is avoided as it does not work on network file systems)
+        self.conn.execute("PRAGMA journal_mode=TRUNCATE")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.saved_rows = dict()  # path => the row last written, used to skip unchanged simulations
+
+    @staticmethod
+    def get_row(sim_inst, parent_path=None, signature=None):
+        return (
+            sim_inst.full_dir,
+            sim_inst.name,
+            parent_path,
+            sim_inst.level,
+            sim_inst.sim_get_config_hash(),
+            sim_inst.niceness,
+            sim_inst.status,
+            float(sim_inst.t),
+            float(sim_inst.t_min),
+            float(sim_inst.t_max),
+            sim_inst.pid,
+            float(sim_inst.mtime),
+            float(sim_inst.ctime),
+            json.dumps(signature) if signature is not None else None,
+        )
+
+    @staticmethod
+    def decode_signature(text):
+        """
+        :return: The directory signature (see SimulationContainer.get_dir_signature()) stored as `text`, or None.
+        """
+        if text is None:
+            return None
+        return tuple(tuple(item) if item is not None else None for item in json.loads(text))
+
+    def save(self, sim_insts, parent_paths=None, signatures=None):
+        """
+        Write the state of the given simulations in a single transaction. Simulations whose state has not changed
+        since the last write are skipped.
+
+        :param sim_insts: The Simulation objects.
+        :param parent_paths: The full paths of the parents of the simulations (default: no parent).
+        :param signatures: The signatures of the directories of the simulations (default: unknown).
+        """
+        if parent_paths is None:
+            parent_paths = [None] * len(sim_insts)
+        if signatures is None:
+            signatures = [None] * len(sim_insts)
+        with self.lock:
+            rows = []
+            for sim_inst, parent_path, signature in zip(sim_insts, parent_paths, signatures):
+                row = self.get_row(sim_inst, parent_path, signature)
+                if self.saved_rows.get(row[0]) != row:
+                    rows.append(row)
+            if len(rows) == 0:
+                return
+            now = time.time()
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO simulations (%s, updated) VALUES (%s)"
+                    % (", ".join(COLUMNS), ", ".join(["?"] * (len(COLUMNS) + 1))),
+                    [row + (now,) for row in rows],
+                )
+            for row in rows:
+                self.saved_rows[row[0]] = row
+
+    def update(self, sim_inst):
+        """
+        Update the status, the process ID and the timestamps of a simulation that is already in the store, e.g.
+        right after it has been started.
+        """
+        row = self.get_row(sim_inst)
+        with self.lock:
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE simulations SET config_hash = ?, niceness = ?, status = ?, t = ?, pid = ?, mtime = ?, "
+                    "ctime = ?, updated = ? WHERE path = ?",
+                    (row[4], row[5], row[6], row[7], row[10], row[11], row[12], time.time(), row[0]),
+                )
+            self.saved_rows.pop(row[0], None)
+
+    def remove(self, paths):
+        """
+        Remove the simulations in the given directories (e.g. after they have been deleted).
+        """
+        with self.lock:
+            with self.conn:
+                self.conn.executemany("DELETE FROM simulations WHERE path = ?", [(path,) for path in paths])
+            for path in paths:
+                self.saved_rows.pop(path, None)
+
+    def prune(self, paths):
+        """
+        Remove the simulations that are not in `paths` (e.g. after a full scan of the root directory).
+        """
+        paths = set(paths)
+        with self.lock:
+            stale_paths = [row[0] for row in self.conn.execute("SELECT path FROM simulations") if row[0] not in paths]
+            with self.conn:
+                self.conn.executemany("DELETE FROM simulations WHERE path = ?", [(path,) for path in stale_paths])
+            for path in stale_paths:
+                self.saved_rows.pop(path, None)
+
+    def query(self, status=None, level=None):
+        """
+        Query the stored simulations, ordered by priority (niceness).
+
+        :param status: Only return the simulations with this status code (or with one of these status codes, if a list
+        or a tuple is given).
+        :param level: Only return the simulations at this level of the tree (1: top-level simulations).
+
+        :return: A list of dictionaries, one per simulation (the directory signatures are decoded).
+        """
+        conditions = []
+        args = []
+        if isinstance(status, (list, tuple)):
+            conditions.append("status IN (%s)" % ", ".join(["?"] * len(status)))
+            args.extend(status)
+        elif status is not None:
+            conditions.append("status = ?")
+            args.append(status)
+        if level is not None:
+            conditions.append("level = ?")
+            args.append(level)
+        sql = "SELECT %s FROM simulations" % ", ".join(COLUMNS)
+        if len(conditions) > 0:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY niceness, path"
+        with self.lock:
+            rows = [dict(zip(COLUMNS, row)) for row in self.conn.execute(sql, args)]
+        for row in rows:
+            row["signature"] = self.decode_signature(row["signature"])
+        return rows
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
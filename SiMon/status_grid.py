@@ -0,0 +1,148 @@
+"""
+A lightweight status dashboard: a self-contained HTML page (or SVG image) showing the status and the progress of the
+simulations on a grid, with the same symbols and colormap as the progress plot of VisualizationCallback, but written
+directly from the state of the container, without matplotlib. It is cheap enough to be rewritten in every scheduling
+cycle, even for tens of thousands of simulations.
+"""
+
+import os
+from html import escape
+from SiMon.simulation import Simulation
+from SiMon.callback import Callback
+from SiMon import utilities
+
+
+# The RdYlBu colormap (ColorBrewer, as used by matplotlib), from progress 0 (red) to 1 (blue)
+RDYLBU = [
+    (0xa5, 0x00, 0x26), (0xd7, 0x30, 0x27), (0xf4, 0x6d, 0x43), (0xfd, 0xae, 0x61), (0xfe, 0xe0, 0x90),
+    (0xff, 0xff, 0xbf), (0xe0, 0xf3, 0xf8), (0xab, 0xd9, 0xe9), (0x74, 0xad, 0xd1), (0x45, 0x75, 0xb4),
+    (0x31, 0x36, 0x95),
+]
+
+
+def make_colormap(colors, n=256):
+    """
+    Interpolate a list of colors into a lookup table of `n` hexadecimal colors.
+    """
+    table = []
+    for i in range(n):
+        x = i / (n - 1.0) * (len(colors) - 1)
+        j = min(int(x), len(colors) - 2)
+        f = x - j
+        table.append("#%02x%02x%02x" % tuple(
+            int(round(c0 + (c1 - c0) * f)) for c0, c1 in zip(colors[j], colors[j + 1])
+        ))
+    return table
+
+
+class StatusGridCallback(Callback):
+
+    CELL = 24  # the size of a grid cell, in pixels
+    COLORS = make_colormap(RDYLBU)
+
+    # the SVG shapes of the symbols of the progress plot ('o', 's', '>', '^', '*', 'x'), centered at (0, 0)
+    SYMBOLS = [
+        '<circle r="9"/>',
+        '<rect x="-8" y="-8" width="16" height="16"/>',
+        '<polygon points="-8,-9 9,0 -8,9"/>',
+        '<polygon points="0,-9 9,8 -9,8"/>',
+        '<polygon points="0,-10 2.4,-3.3 9.5,-3.1 3.8,1.2 5.9,8.1 0,4 -5.9,8.1 -3.8,1.2 -9.5,-3.1 -2.4,-3.3"/>',
+        '<path d="M-8,-8L8,8M-8,8L8,-8" stroke="currentColor" stroke-width="3"/>',
+    ]
+
+    def __init__(self, **kwargs) -> None:
+        """
+        :param container: The SimulationContainer.
+        :param file: The file to write, an HTML page or (if it ends with .svg) an SVG image [Default: status.html].
+        :param refresh: The interval (in seconds) at which the HTML page reloads itself (0: never) [Default: 60].
+        """
+        super().__init__(**kwargs)
+        self.last_content = None
+
+    def run(self):
+        self.write_status_grid()
+
+    def render_svg(self, sims, num_sim):
+        """
+        :return: The SVG image of the status grid.
+        """
+        number, y_num = utilities.get_grid_shape(max(num_sim, 1))
+        cell = StatusGridCallback.CELL
+        width, height = number * cell, y_num * cell
+        label_ids = len(str(num_sim)) <= 4  # skip the IDs if they do not fit into the cells
+        parts = [
+            '<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" viewBox="0 0 %d %d" '
+            'font-family="sans-serif" font-size="8" font-weight="bold" text-anchor="middle">' % (
+                width, height, width, height),
+            '<defs>',
+        ]
+        for i, symbol in enumerate(StatusGridCallback.SYMBOLS):
+            parts.append('<g id="s%d">%s</g>' % (i, symbol))
+        parts.append('</defs>')
+        n_colors = len(StatusGridCallback.COLORS)
+        for sim in sims:
+            progress = sim.t / sim.t_max if sim.t_max > 0 else 0.0
+            color = StatusGridCallback.COLORS[min(max(int(progress * (n_colors - 1)), 0), n_colors - 1)]
+            x = (sim.id % number) * cell + cell // 2
+            y = (sim.id // number) * cell + cell // 2
+            parts.append(
+                '<g transform="translate(%d,%d)" fill="%s" color="%s"><title>%d %s: %s %.1f%%</title>'
+                '<use href="#s%d"/>%s</g>' % (
+                    x, y, color, color, sim.id, escape(str(sim.name)), Simulation.STATUS_LABEL[sim.status],
+                    100.0 * progress, sim.status,
+                    '<text y="3" fill="#000">%d</text>' % sim.id if label_ids else '',
+                )
+            )
+        parts.append('</svg>')
+        return '\n'.join(parts)
+
+    def render_html(self, sims, num_sim):
+        """
+        :return: The HTML page with the status grid, a legend and the number of simulations in each status.
+        """
+        counts = [0] * len(Simulation.STATUS_LABEL)
+        for sim in sims:
+            counts[sim.status] += 1
+        legend = ' '.join(
+            '<span><svg width="20" height="20" viewBox="-10 -10 20 20" fill="#888" color="#888">%s</svg> '
+            '%s: %d</span>' % (symbol, label, count)
+            for symbol, label, count in zip(StatusGridCallback.SYMBOLS, Simulation.STATUS_LABEL, counts)
+        )
+        gradient = ', '.join(StatusGridCallback.COLORS[::32] + StatusGridCallback.COLORS[-1:])
+        refresh = self.kwargs.get('refresh', 60)
+        return '\n'.join([
+            '<!DOCTYPE html>',
+            '<html><head><meta charset="utf-8"><title>SiMon</title>',
+            '<meta http-equiv="refresh" content="%d">' % refresh if refresh > 0 else '',
+            '<style>body{font-family:sans-serif} span{margin-right:1em}'
+            ' .bar{display:inline-block;width:200px;height:12px;background:linear-gradient(to right, %s)}</style>'
+            % gradient,
+            '</head><body>',
+            '<p>%s</p>' % legend,
+            '<p>Progress: 0 <span class="bar"></span>1</p>',
+            self.render_svg(sims, num_sim),
+            '</body></html>',
+        ])
+
+    def write_status_grid(self):
+        """
+        Write the status grid to the file, atomically (the file is replaced by a complete new version). The file is not
+        written if its content has not changed.
+        """
+        if 'container' in self.kwargs:
+            sim_inst_dict = self.kwargs['container'].sim_inst_dict
+        else:
+            return
+        fn = self.kwargs.get('file', os.path.join(os.getcwd(), 'status.html'))
+        # only show level=1 simulations (the root simulation instance is only a place holder)
+        sims = sorted((sim for sim in sim_inst_dict.values() if sim.id != 0 and sim.level <= 1), key=lambda s: s.id)
+        if fn.endswith('.svg'):
+            content = self.render_svg(sims, len(sim_inst_dict))
+        else:
+            content = self.render_html(sims, len(sim_inst_dict))
+        if content == self.last_content:
+            return
+        with open(fn + '.tmp', 'w') as f:
+            f.write(content)
+        os.replace(fn + '.tmp', fn)
+        self.last_content = content
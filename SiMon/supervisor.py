@@ -0,0 +1,111 @@
+"""
+Supervisor of the simulation processes launched by SiMon.
+
+The simulation codes are started with subprocess.Popen, each in its own session so that they survive the daemon and
+can be killed as a process group. Their PIDs are known immediately (no need to wait for the shell to write the PID
+file), and they are reaped as soon as they exit: SIGCHLD wakes up the daemon through a pipe, so that the freed slot
+can be refilled right away.
+"""
+
+import os
+import signal
+import select
+import threading
+import subprocess
+
+
+class Supervisor(object):
+
+    def __init__(self) -> None:
+        self.processes = dict()  # pid => (Popen object, simulation directory)
+        self.lock = threading.Lock()  # processes are launched from the worker threads of the scheduler
+        self.wakeup_r, self.wakeup_w = os.pipe()
+        os.set_blocking(self.wakeup_r, False)
+        os.set_blocking(self.wakeup_w, False)
+        self.signal_installed = False
+        try:
+            # The signal may be delivered to any thread, so the wake-up is written by the C-level signal handler
+            # (set_wakeup_fd) rather than by a Python handler, which would only run once the main thread wakes up.
+            signal.signal(signal.SIGCHLD, self.handle_sigchld)
+            signal.set_wakeup_fd(self.wakeup_w)
+            self.signal_installed = True
+        except ValueError:
+            # not in the main thread, the exited processes are only noticed when reap() is called
+            pass
+
+    def handle_sigchld(self, signum, frame):
+        pass  # installing a handler (instead of the default disposition) is needed for the wake-up fd to be written
+
+    def launch(self, command, cwd, pid_file=".process.pid"):
+        """
+        Launch a shell command in the given directory, in a new session, and record its PID in `pid_file`.
+
+        :return: The process ID.
+        """
+        proc = subprocess.Popen(
+            command, shell=True, cwd=cwd, stdin=subprocess.DEVNULL, start_new_session=True
+        )
+        with self.lock:
+            self.processes[proc.pid] = (proc, cwd)
+        # write the PID file atomically, it is read by other instances of SiMon (e.g. the interactive mode)
+        pid_fn = os.path.join(cwd, pid_file)
+        with open(pid_fn + ".tmp", "w") as f_pid:
+            f_pid.write("%d\n" % proc.pid)
+        os.replace(pid_fn + ".tmp", pid_fn)
+        return proc.pid
+
+    def is_running(self, pid):
+        """
+        :return: True if the process has been launched by this supervisor and is still running, False if it has
+        exited, or None if it has not been launched by this supervisor.
+        """
+        with self.lock:
+            entry = self.processes.get(pid)
+            if entry is None:
+                return None
+            return entry[0].poll() is None
+
+    def reap(self):
+        """
+        Reap the processes that have exited.
+
+        :return: The list of the directories of the simulations whose processes have exited.
+        """
+        try:
+            while os.read(self.wakeup_r, 4096):
+                pass
+        except OSError:
+            pass  # drained
+        exited_dirs = []
+        with self.lock:
+            for pid, (proc, cwd) in list(self.processes.items()):
+                if proc.poll() is not None:
+                    del self.processes[pid]
+                    exited_dirs.append(cwd)
+        return exited_dirs
+
+    def fileno(self):
+        """
+        The file descriptor that becomes readable when a child process exits (to be used with select()).
+        """
+        return self.wakeup_r
+
+    def wait(self, timeout):
+        """
+        Block until a child process exits, or until `timeout` seconds have passed.
+
+        :return: The list of the directories of the simulations whose processes have exited.
+        """
+        select.select([self.wakeup_r], [], [], max(timeout, 0))
+        return self.reap()
+
+    def close(self):
+        """
+        Stop listening to SIGCHLD. The processes that are still running are not affected.
+        """
+        if self.signal_installed:
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            self.signal_installed = False
+        os.close(self.wakeup_r)
+        os.close(self.wakeup_w)
@@ -0,0 +1,46 @@
+from SiMon.chunk_store import ChunkStore
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestChunkStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = ChunkStore(os.path.join(self.tmp_dir, ChunkStore.DIR_NAME), avg_chunk_size=4096,
+                                read_size=10000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_deduplication(self):
+        data = os.urandom(200000)
+        chunks_a, written_a = self.store.put(self.write("a", data))
+        self.assertEqual(written_a, len(data))
+        self.assertEqual(sum(size for _, size in chunks_a), len(data))
+        self.assertTrue(all(size <= self.store.max_chunk_size for _, size in chunks_a))
+
+        # an identical checkpoint is not written again
+        self.assertEqual(self.store.put(self.write("b", data)), (chunks_a, 0))
+
+        # an insertion only changes the chunks around it
+        chunks_c, written_c = self.store.put(self.write("c", data[:100000] + b"inserted" + data[100000:]))
+        self.assertLess(written_c, 4 * self.store.max_chunk_size)
+        self.store.get(chunks_c, os.path.join(self.tmp_dir, "restored"))
+        with open(os.path.join(self.tmp_dir, "restored"), "rb") as f:
+            self.assertEqual(f.read(), data[:100000] + b"inserted" + data[100000:])
+
+    def test_gc(self):
+        chunks, _ = self.store.put(self.write("a", os.urandom(50000)))
+        live = set(digest for digest, _ in chunks[:1])
+        self.assertEqual(self.store.gc(live), 0)  # within the grace time
+        freed = self.store.gc(live, grace_time=-1)
+        self.assertEqual(freed, sum(size for _, size in chunks[1:]))
+        self.assertTrue(os.path.isfile(self.store.get_chunk_path(chunks[0][0])))
@@ -0,0 +1,98 @@
+import gc
+import logging
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+from SiMon.resource_scheduler import ResourceScheduler
+from SiMon.simulation import Simulation
+from SiMon.simulation_container import SimulationContainer
+from SiMon import utilities
+
+SIM_CONFIG = """[Simulation]
+Code_name = "DemoSimulation"
+Output_file = "output.txt"
+Error_file = "error.txt"
+Restart_file = "restart.txt"
+Timestamp_started = 0.0
+Stall_time = 7200
+T_start = 0.0
+T_end = 10.0
+PID = 0
+Niceness = 0
+Start_command = "true"
+Restart_command = "true"
+Max_restarts = 2
+"""
+
+N_SIMULATIONS = 500
+
+# the budget of memory per simulation in the tree (the objects of the container, without the bounded config cache)
+MAX_BYTES_PER_SIMULATION = 3000
+
+
+class TestMemory(unittest.TestCase):
+    """
+    Track the memory used per simulation by the simulation tree, which has to scale to 100k simulations.
+    """
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        for i in range(N_SIMULATIONS):
+            sim_dir = os.path.join(self.root_dir, "sim_%04d" % i)
+            os.makedirs(sim_dir)
+            with open(os.path.join(sim_dir, "SiMon.conf"), "w") as f:
+                f.write(SIM_CONFIG)
+            with open(os.path.join(sim_dir, "output.txt"), "w") as f:
+                f.write("%d, 0\n" % (i % 10))
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+        utilities.invalidate_config_cache()
+
+    def test_bytes_per_simulation(self):
+        container = SimulationContainer(root_dir=self.root_dir)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            container.build_simulation_tree()
+            utilities.invalidate_config_cache()
+            gc.collect()
+            n_bytes = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        bytes_per_sim = n_bytes / float(N_SIMULATIONS)
+        print("Memory per simulation: %.0f bytes" % bytes_per_sim)
+        self.assertEqual(len(container.sim_inst_dict), N_SIMULATIONS + 1)
+        self.assertLess(bytes_per_sim, MAX_BYTES_PER_SIMULATION)
+
+    def test_lazy_config(self):
+        container = SimulationContainer(root_dir=self.root_dir)
+        container.build_simulation_tree()
+        sim = container.sim_inst_parent_dict[os.path.join(self.root_dir, "sim_0003")]
+        self.assertFalse(hasattr(sim, "__dict__"))
+        self.assertIsNone(sim._config)
+        self.assertEqual(sim.t, 3)
+        self.assertEqual(sim.t_max, 10.0)
+        # the full config is loaded when an action needs it
+        self.assertEqual(sim.config["Restart_command"], "true")
+        self.assertIsNotNone(sim._config)
+
+    def test_lazy_config_scheduling_cycle(self):
+        # a running simulation (the PID of this process), and queued ones that cannot start (no free slot)
+        running_dir = os.path.join(self.root_dir, "sim_0003")
+        with open(os.path.join(running_dir, ".process.pid"), "w") as f:
+            f.write("%d\n" % os.getpid())
+        container = SimulationContainer(root_dir=self.root_dir)
+        scheduler = ResourceScheduler(
+            container, logging.getLogger("test"), {"Node_cores": 4, "Node_memory_GB": 4, "Max_concurrent_jobs": 0}
+        )
+        scheduler.schedule()
+        running = container.sim_inst_parent_dict[running_dir]
+        self.assertEqual(running.status, Simulation.STATUS_RUN)
+        self.assertGreater(len(scheduler.queue_keys), 0)
+        # neither the stall detection, the backup check nor the resource accounting load the full config
+        self.assertEqual(
+            [sim.name for sim in container.sim_inst_dict.values() if sim._config is not None], []
+        )
@@ -0,0 +1,66 @@
+from SiMon.plugin_registry import PluginRegistry
+from SiMon import utilities
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+
+PLUGIN = """from SiMon.simulation import Simulation
+
+__simulation__ = "%s"
+
+
+class %s(Simulation):
+    pass
+"""
+
+
+class TestPluginRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.tmp_dir, "cache", "plugin_registry.json")
+        self.write_plugin("module_registry_test_a.py", "RegistryTestA")
+        with open(os.path.join(self.tmp_dir, "module_not_a_plugin.py"), "w") as f:
+            f.write("x = 1\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_plugin(self, filename, code_name):
+        with open(os.path.join(self.tmp_dir, filename), "w") as f:
+            f.write(PLUGIN % (code_name, code_name))
+
+    def make_registry(self):
+        return PluginRegistry([utilities.get_simon_dir(), self.tmp_dir], cache_file=self.cache_file,
+                              use_entry_points=False)
+
+    def test_discover_and_cache(self):
+        sys_path = list(sys.path)
+        plugins = self.make_registry().discover()
+        self.assertIn("DemoSimulation", plugins)
+        self.assertIn("RegistryTestA", plugins)
+        self.assertEqual(len([p for p in plugins.values() if p[1].startswith(self.tmp_dir)]), 1)
+
+        # unchanged files are not read again, new files are
+        self.write_plugin("module_registry_test_b.py", "RegistryTestB")
+        with mock.patch.object(PluginRegistry, "read_simulation_name", return_value="RegistryTestB") as read:
+            plugins = self.make_registry().discover()
+        self.assertEqual(read.call_count, 1)
+        self.assertIn("RegistryTestB", plugins)
+        self.assertEqual(sys.path, sys_path)
+
+    def test_get_class(self):
+        registry = self.make_registry()
+        registry.discover()
+        sim_class = registry.get_class("RegistryTestA")
+        self.assertEqual(sim_class.__name__, "RegistryTestA")
+        # the module is executed once per process, even by another registry
+        other_registry = self.make_registry()
+        other_registry.discover()
+        with mock.patch("importlib.util.spec_from_file_location") as spec:
+            self.assertIs(other_registry.get_class("RegistryTestA"), sim_class)
+            self.assertEqual(spec.call_count, 0)
+        self.assertIsNone(registry.get_class("UnknownCode"))
@@ -0,0 +1,133 @@
+from SiMon.priority_scheduler import PriorityScheduler
+from SiMon.simulation import Simulation
+from SiMon.resource_scheduler import ResourceScheduler
+from SiMon.simulation_container import SimulationContainer
+from SiMon.state_store import StateStore
+import logging
+from unittest import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+
+SIM_CONFIG = """[Simulation]
+Code_name = "DemoSimulation"
+Output_file = "output.txt"
+Error_file = "error.txt"
+Restart_file = "restart.txt"
+Timestamp_started = 0.0
+Stall_time = 7200
+T_start = 0.0
+T_end = 10.0
+PID = 0
+Niceness = %d
+Start_command = "sleep 0"
+Restart_command = "sleep 0"
+Max_restarts = 2
+Cores = %d
+"""
+
+
+class TestPriorityScheduler(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        for name, niceness, cores in [("sim_a", 5, 2), ("sim_b", 0, 8), ("sim_c", 2, 4)]:
+            os.makedirs(os.path.join(self.root_dir, name))
+            with open(os.path.join(self.root_dir, name, "SiMon.conf"), "w") as f:
+                f.write(SIM_CONFIG % (niceness, cores))
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+
+    def get_started(self):
+        return sorted(
+            name for name in os.listdir(self.root_dir)
+            if os.path.isfile(os.path.join(self.root_dir, name, ".process.pid"))
+        )
+
+    def test_start_in_order_of_priority(self):
+        container = SimulationContainer(root_dir=self.root_dir)
+        scheduler = PriorityScheduler(container, logging.getLogger("test"), {"Max_concurrent_jobs": 1})
+        scheduler.schedule()
+        self.assertEqual(self.get_started(), ["sim_b"])
+        # the simulations that are waiting are kept in the run queue
+        self.assertEqual(sorted(scheduler.queue_keys.values()), [(0, 2), (2, 3), (5, 1)])
+
+    def test_full_rescan(self):
+        container = SimulationContainer(root_dir=self.root_dir)
+        scheduler = PriorityScheduler(container, logging.getLogger("test"), {"Max_concurrent_jobs": 0})
+        scheduler.schedule()
+        sim_a = container.sim_inst_parent_dict[os.path.join(self.root_dir, "sim_a")]
+        scheduler.schedule()
+        self.assertIs(container.sim_inst_parent_dict[sim_a.full_dir], sim_a)
+        # the tree is rebuilt by walking the root directory
+        scheduler.schedule(full_rescan=True)
+        self.assertIsNot(container.sim_inst_parent_dict[sim_a.full_dir], sim_a)
+        self.assertEqual(len(container.sim_inst_dict), 4)
+
+    def test_schedule_keeps_directories_read_only(self):
+        container = SimulationContainer(root_dir=self.root_dir)
+        scheduler = PriorityScheduler(container, logging.getLogger("test"), {"Max_concurrent_jobs": 0})
+        with open(os.path.join(self.root_dir, "sim_a", "output.txt"), "w") as f:
+            f.write("3, 0\n")
+        scheduler.schedule()
+        # the progress history is only recorded when enabled by the daemon (SiMon.run())
+        self.assertFalse(Simulation.record_progress)
+        self.assertFalse(os.path.exists(os.path.join(self.root_dir, "sim_a", Simulation.PROGRESS_FILE)))
+
+    def test_candidates_from_state_store(self):
+        store = StateStore(os.path.join(self.root_dir, ".simon_state.db"))
+        container = SimulationContainer(root_dir=self.root_dir, state_store=store)
+        scheduler = PriorityScheduler(container, logging.getLogger("test"), {"Max_concurrent_jobs": 1})
+        with mock.patch.object(store, "query", wraps=store.query) as query:
+            scheduler.schedule()
+        self.assertTrue(query.called)
+        self.assertEqual(self.get_started(), ["sim_b"])
+        self.assertEqual(sorted(scheduler.queue_keys.values()), [(0, 2), (2, 3), (5, 1)])
+        store.close()
+
+    def test_reschedule(self):
+        container = SimulationContainer(root_dir=self.root_dir)
+        scheduler = PriorityScheduler(container, logging.getLogger("test"), {"Max_concurrent_jobs": 0})
+        scheduler.schedule()
+        sim_a_dir = os.path.join(self.root_dir, "sim_a")
+        probed_dirs = []
+        sim_probe = Simulation.sim_probe
+
+        def record_probe(sim):
+            probed_dirs.append(sim.full_dir)
+            sim_probe(sim)
+
+        with mock.patch.object(Simulation, "sim_probe", autospec=True, side_effect=record_probe):
+            scheduler.reschedule([sim_a_dir])
+        # only the simulation in the changed directory is probed again
+        self.assertEqual(probed_dirs, [sim_a_dir])
+        # a change that cannot be attributed to a known simulation triggers a full scheduling cycle
+        with mock.patch.object(scheduler, "schedule") as schedule:
+            scheduler.reschedule([self.root_dir])
+        schedule.assert_called_once_with()
+
+    def test_resource_packing(self):
+        container = SimulationContainer(root_dir=self.root_dir)
+        scheduler = ResourceScheduler(
+            container, logging.getLogger("test"), {"Node_cores": 10, "Node_memory_GB": 16}
+        )
+        scheduler.schedule()
+        # sim_b (8 cores) has the highest priority, sim_c (4 cores) does not fit next to it, but sim_a (2 cores) does
+        self.assertEqual(self.get_started(), ["sim_a", "sim_b"])
+
+    def test_adaptive_concurrency(self):
+        container = SimulationContainer(root_dir=self.root_dir)
+        scheduler = PriorityScheduler(
+            container, logging.getLogger("test"), {"Max_concurrent_jobs": 8, "Adaptive_concurrency": True}
+        )
+        idle = {'load': 0.1, 'mem_available': 0.9, 'cpu_pressure': 0.0, 'memory_pressure': 0.0, 'io_pressure': 0.0}
+        busy = dict(idle, memory_pressure=40.0)
+        with mock.patch("SiMon.utilities.get_system_load", return_value=busy):
+            scheduler.update_concurrency_limit(5)
+        self.assertEqual(scheduler.concurrency_limit, 4)
+        with mock.patch("SiMon.utilities.get_system_load", return_value=idle):
+            for _ in range(10):
+                scheduler.update_concurrency_limit(4)
+        self.assertEqual(scheduler.concurrency_limit, 8)
@@ -1,6 +1,10 @@
 from ..simon import SiMon
+import logging
 import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 import subprocess
 
 # instance a simulation_task
@@ -40,3 +44,57 @@ class TestSimon(unittest.TestCase):
         print("test dir", test_dir)
         subprocess.call([test_dir])
         # TODO: start and stop does not effect?
+
+    def test_supervisor_daemon_only(self):
+        cwd = os.getcwd()
+        work_dir = tempfile.mkdtemp()
+        root_dir = os.path.join(work_dir, "sims")
+        os.makedirs(root_dir)
+        try:
+            with open(os.path.join(work_dir, "SiMon.conf"), "w") as f:
+                f.write('[SiMon]\nRoot_dir = "%s"\n' % root_dir)
+            # the interactive mode only lists the simulations: no SIGCHLD handler is installed
+            s = SiMon(logging.getLogger("test"), cwd=work_dir)
+            s.initialize()
+            self.assertIsNone(s.supervisor)
+            self.assertIsNone(s.simulations.supervisor)
+            s = SiMon(logging.getLogger("test"), cwd=work_dir, mode="daemon")
+            s.initialize()
+            self.assertIsNotNone(s.supervisor)
+            self.assertIs(s.simulations.supervisor, s.supervisor)
+            s.supervisor.close()
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(work_dir)
+
+    def test_event_driven_full_rescan(self):
+        cwd = os.getcwd()
+        work_dir = tempfile.mkdtemp()
+        root_dir = os.path.join(work_dir, "sims")
+        # a new simulation directory, whose config file has not been written yet
+        new_dir = os.path.join(root_dir, "sim_new")
+        os.makedirs(new_dir)
+        try:
+            with open(os.path.join(work_dir, "SiMon.conf"), "w") as f:
+                f.write('[SiMon]\nRoot_dir = "%s"\nDaemon_sleep_time = 1000\n' % root_dir)
+            s = SiMon(logging.getLogger("test"), cwd=work_dir, mode="daemon")
+            s.initialize()
+            s.simulations.build_simulation_tree()
+            s.scheduler = mock.Mock()
+            fs_watcher = mock.Mock()
+            fs_watcher.watched_paths.return_value = set()
+            # the event queue overflows, then the loop is interrupted
+            fs_watcher.wait.side_effect = [None, KeyboardInterrupt()]
+            with mock.patch("SiMon.watcher.create_watcher", return_value=fs_watcher):
+                with self.assertRaises(KeyboardInterrupt):
+                    s.run_event_driven()
+            # the cycle after the lost events rescans the whole root directory
+            self.assertEqual(
+                s.scheduler.schedule.call_args_list, [mock.call(full_rescan=False), mock.call(full_rescan=True)]
+            )
+            fs_watcher.watch.assert_any_call(new_dir, ["SiMon.conf"], None)
+            fs_watcher.close.assert_called_once_with()
+            s.supervisor.close()
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(work_dir)
@@ -0,0 +1,152 @@
+from SiMon.simulation import Simulation
+from SiMon.module_demo_simulation import DemoSimulation
+from SiMon import utilities
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+
+SIM_CONFIG = """[Simulation]
+Code_name = "DemoSimulation"
+Output_file = "output.txt"
+Error_file = "error.txt"
+Restart_file = "restart.txt"
+Timestamp_started = 0.0
+Stall_time = 7200
+T_start = 0.0
+T_end = 10.0
+PID = 0
+Niceness = 0
+Start_command = "true"
+Restart_command = "true"
+Max_restarts = 2
+"""
+
+
+class TestSimulation(unittest.TestCase):
+    def setUp(self):
+        self.sim_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.sim_dir)
+
+    def make_simulation(self, extra_config="", sim_config=SIM_CONFIG):
+        with open(os.path.join(self.sim_dir, "SiMon.conf"), "w") as f:
+            f.write(sim_config + extra_config)
+        return DemoSimulation(1, "sim", self.sim_dir, Simulation.STATUS_NEW)
+
+    @staticmethod
+    def feed_progress(sim, now, intervals, last_update):
+        """
+        Record samples in the progress history of `sim`: the model time advances once per interval (in seconds), the
+        last time at `now - last_update`.
+        """
+        wall_time = now - last_update - sum(intervals)
+        sim.progress.add(wall_time, 0)
+        for i, interval in enumerate(intervals):
+            wall_time += interval
+            sim.progress.add(wall_time, i + 1)
+
+    def test_rate_stall_detection(self):
+        sim = self.make_simulation('Stall_detection = "rate"\nStall_factor = 5\n')
+        sim.pid = os.getpid()
+        now = time.time()
+        # the output file has not been modified for longer than Stall_time, which the "mtime" detector would flag
+        sim.mtime = now - 10000
+        sim.ctime = 0
+
+        # a slow but advancing simulation: the last advance is within Stall_factor times its longest gap (100 s)
+        self.feed_progress(sim, now, [100, 80, 100, 90], last_update=300)
+        self.assertFalse(sim.sim_is_stalled())
+
+        # no progress for more than Stall_factor * max_interval
+        sim.progress.clear()
+        self.feed_progress(sim, now, [100, 80, 100, 90], last_update=600)
+        self.assertTrue(sim.sim_is_stalled())
+        self.assertIn("has not advanced", sim.stall_reason)
+
+    def test_rate_stall_detection_needs_history(self):
+        sim = self.make_simulation('Stall_detection = "rate"\n')
+        sim.pid = os.getpid()
+        now = time.time()
+        sim.ctime = 0
+        # with too few samples, the "mtime" detector is used
+        self.feed_progress(sim, now, [100], last_update=600)
+        sim.mtime = now - 10
+        self.assertFalse(sim.sim_is_stalled())
+        sim.mtime = now - 10000
+        self.assertTrue(sim.sim_is_stalled())
+        self.assertIn("no update in its output file", sim.stall_reason)
+
+    def test_mtime_stall_detection(self):
+        sim = self.make_simulation()
+        sim.pid = os.getpid()
+        now = time.time()
+        sim.ctime = 0
+        # without Stall_detection, the progress history is ignored and Stall_time applies to the output file
+        self.feed_progress(sim, now, [10, 10, 10, 10], last_update=5000)
+        sim.mtime = now - 10
+        self.assertFalse(sim.sim_is_stalled())
+        sim.mtime = now - 7300
+        self.assertTrue(sim.sim_is_stalled())
+        self.assertIn("no update in its output file", sim.stall_reason)
+
+    def test_status_memoization(self):
+        with open(os.path.join(self.sim_dir, "output.txt"), "w") as f:
+            f.write("3, 0\n")
+        sim = self.make_simulation()
+        read = utilities.LastLineReader.read
+        with mock.patch.object(utilities.LastLineReader, "read", autospec=True, side_effect=read) as read_output:
+            Simulation.new_status_cycle()
+            sim.sim_get_status()
+            sim.sim_get_status()  # the same cycle: the snapshot of the first call is used
+            self.assertEqual(read_output.call_count, 1)
+            self.assertEqual(sim.t, 3)
+            Simulation.new_status_cycle()
+            sim.sim_get_status()
+            self.assertEqual(read_output.call_count, 2)
+            sim.sim_get_status(refresh=True)
+            self.assertEqual(read_output.call_count, 3)
+
+    def test_actions_keep_working_directory(self):
+        cwd = os.getcwd()
+        sim_config = SIM_CONFIG.replace('Start_command = "true"', 'Start_command = "sleep 30"')
+        sim = self.make_simulation(sim_config=sim_config)
+        self.assertEqual(sim.sim_start(), 0)
+        self.assertEqual(os.getcwd(), cwd)
+        pid = sim.sim_read_pid()
+        self.assertTrue(sim.sim_check_process(pid))
+        self.assertEqual(sim.sim_kill(), 0)
+        self.assertEqual(os.getcwd(), cwd)
+        for _ in range(50):
+            if not sim.sim_check_process(pid):
+                break
+            time.sleep(0.1)
+        self.assertEqual(sim.sim_restart(), 0)
+        self.assertEqual(os.getcwd(), cwd)
+        # the restart is launched in its own directory
+        self.assertTrue(os.path.isfile(os.path.join(self.sim_dir, "restart1", ".process.pid")))
+
+    def test_progress_recorded_by_daemon_only(self):
+        output_fn = os.path.join(self.sim_dir, "output.txt")
+        progress_fn = os.path.join(self.sim_dir, Simulation.PROGRESS_FILE)
+        with open(output_fn, "w") as f:
+            f.write("3, 0\n")
+        with mock.patch.object(Simulation, "record_progress", False):
+            sim = self.make_simulation()
+            sim.sim_get_status(refresh=True)
+        # listing the simulations does not write to their directories
+        self.assertFalse(os.path.exists(progress_fn))
+        with mock.patch.object(Simulation, "record_progress", True):
+            sim.sim_get_status(refresh=True)
+            self.assertEqual(os.path.getsize(progress_fn), utilities.ProgressHistory.RECORD.size)
+            # the history is only written when the model time changes
+            sim.sim_get_status(refresh=True)
+            self.assertEqual(os.path.getsize(progress_fn), utilities.ProgressHistory.RECORD.size)
+            with open(output_fn, "a") as f:
+                f.write("4, 0\n")
+            sim.sim_get_status(refresh=True)
+            self.assertEqual(os.path.getsize(progress_fn), 2 * utilities.ProgressHistory.RECORD.size)
@@ -0,0 +1,424 @@
+from SiMon.simulation import Simulation
+from SiMon.simulation_container import SimulationContainer
+from SiMon.priority_scheduler import PriorityScheduler
+from SiMon.state_store import StateStore
+from SiMon.chunk_store import ChunkStore
+from SiMon import utilities
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+
+SIM_CONFIG = """[Simulation]
+Code_name = "DemoSimulation"
+Output_file = "output.txt"
+Error_file = "error.txt"
+Restart_file = "restart.txt"
+Timestamp_started = 0.0
+Stall_time = 7200
+T_start = 0.0
+T_end = 10.0
+PID = 0
+Niceness = 0
+Start_command = "true"
+Restart_command = "true"
+Max_restarts = 2
+"""
+
+
+class TestSimulationContainer(unittest.TestCase):
+    def setUp(self):
+        self.orig_dir = os.getcwd()
+        self.root_dir = tempfile.mkdtemp()
+        for name in ["sim_a", "sim_b"]:
+            self.make_simulation_dir(os.path.join(self.root_dir, name))
+
+    def tearDown(self):
+        os.chdir(self.orig_dir)
+        shutil.rmtree(self.root_dir)
+
+    @staticmethod
+    def make_simulation_dir(path):
+        os.makedirs(path)
+        with open(os.path.join(path, "SiMon.conf"), "w") as f:
+            f.write(SIM_CONFIG)
+
+    @staticmethod
+    def get_tree(container):
+        return sorted((inst.id, inst.full_dir, inst.level, inst.status) for inst in container.sim_inst_dict.values())
+
+    def test_incremental_tree(self):
+        container = SimulationContainer(root_dir=self.root_dir)
+        container.build_simulation_tree()
+        sim_dict = container.sim_inst_dict
+        self.assertEqual(len(sim_dict), 3)
+        sim_a = container.sim_inst_parent_dict[os.path.join(self.root_dir, "sim_a")]
+
+        # an unchanged tree keeps the same objects
+        container.build_simulation_tree()
+        self.assertIs(container.sim_inst_dict, sim_dict)
+        self.assertIs(container.sim_inst_parent_dict[sim_a.full_dir], sim_a)
+        self.assertEqual(len(sim_dict), 3)
+
+        # a new restart directory is attached to the existing parent
+        self.make_simulation_dir(os.path.join(sim_a.full_dir, "restart1"))
+        os.utime(sim_a.full_dir, ns=(0, 0))
+        container.build_simulation_tree()
+        self.assertEqual(len(sim_dict), 4)
+        self.assertEqual(len(sim_a.restarts), 1)
+        self.assertEqual(sim_a.restarts[0].level, 2)
+        self.assertEqual(sim_a.restarts[0].parent_id, sim_a.id)
+
+        # removed simulations disappear from the tree
+        shutil.rmtree(sim_a.full_dir)
+        os.utime(self.root_dir, ns=(0, 0))
+        container.build_simulation_tree()
+        self.assertEqual(len(sim_dict), 2)
+        self.assertNotIn(sim_a.full_dir, container.sim_inst_parent_dict)
+
+    def test_full_rescan(self):
+        container = SimulationContainer(root_dir=self.root_dir)
+        container.build_simulation_tree()
+        sim_dict = container.sim_inst_dict
+        container.build_simulation_tree(full_rescan=True)
+        self.assertIs(container.sim_inst_dict, sim_dict)
+        self.assertEqual(len(sim_dict), 3)
+
+    def test_config_written_after_mkdir(self):
+        container = SimulationContainer(root_dir=self.root_dir)
+        container.build_simulation_tree()
+        # the directory is created (and listed) before its config file is written
+        sim_c_dir = os.path.join(self.root_dir, "sim_c")
+        os.makedirs(os.path.join(sim_c_dir, "restart1"))
+        container.build_simulation_tree()
+        self.assertNotIn(sim_c_dir, container.sim_inst_parent_dict)
+        with open(os.path.join(sim_c_dir, "SiMon.conf"), "w") as f:
+            f.write(SIM_CONFIG)
+        container.build_simulation_tree()
+        self.assertIn(sim_c_dir, container.sim_inst_parent_dict)
+        self.assertEqual(len(container.sim_inst_dict), 4)
+
+        # the same for a restart directory
+        restart_dir = os.path.join(sim_c_dir, "restart1")
+        with open(os.path.join(restart_dir, "SiMon.conf"), "w") as f:
+            f.write(SIM_CONFIG)
+        container.build_simulation_tree()
+        self.assertEqual(container.sim_inst_parent_dict[restart_dir].level, 2)
+        self.assertEqual(len(container.sim_inst_dict), 5)
+
+    def test_periodic_full_scan(self):
+        container = SimulationContainer(root_dir=self.root_dir, full_scan_cycles=2)
+        with mock.patch.object(
+            container, "traverse_simulation_dir_tree", wraps=container.traverse_simulation_dir_tree
+        ) as traverse:
+            for _ in range(4):
+                container.build_simulation_tree()
+            # the first build, then a full rescan after two incremental ones
+            self.assertEqual([call.args[0].id for call in traverse.call_args_list if call.args[0].id == 0], [0, 0])
+        self.assertEqual(len(container.sim_inst_dict), 3)
+
+    def test_state_store(self):
+        store = StateStore(os.path.join(self.root_dir, ".simon_state.db"))
+        container = SimulationContainer(root_dir=self.root_dir, state_store=store)
+        container.build_simulation_tree()
+        rows = store.query(status=Simulation.STATUS_NEW)
+        self.assertEqual([row["name"] for row in rows], ["sim_a", "sim_b"])
+        self.assertEqual(rows[0]["level"], 1)
+
+        # restarts are stored with their parents, removed simulations are deleted from the store
+        sim_a_dir = os.path.join(self.root_dir, "sim_a")
+        self.make_simulation_dir(os.path.join(sim_a_dir, "restart1"))
+        os.utime(sim_a_dir, ns=(0, 0))
+        container.build_simulation_tree()
+        self.assertEqual(store.query(level=2)[0]["parent_path"], sim_a_dir)
+        shutil.rmtree(sim_a_dir)
+        os.utime(self.root_dir, ns=(0, 0))
+        container.build_simulation_tree()
+        self.assertEqual([row["name"] for row in store.query()], ["sim_b"])
+        store.close()
+
+    def test_state_store_persisted(self):
+        sim_a_dir = os.path.join(self.root_dir, "sim_a")
+        self.make_simulation_dir(os.path.join(sim_a_dir, "restart1"))
+        store = StateStore(os.path.join(self.root_dir, ".simon_state.db"))
+        container = SimulationContainer(root_dir=self.root_dir, state_store=store)
+        container.build_simulation_tree()
+        scanned_tree = self.get_tree(container)
+        store.close()
+
+        # the tree is restored from the store: only the root directory is listed, not the simulation directories
+        store = StateStore(os.path.join(self.root_dir, ".simon_state.db"))
+        container = SimulationContainer(root_dir=self.root_dir, state_store=store)
+        with mock.patch.object(container, "list_simulation_dirs", wraps=container.list_simulation_dirs) as list_dirs:
+            container.build_simulation_tree()
+        self.assertEqual([call.args[0].full_dir for call in list_dirs.call_args_list], [self.root_dir])
+        self.assertEqual(self.get_tree(container), scanned_tree)
+        store.close()
+
+        # the directories that have changed since the store was written are scanned again
+        shutil.rmtree(os.path.join(sim_a_dir, "restart1"))
+        self.make_simulation_dir(os.path.join(self.root_dir, "sim_c"))
+        os.remove(os.path.join(self.root_dir, "sim_b", "SiMon.conf"))
+        store = StateStore(os.path.join(self.root_dir, ".simon_state.db"))
+        container = SimulationContainer(root_dir=self.root_dir, state_store=store)
+        container.build_simulation_tree()
+        self.assertEqual(
+            sorted(inst.name for inst in container.sim_inst_dict.values()), ["root", "sim_a", "sim_c"]
+        )
+        self.assertEqual([row["name"] for row in store.query()], ["sim_a", "sim_c"])
+        store.close()
+
+    def test_backup_checkpoint(self):
+        sim_dir = os.path.join(self.root_dir, "sim_a")
+        sim = Simulation(1, "sim_a", sim_dir, Simulation.STATUS_NEW)
+        sim.maximum_number_of_checkpoints = 2
+        restart_fn = os.path.join(sim_dir, "restart.txt")
+        self.assertEqual(sim.sim_backup_checkpoint(), 0)  # no restart file yet
+        for i in range(3):
+            with open(restart_fn, "w") as f:
+                f.write("snapshot %d\n" % i)
+            os.utime(restart_fn, ns=(i, i))
+            self.assertEqual(sim.sim_backup_checkpoint(), 0)
+            # an unchanged restart file is not copied again
+            self.assertEqual(sim.sim_backup_checkpoint(), 1)
+            if i < 2:
+                os.rename(os.path.join(sim_dir, sim.backup_manifest[-1]["file"]),
+                          os.path.join(sim_dir, "restart.tmp.%d" % i))
+                sim.backup_manifest[-1]["file"] = "restart.tmp.%d" % i
+                sim.sim_save_backup_manifest()
+        # the oldest backup has been deleted, and the manifest is read back by a new instance
+        backups = sorted(fn for fn in os.listdir(sim_dir) if fn.startswith("restart.tmp."))
+        self.assertEqual(len(backups), 2)
+        self.assertNotIn("restart.tmp.0", backups)
+        sim = Simulation(1, "sim_a", sim_dir, Simulation.STATUS_NEW)
+        self.assertEqual(sim.sim_backup_checkpoint(), 1)
+        with open(os.path.join(sim_dir, backups[-1])) as f:
+            self.assertEqual(f.read(), "snapshot 2\n")
+
+    def test_compressed_backup_restore(self):
+        sim_dir = os.path.join(self.root_dir, "sim_a")
+        with open(os.path.join(sim_dir, "SiMon.conf"), "a") as f:
+            f.write('Backup_compression = "gzip"\n')
+        sim = Simulation(1, "sim_a", sim_dir, Simulation.STATUS_NEW)
+        restart_fn = os.path.join(sim_dir, "restart.txt")
+        with open(restart_fn, "w") as f:
+            f.write("snapshot\n" * 1000)
+        self.assertEqual(sim.sim_backup_checkpoint(), 0)
+        self.assertTrue(sim.backup_manifest[-1]["file"].endswith(".gz"))
+        os.remove(restart_fn)
+        self.assertEqual(sim.sim_restore_checkpoint(), 0)
+        with open(restart_fn) as f:
+            self.assertEqual(f.read(), "snapshot\n" * 1000)
+
+    def test_checkpoint_store(self):
+        store = ChunkStore(os.path.join(self.root_dir, ChunkStore.DIR_NAME), avg_chunk_size=4096)
+        container = SimulationContainer(root_dir=self.root_dir, chunk_store=store)
+        container.build_simulation_tree()
+        data = os.urandom(100000)
+        sims = [container.sim_inst_parent_dict[os.path.join(self.root_dir, name)] for name in ["sim_a", "sim_b"]]
+        for sim in sims:
+            with open(os.path.join(sim.full_dir, "restart.txt"), "wb") as f:
+                f.write(data)
+            self.assertEqual(sim.sim_backup_checkpoint(), 0)
+        # the identical checkpoints are stored once, and the store is not mistaken for a simulation
+        self.assertEqual(sims[0].backup_manifest[-1]["chunks"], sims[1].backup_manifest[-1]["chunks"])
+        n_chunks = sum(len(files) for _, _, files in os.walk(store.store_dir))
+        self.assertEqual(n_chunks, len(sims[0].backup_manifest[-1]["chunks"]))
+        container.build_simulation_tree(full_rescan=True)
+        self.assertEqual(len(container.sim_inst_dict), 3)
+        os.remove(os.path.join(sims[1].full_dir, "restart.txt"))
+        self.assertEqual(sims[1].sim_restore_checkpoint(), 0)
+        with open(os.path.join(sims[1].full_dir, "restart.txt"), "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def make_store_backups(self, container, sim_name, n_backups):
+        """
+        Back up `n_backups` random restart files of a simulation into the checkpoint store, keeping only the last one.
+
+        :return: The digests of the chunks of the remaining backup.
+        """
+        sim = container.sim_inst_parent_dict[os.path.join(self.root_dir, sim_name)]
+        sim.maximum_number_of_checkpoints = 1
+        restart_fn = os.path.join(sim.full_dir, "restart.txt")
+        for i in range(n_backups):
+            with open(restart_fn, "wb") as f:
+                f.write(os.urandom(50000))
+            os.utime(restart_fn, ns=(i, i))
+            self.assertEqual(sim.sim_backup_checkpoint(), 0)
+        self.assertEqual(len(sim.backup_manifest), 1)
+        return set(digest for digest, _ in sim.backup_manifest[0]["chunks"])
+
+    @staticmethod
+    def get_stored_digests(store):
+        # the chunks are made older than the grace time of the collection
+        digests = set()
+        for dir_path, _, files in os.walk(store.store_dir):
+            for fn in files:
+                os.utime(os.path.join(dir_path, fn), (0, 0))
+                digests.add(os.path.basename(dir_path) + fn)
+        return digests
+
+    def test_checkpoint_store_gc(self):
+        store = ChunkStore(os.path.join(self.root_dir, ChunkStore.DIR_NAME), avg_chunk_size=4096)
+        container = SimulationContainer(root_dir=self.root_dir, chunk_store=store)
+        container.chunk_store_gc_interval = 0
+        container.build_simulation_tree()
+        live_digests = self.make_store_backups(container, "sim_a", 2)
+        stored_digests = self.get_stored_digests(store)
+        self.assertGreater(len(stored_digests - live_digests), 0)
+
+        # the chunks are only collected after a full scan, when all the simulations are known
+        container.build_simulation_tree()
+        self.assertEqual(self.get_stored_digests(store), stored_digests)
+        container.build_simulation_tree(full_rescan=True)
+        self.assertEqual(self.get_stored_digests(store), live_digests)
+
+    def test_checkpoint_store_gc_partial_tree(self):
+        store = ChunkStore(os.path.join(self.root_dir, ChunkStore.DIR_NAME), avg_chunk_size=4096)
+        container = SimulationContainer(root_dir=self.root_dir, chunk_store=store)
+        container.build_simulation_tree()
+        self.make_store_backups(container, "sim_a", 1)
+        live_digests = self.make_store_backups(container, "sim_b", 1)
+
+        # sim_b is excluded from the tree, but its backup is still restorable
+        container = SimulationContainer(root_dir=self.root_dir, chunk_store=store, exclude_patterns=["sim_b"])
+        container.chunk_store_gc_interval = 0
+        stored_digests = self.get_stored_digests(store)
+        container.build_simulation_tree()
+        self.assertEqual(self.get_stored_digests(store), stored_digests)
+
+        # an unreadable manifest aborts the collection
+        with open(os.path.join(self.root_dir, "sim_a", Simulation.BACKUP_MANIFEST_FILE), "w") as f:
+            f.write("{")
+        container = SimulationContainer(root_dir=self.root_dir, chunk_store=store)
+        container.chunk_store_gc_interval = 0
+        container.build_simulation_tree()
+        self.assertEqual(self.get_stored_digests(store), stored_digests)
+        self.assertLessEqual(live_digests, stored_digests)
+
+    def test_parallel_probing(self):
+        dead_process = subprocess.Popen(["true"])
+        dead_process.wait()
+        sim_dirs = dict((name, os.path.join(self.root_dir, name)) for name in ["sim_a", "sim_b", "sim_c", "sim_d"])
+        for name in ["sim_c", "sim_d"]:
+            self.make_simulation_dir(sim_dirs[name])
+        self.make_simulation_dir(os.path.join(sim_dirs["sim_c"], "restart1"))
+        # sim_a is running, sim_b is done, sim_c has crashed (as has its restart), sim_d is new
+        for name, pid, output in [("sim_a", os.getpid(), "5, 0"), ("sim_b", dead_process.pid, "10, 0"),
+                                  ("sim_c", dead_process.pid, "3, 0")]:
+            for sim_dir in [sim_dirs[name], os.path.join(sim_dirs[name], "restart1")]:
+                if not os.path.isdir(sim_dir):
+                    continue
+                with open(os.path.join(sim_dir, ".process.pid"), "w") as f:
+                    f.write("%d\n" % pid)
+                with open(os.path.join(sim_dir, "output.txt"), "w") as f:
+                    f.write(output + "\n")
+                with open(os.path.join(sim_dir, "SiMon.conf"), "w") as f:
+                    f.write(SIM_CONFIG.replace("Timestamp_started = 0.0", "Timestamp_started = 1.0"))
+
+        def get_statuses(probe_workers):
+            Simulation.new_status_cycle()
+            container = SimulationContainer(root_dir=self.root_dir)
+            scheduler = PriorityScheduler(container, logging.getLogger("test"), {"Probe_workers": probe_workers})
+            self.assertEqual(container.executor is not None, probe_workers > 1)
+            container.build_simulation_tree()
+            Simulation.new_status_cycle()
+            container.build_simulation_tree()
+            if scheduler.executor is not None:
+                scheduler.executor.shutdown()
+            return dict((inst.full_dir, (inst.status, inst.t)) for inst in container.sim_inst_dict.values())
+
+        statuses = get_statuses(1)
+        self.assertEqual(
+            [statuses[sim_dirs[name]][0] for name in sorted(sim_dirs)],
+            [Simulation.STATUS_RUN, Simulation.STATUS_DONE, Simulation.STATUS_STOP, Simulation.STATUS_NEW]
+        )
+        self.assertEqual(get_statuses(4), statuses)
+
+    def test_pruned_traversal(self):
+        sim_a_dir = os.path.join(self.root_dir, "sim_a")
+        self.make_simulation_dir(os.path.join(sim_a_dir, "restart1"))
+        self.make_simulation_dir(os.path.join(sim_a_dir, "restart1", "restart1"))
+        # the data directories of the simulations are not walked, even if they contain a SiMon.conf
+        self.make_simulation_dir(os.path.join(sim_a_dir, "snapshots", "sim_x"))
+        self.make_simulation_dir(os.path.join(self.root_dir, "archive"))
+
+        container = SimulationContainer(root_dir=self.root_dir)
+        with mock.patch("SiMon.utilities.parse_config_file", wraps=utilities.parse_config_file) as parse:
+            container.build_simulation_tree()
+        parsed_dirs = set(os.path.dirname(call[0][0]) for call in parse.call_args_list)
+        self.assertNotIn(os.path.join(sim_a_dir, "snapshots"), parsed_dirs)
+        self.assertEqual(len(container.sim_inst_dict), 6)
+
+        container = SimulationContainer(root_dir=self.root_dir, max_depth=2, exclude_patterns=["arch*"])
+        container.build_simulation_tree()
+        self.assertEqual(sorted(inst.name for inst in container.sim_inst_dict.values()),
+                         ["restart1", "root", "sim_a", "sim_b"])
+
+    def test_deep_restart_chain(self):
+        # a chain of restarts deeper than the former limit of the status propagation (30 iterations)
+        sim_a = os.path.join(self.root_dir, "sim_a")
+        path = sim_a
+        for level in range(1, 41):
+            path = os.path.join(path, "restart1")
+            self.make_simulation_dir(path)
+            with open(os.path.join(path, "output.txt"), "w") as f:
+                f.write("%d, 0\n" % level)
+
+        container = SimulationContainer(root_dir=self.root_dir)
+        container.build_simulation_tree()
+        top = container.sim_inst_parent_dict[sim_a]
+        self.assertEqual(top.leaf.fulldir, path)
+        self.assertEqual(top.leaf.t, 40)
+
+        # the status of the leaf is propagated to the top-level simulation in a single pass
+        top.leaf.status = Simulation.STATUS_DONE
+        container.propagate_status([top])
+        self.assertEqual(top.status, Simulation.STATUS_DONE)
+
+        # the leaf pointer follows a new restart directory
+        path = os.path.join(path, "restart1")
+        self.make_simulation_dir(path)
+        with open(os.path.join(path, "output.txt"), "w") as f:
+            f.write("41, 0\n")
+        container.refresh_simulation_dirs([sim_a])
+        self.assertEqual(top.leaf.fulldir, path)
+
+    def test_status_table(self):
+        container = SimulationContainer(root_dir=self.root_dir)
+        container.build_simulation_tree()
+        sim_a = container.sim_inst_parent_dict[os.path.join(self.root_dir, "sim_a")]
+        table = container.get_status_table()
+        self.assertEqual(list(table["id"]), sorted(inst.id for inst in container.sim_inst_dict.values() if inst.id > 0))
+        self.assertTrue((table["level"] == 1).all())
+        self.assertTrue((table["t_max"] == 10.0).all())
+
+        # an unchanged update leaves every row as it is
+        Simulation.new_status_cycle()
+        container.build_simulation_tree()
+        self.assertEqual(container.status_table_dirty, set())
+
+        # only the rows of the updated simulations are written again, in place
+        with open(os.path.join(sim_a.full_dir, "output.txt"), "w") as f:
+            f.write("5, 0\n")
+        container.refresh_simulation_dirs([sim_a.full_dir])
+        self.assertEqual(container.status_table_dirty, {sim_a.id})
+        self.assertIs(container.get_status_table(), table)
+        self.assertEqual(table[table["id"] == sim_a.id]["t"][0], 5)
+
+        # new and removed simulations
+        self.make_simulation_dir(os.path.join(sim_a.full_dir, "restart1"))
+        container.refresh_simulation_dirs([sim_a.full_dir])
+        table = container.get_status_table()
+        self.assertEqual(len(table), 3)
+        restart = table[table["level"] == 2][0]
+        self.assertEqual(restart["parent"], sim_a.id)
+        shutil.rmtree(sim_a.full_dir)
+        os.utime(self.root_dir, ns=(0, 0))
+        container.build_simulation_tree()
+        table = container.get_status_table()
+        self.assertEqual(list(table["id"]), [inst.id for inst in container.sim_inst_dict.values() if inst.id > 0])
@@ -0,0 +1,78 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HEAVY_MODULES = ["numpy", "matplotlib", "daemon", "daemonize", "sqlite3"]
+
+# The wall-clock limits depend on the machine and on the state of its caches, so they are only checked on request
+CHECK_TIMING = os.environ.get("SIMON_TIMING_TESTS", "") not in ("", "0")
+
+SIM_CONFIG = """[Simulation]
+Code_name = "DemoSimulation"
+Output_file = "output.txt"
+Timestamp_started = 0.0
+T_start = 0.0
+T_end = 10.0
+PID = 0
+Niceness = 0
+Start_command = "true"
+"""
+
+
+class TestStartup(unittest.TestCase):
+    """
+    Guard the start-up time of the ``simon`` command: listing the simulations should not import the heavy optional
+    dependencies. Set SIMON_TIMING_TESTS=1 to also check the (loose) wall-clock limits.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.tmp_dir, "SiMon.conf"), "w") as f:
+            f.write('[SiMon]\nRoot_dir = "sims"\n')
+        for name in ["sim_a", "sim_b"]:
+            os.makedirs(os.path.join(self.tmp_dir, "sims", name))
+            with open(os.path.join(self.tmp_dir, "sims", name, "SiMon.conf"), "w") as f:
+                f.write(SIM_CONFIG)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_python(self, code):
+        env = dict(os.environ, PYTHONPATH=PACKAGE_DIR)
+        t_start = time.time()
+        output = subprocess.check_output([sys.executable, "-c", code], cwd=self.tmp_dir, env=env,
+                                         stdin=subprocess.DEVNULL, universal_newlines=True)
+        return output, time.time() - t_start
+
+    def test_import_time(self):
+        output, _ = self.run_python(
+            "import sys, time\n"
+            "t = time.perf_counter()\n"
+            "import SiMon.simon\n"
+            "print('IMPORT_TIME:%%f' %% (time.perf_counter() - t))\n"
+            "print('HEAVY:' + ','.join(m for m in %r if m in sys.modules))\n" % HEAVY_MODULES
+        )
+        self.assertIn("HEAVY:\n", output)
+        if CHECK_TIMING:
+            import_time = float(output.split("IMPORT_TIME:")[1].split()[0])
+            self.assertLess(import_time, 1.0)
+
+    def test_time_to_first_listing(self):
+        output, elapsed = self.run_python(
+            "import sys\n"
+            "sys.argv = ['simon']\n"
+            "from SiMon.simon import main\n"
+            "main()\n"
+            "print('HEAVY:' + ','.join(m for m in %r if m in sys.modules))\n" % HEAVY_MODULES
+        )
+        self.assertIn("sim_a", output)
+        self.assertIn("HEAVY:\n", output)
+        if CHECK_TIMING:
+            self.assertLess(elapsed, 5.0)
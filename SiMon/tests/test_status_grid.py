@@ -0,0 +1,52 @@
+from SiMon.simulation import Simulation
+from SiMon.status_grid import StatusGridCallback
+import os
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+from unittest import mock
+
+
+class FakeContainer(object):
+    def __init__(self, sim_inst_dict):
+        self.sim_inst_dict = sim_inst_dict
+
+
+class TestStatusGridCallback(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.sims = {0: mock.Mock(id=0, level=0, status=Simulation.STATUS_NEW, t=0, t_max=0)}
+        for i in range(1, 6):
+            self.sims[i] = mock.Mock(id=i, level=1, status=i, t=i, t_max=10.0)
+            self.sims[i].name = "sim_<%d>" % i
+        self.sims[6] = mock.Mock(id=6, level=2, status=Simulation.STATUS_RUN, t=1, t_max=10.0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_write_svg(self):
+        fn = os.path.join(self.tmp_dir, "status.svg")
+        callback = StatusGridCallback(container=FakeContainer(self.sims), file=fn)
+        callback.run()
+        root = ET.parse(fn).getroot()
+        titles = [el.text for el in root.iter("{http://www.w3.org/2000/svg}title")]
+        # the restarts are not shown, and the names are escaped
+        self.assertEqual(len(titles), 5)
+        self.assertEqual(titles[1], "2 sim_<2>: RUN 20.0%")
+
+        # the file is only rewritten when the content changes
+        os.remove(fn)
+        callback.run()
+        self.assertFalse(os.path.exists(fn))
+        self.sims[2].t = 5
+        callback.run()
+        self.assertIn("RUN 50.0%", open(fn).read())
+
+    def test_write_html(self):
+        fn = os.path.join(self.tmp_dir, "status.html")
+        StatusGridCallback(container=FakeContainer(self.sims), file=fn, refresh=0).run()
+        with open(fn) as f:
+            content = f.read()
+        self.assertIn("ERROR: 1", content)
+        self.assertNotIn("refresh", content)
@@ -0,0 +1,35 @@
+from SiMon.supervisor import Supervisor
+from SiMon import utilities
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.supervisor = Supervisor()
+
+    def tearDown(self):
+        self.supervisor.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_launch_and_reap(self):
+        pid = self.supervisor.launch("sleep 0.2", self.tmp_dir)
+        with open(os.path.join(self.tmp_dir, ".process.pid")) as f_pid:
+            self.assertEqual(int(f_pid.read()), pid)
+        self.assertTrue(self.supervisor.is_running(pid))
+        self.assertIsNone(self.supervisor.is_running(os.getpid()))
+        start_time = utilities.get_process_start_time(pid)
+
+        # the exit wakes up the supervisor long before the timeout
+        exited_dirs = []
+        for _ in range(10):
+            exited_dirs = self.supervisor.wait(10)
+            if len(exited_dirs) > 0:
+                break
+        self.assertEqual(exited_dirs, [self.tmp_dir])
+        self.assertIsNone(self.supervisor.is_running(pid))
+        with self.assertRaises(OSError):
+            utilities.check_pid(pid, start_time=start_time)
@@ -0,0 +1,144 @@
+from SiMon import utilities
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestLastLineReader(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.tmp_dir, "output.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, text, mode="a"):
+        with open(self.fn, mode) as f:
+            f.write(text)
+        # make sure that the modification is visible even on coarse timestamps
+        st = os.stat(self.fn)
+        os.utime(self.fn, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+
+    def test_read_last_line(self):
+        reader = utilities.LastLineReader(block_size=4)
+        self.assertIsNone(reader.read(self.fn))
+        self.write("", mode="w")
+        self.assertEqual(reader.read(self.fn), "")
+        self.write("1.0, 2.0\n")
+        self.assertEqual(reader.read(self.fn), "1.0, 2.0")
+        self.write("3.0, 4.0\n5.0, 6")
+        self.assertEqual(reader.read(self.fn), "5.0, 6")
+        self.write(".0\n")
+        self.assertEqual(reader.read(self.fn), "5.0, 6.0")
+        # rewritten from scratch
+        self.write("a much longer line than before\n", mode="w")
+        self.assertEqual(reader.read(self.fn), "a much longer line than before")
+        self.write("\n")
+        self.assertEqual(reader.read(self.fn), "")
+
+    def test_unchanged_file_is_not_read(self):
+        reader = utilities.LastLineReader()
+        self.write("7.0, 8.0\n", mode="w")
+        self.assertEqual(reader.read(self.fn), "7.0, 8.0")
+        reader.last_line = "cached"
+        self.assertEqual(reader.read(self.fn), "cached")
+
+
+class TestConfigCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.tmp_dir, "SiMon.conf")
+        utilities.update_config_file(self.fn, {"T_end": 10, "Niceness": 0}, section="Simulation")
+
+    def tearDown(self):
+        utilities.invalidate_config_cache()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_cached_config(self):
+        conf = utilities.parse_config_file(self.fn, section="Simulation")
+        self.assertEqual(conf["T_end"], 10)
+        # the caller may modify the returned config without affecting the cache
+        conf["T_end"] = 20
+        self.assertEqual(utilities.parse_config_file(self.fn, section="Simulation")["T_end"], 10)
+        self.assertIn("Simulation", utilities.parse_config_file(self.fn))
+
+    def test_update_invalidates_cache(self):
+        utilities.parse_config_file(self.fn, section="Simulation")
+        st = os.stat(self.fn)
+        utilities.update_config_file(self.fn, {"T_end": 30, "Niceness": 0}, section="Simulation")
+        # even if the file signature happens to be unchanged, the write is visible
+        os.utime(self.fn, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertEqual(utilities.parse_config_file(self.fn, section="Simulation")["T_end"], 30)
+
+    def test_missing_config(self):
+        self.assertIsNone(utilities.parse_config_file(os.path.join(self.tmp_dir, "missing.conf")))
+
+
+class TestProgressHistory(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.tmp_dir, ".simon_progress")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_rate_and_eta(self):
+        history = utilities.ProgressHistory(self.fn, capacity=4)
+        self.assertIsNone(history.get_rate())
+        for i in range(10):
+            history.add(100.0 + i, 2.0 * i)
+            history.add(100.5 + i, 2.0 * i)  # unchanged model time, not recorded
+        self.assertEqual(history.count, 4)
+        self.assertAlmostEqual(history.get_rate(), 2.0)
+        self.assertAlmostEqual(history.get_eta(28.0), 5.0)
+        self.assertAlmostEqual(history.get_last_update(), 109.0)
+        self.assertAlmostEqual(history.get_max_interval(), 1.0)
+        # the history survives a restart of the daemon, and the file stays bounded
+        reloaded = utilities.ProgressHistory(self.fn, capacity=4)
+        self.assertAlmostEqual(reloaded.get_rate(), 2.0)
+        self.assertLessEqual(os.path.getsize(self.fn), 4 * 4 * utilities.ProgressHistory.RECORD.size)
+
+    def test_model_time_decreases(self):
+        history = utilities.ProgressHistory(self.fn, capacity=4)
+        history.add(0.0, 5.0)
+        history.add(1.0, 6.0)
+        history.add(2.0, 1.0)
+        self.assertEqual(history.count, 1)
+        self.assertIsNone(history.get_eta(10.0))
+
+
+class TestCheckpointArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_compress_roundtrip(self):
+        src = os.path.join(self.tmp_dir, "restart.bin")
+        data = os.urandom(1000) * 300
+        with open(src, "wb") as f:
+            f.write(data)
+        dst = os.path.join(self.tmp_dir, "restart.tmp.1.gz")
+        utilities.compress_file(src, dst, "gzip", chunk_size=4096)
+        self.assertLess(os.path.getsize(dst), len(data))
+        utilities.decompress_file(dst, os.path.join(self.tmp_dir, "restored.bin"), chunk_size=4096)
+        with open(os.path.join(self.tmp_dir, "restored.bin"), "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_tiered_retention(self):
+        hour, day = 3600, 86400
+        now = 10 * day
+        # every 20 minutes over the last three days
+        timestamps = [now - i * 1200 for i in range(3 * 72)]
+        tiers = [(hour, 0), (day, hour), (0, day)]
+        keep = utilities.select_retained(timestamps, now, tiers)
+        kept = [timestamps[i] for i in keep]
+        self.assertEqual(len([t for t in kept if now - t <= hour]), 4)
+        self.assertEqual(len([t for t in kept if hour < now - t <= day]), 23)
+        self.assertEqual(len([t for t in kept if now - t > day]), 2)
+        self.assertIn(now, kept)
+        # applying the policy again later does not delete more than the aging requires
+        later = utilities.select_retained(kept, now + 60, tiers)
+        self.assertEqual(len(later), len(kept))
@@ -0,0 +1,43 @@
+from SiMon.simulation import Simulation
+from SiMon.simulation_container import SimulationContainer
+from SiMon.visualization import VisualizationCallback
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+
+class FakeContainer(object):
+    def __init__(self, sim_inst_dict):
+        self.sim_inst_dict = sim_inst_dict
+
+    def get_status_table(self):
+        return SimulationContainer.make_status_rows(
+            [sim for sim_id, sim in sorted(self.sim_inst_dict.items()) if sim_id > 0]
+        )
+
+
+class TestVisualizationCallback(unittest.TestCase):
+    def setUp(self):
+        self.plot_dir = tempfile.mkdtemp()
+        fields = dict(parent_id=0, t_min=0, mtime=0, niceness=0)
+        self.sims = {0: mock.Mock(id=0, level=0, status=Simulation.STATUS_NEW, t=0, t_max=0, **fields)}
+        for i in range(1, 6):
+            self.sims[i] = mock.Mock(id=i, level=1, status=Simulation.STATUS_RUN, t=i, t_max=10.0, **fields)
+        self.callback = VisualizationCallback(container=FakeContainer(self.sims), plot_dir=self.plot_dir, max_plots=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.plot_dir)
+
+    def test_render_on_change(self):
+        with mock.patch("SiMon.visualization.datetime") as fake_datetime:
+            for i in range(4):
+                fake_datetime.now.return_value.strftime.return_value = "01_01_2024-00_00_%02d" % i
+                self.callback.run()
+                self.callback.run()  # unchanged, not rendered again
+                self.sims[1].t += 1
+        # the figure is reused, and only the newest plots are kept
+        self.assertEqual(sorted(os.listdir(self.plot_dir)), ["01_01_2024-00_00_02.png", "01_01_2024-00_00_03.png"])
+        self.assertEqual(len(self.callback.annotations), 5)
+        self.assertEqual(len(self.callback.scatters[Simulation.STATUS_RUN].get_offsets()), 5)
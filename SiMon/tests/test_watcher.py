@@ -0,0 +1,56 @@
+from SiMon import watcher
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.sim_dir = tempfile.mkdtemp()
+        self.output_fn = os.path.join(self.sim_dir, "output.txt")
+        with open(self.output_fn, "w") as f:
+            f.write("0, 0\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.sim_dir)
+
+    def test_polling_watcher(self):
+        fs_watcher = watcher.PollingWatcher(poll_interval=0.01)
+        fs_watcher.watch(self.sim_dir, ["output.txt"], "restart*")
+        self.assertEqual(fs_watcher.poll(), set())
+        with open(self.output_fn, "a") as f:
+            f.write("1, 0\n")
+        self.assertEqual(fs_watcher.wait(1.0), set([self.sim_dir]))
+        self.assertEqual(fs_watcher.wait(0.05), set())
+        fs_watcher.close()
+
+    def test_inotify_watcher(self):
+        try:
+            fs_watcher = watcher.InotifyWatcher(settle_time=0.05)
+        except (OSError, AttributeError):
+            self.skipTest("inotify is not available")
+        try:
+            fs_watcher.watch(self.sim_dir, ["output.txt"], "restart*")
+            # closing a watched file after writing (IN_CLOSE_WRITE) maps to the simulation directory
+            with open(self.output_fn, "a") as f:
+                f.write("1, 0\n")
+            self.assertEqual(fs_watcher.wait(2.0), set([self.sim_dir]))
+            # other files and directories are filtered out
+            with open(os.path.join(self.sim_dir, "snapshot.dat"), "w") as f:
+                f.write("data")
+            os.mkdir(os.path.join(self.sim_dir, "snapshots"))
+            self.assertEqual(fs_watcher.wait(0.2), set())
+            # a new restart directory
+            os.mkdir(os.path.join(self.sim_dir, "restart1"))
+            self.assertEqual(fs_watcher.wait(2.0), set([self.sim_dir]))
+        finally:
+            fs_watcher.close()
+
+    def test_create_watcher_fallback(self):
+        self.assertIsInstance(watcher.create_watcher(poll_interval=1, use_inotify=False), watcher.PollingWatcher)
+        with mock.patch("SiMon.watcher.InotifyWatcher", side_effect=OSError(24, "Too many open files")):
+            fs_watcher = watcher.create_watcher(poll_interval=1)
+        self.assertIsInstance(fs_watcher, watcher.PollingWatcher)
+        self.assertEqual(fs_watcher.poll_interval, 1)
@@ -6,8 +6,17 @@ import sys
 import os 
 import glob 
 import logging 
+import copy
+import math
+import array
+import shutil
+import hashlib
+import json
+import struct
 import toml 
+import threading
 import configparser as cp 
+from collections import OrderedDict
 from SiMon import config
 
 config_file_template = """# Global config file for SiMon
@@ -61,6 +70,33 @@ def progress_bar(val, val_max, val_min=0, prefix="", suffix="", bar_len=20):
         # return '[%s] %s%s %s\r' % (bar, percents, '%', suffix)
         return "%s [%s] %s\r" % (prefix, bar, suffix)
 
+def get_grid_shape(num_sim):
+    """
+    Find the shape of the grid on which the progress of the simulations is displayed.
+    :param num_sim: number of simulations
+    :return: the number of columns and rows of the grid
+    """
+    # Checks if num_sim has a square
+    if int(math.sqrt(num_sim) + 0.5) ** 2 == num_sim:
+        number = int(math.sqrt(num_sim))
+        y_num = num_sim // number
+
+    # If not square, find divisible number to get rectangle
+    else:
+        number = int(math.sqrt(num_sim))
+        while num_sim % number != 0:
+            number = number - 1
+        y_num = num_sim // number                               # Y-axis limit
+
+        # If prime number
+        if number == 1:
+            number = int(math.sqrt(num_sim)) + 1                # Make sure graph fits all num_sim
+            y_num = number
+            # 'Removes' extra white line if graph is too big
+            if (y_num * number) > num_sim and ((y_num - 1) * number) >= num_sim:
+                y_num = y_num - 1
+    return number, y_num
+
 def highlighted_text(text, color=None, bold=False):
     colors = ["red", "blue", "cyan", "green", "yellow", "purple", "white", "reset"]
     color_codes = ["\033[31m", "\033[34m", "\033[36m", "\033[32m", "\033[0;33m", "\033[0;35m", "\033[0;37m", "\033[0m"]
@@ -148,7 +184,24 @@ def generate_conf():
     except IOError:
         print("Unexpected error:", sys.exc_info()[0])
 
-def parse_config_file(config_file, section=None):
+# Process-wide cache of parsed config files: (path, section) => ((st_mtime_ns, st_size), parsed config)
+config_cache = OrderedDict()
+config_cache_lock = threading.Lock()
+config_cache_size = 4096  # the maximum number of cached entries (least recently used ones are evicted)
+
+def invalidate_config_cache(config_file=None):
+    """
+    Remove the cached content of `config_file` (all sections), or of all config files if `config_file` is None.
+    """
+    with config_cache_lock:
+        if config_file is None:
+            config_cache.clear()
+            return
+        path = os.path.abspath(config_file)
+        for key in [key for key in config_cache if key[0] == path]:
+            del config_cache[key]
+
+def parse_config_file(config_file, section=None, readonly=False):
     """
     Parse the configure file (SiMon.conf) for starting SiMon. The basic information of Simulation root directory
     must exist in the configure file before SiMon can start. A minimum configure file of SiMon looks like:
@@ -160,18 +213,38 @@ def parse_config_file(config_file, section=None):
 
     :return: return 0 if succeed, -1 if failed (file not exist, and cannot be created). If the file does not exist
     but a new file with default values is created, the method returns 1.
+
+    The parsed content is cached as long as the (st_mtime_ns, st_size) of the file does not change, so parsing an
+    unchanged config file costs only a stat. A copy is returned, so the caller may modify it.
+
+    :param readonly: Return the cached content itself instead of a copy. The caller must not modify it.
     """
     # conf = cp.ConfigParser()
-    if os.path.isfile(config_file):
+    try:
+        st = os.stat(config_file)
+    except OSError:
+        st = None
+    if st is not None and os.path.isfile(config_file):
+        key = (os.path.abspath(config_file), section)
+        file_signature = (st.st_mtime_ns, st.st_size)
+        with config_cache_lock:
+            cached = config_cache.get(key)
+            if cached is not None and cached[0] == file_signature:
+                config_cache.move_to_end(key)
+                return cached[1] if readonly else copy.deepcopy(cached[1])
         # conf.read(config_file)
         conf = toml.load(config_file)
         if section is not None:
             if section in conf:
-                return conf[section]
+                conf = conf[section]
             else:
                 raise ValueError('Section %s does not exist in config file %s.' % (section, config_file))
-        else:
-            return conf
+        with config_cache_lock:
+            config_cache[key] = (file_signature, conf if readonly else copy.deepcopy(conf))
+            config_cache.move_to_end(key)
+            while len(config_cache) > config_cache_size:
+                config_cache.popitem(last=False)
+        return conf
     else:
         # raise ValueError('Config file %s does not exist.' % (config_file))
         return None 
@@ -183,6 +256,16 @@ def update_config_file(config_file, config_dict, section=None):
         else:
             config_dict = {section: config_dict}
             toml.dump(config_dict, f)
+    invalidate_config_cache(config_file)
+
+def get_config_hash(config):
+    """
+    :return: A hash of a config dict, to tell whether it has changed (None for an empty config).
+    """
+    if not config:
+        return None
+    return hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+
 
 def print_help():
     print("Usage: python simon.py [start|stop|interactive|help]")
@@ -227,27 +310,472 @@ def print_task_selector():
 
     return opt
 
-def register_simon_modules(module_dir, user_shell_dir, module_pattern='module_*.py'):
-    """
-    Register modules
-    :return: A dict-like mapping between the name of the code and the filename of the module.
-    """
-    mod_dict = dict()
-    module_candidates = glob.glob(os.path.join(module_dir, module_pattern))
-    module_cwd = glob.glob(
-        os.path.join(user_shell_dir, module_pattern)
-    )  # load the modules also from cwd
-    for m_cwd in module_cwd:
-        module_candidates.append(m_cwd)
-    for mod_name in module_candidates:
-        sys.path.append(module_dir)
-        sys.path.append(os.getcwd())
-        mod_name = os.path.basename(mod_name)
-        mod = __import__(mod_name.split(".")[0])
-        if hasattr(mod, "__simulation__"):
-            # it is a valid SiMon module
-            mod_dict[mod.__simulation__] = mod_name.split(".")[0]
-    return mod_dict
+class LastLineReader(object):
+    """
+    Read the last line of a (growing) text file in-process, as ``tail -1`` would do. The file is read backwards from
+    its end in small blocks. The size, modification time and the offset of the last line are remembered, so that an
+    unchanged file is not read at all, and a file that has only been appended to is not read beyond the previous
+    last line.
+    """
+
+    __slots__ = ("block_size", "path", "size", "mtime_ns", "offset", "tail_bytes", "last_line")
+
+    def __init__(self, block_size=4096):
+        self.block_size = block_size
+        self.path = None
+        self.size = -1
+        self.mtime_ns = -1
+        self.offset = 0  # the offset of the beginning of the last line
+        self.tail_bytes = b""  # the raw content of the file from the offset to the end
+        self.last_line = None
+
+    def read(self, path):
+        """
+        :param path: The file to read.
+
+        :return: The last line (without the trailing newline), or None if the file does not exist.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if path == self.path and st.st_size == self.size and st.st_mtime_ns == self.mtime_ns:
+            return self.last_line
+        try:
+            with open(path, "rb") as f:
+                # if the file has only been appended to, its last line cannot start before the previous last line
+                lower = 0
+                if path == self.path and st.st_size > self.size:
+                    f.seek(self.offset)
+                    if f.read(len(self.tail_bytes)) == self.tail_bytes:
+                        lower = self.offset
+                end = st.st_size
+                # like `tail -1`, ignore the newline that terminates the file
+                if end > lower:
+                    f.seek(end - 1)
+                    if f.read(1) == b"\n":
+                        end -= 1
+                pos = end
+                line_start = lower
+                blocks = []
+                while pos > lower:
+                    read_size = min(self.block_size, pos - lower)
+                    pos -= read_size
+                    f.seek(pos)
+                    block = f.read(read_size)
+                    idx = block.rfind(b"\n")
+                    if idx >= 0:
+                        line_start = pos + idx + 1
+                        blocks.append(block[idx + 1:])
+                        break
+                    blocks.append(block)
+        except (IOError, OSError):
+            return None
+        line = b"".join(reversed(blocks))
+        self.path = path
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.offset = line_start
+        self.tail_bytes = line + b"\n" * (st.st_size - end)
+        self.last_line = line.decode("utf-8", errors="replace")
+        return self.last_line
+
+class ProgressHistory(object):
+    """
+    A bounded history of (wall time, model time) samples of a simulation, kept in a ring buffer and persisted in a
+    small binary file (16 bytes per sample, appended to as samples arrive), so that it survives restarts of the daemon.
+    A sample is only recorded when the model time changes.
+    """
+
+    RECORD = struct.Struct("<dd")
+
+    __slots__ = ("path", "capacity", "samples", "start", "count", "loaded", "n_persisted")
+
+    def __init__(self, path=None, capacity=64):
+        """
+        :param path: The file in which the samples are persisted (None: keep them in memory only).
+        :param capacity: The maximum number of samples kept.
+        """
+        self.path = path
+        self.capacity = capacity
+        # interleaved (wall time, model time) pairs, grown up to the capacity as samples arrive
+        self.samples = array.array("d")
+        self.start = 0  # the index of the oldest sample
+        self.count = 0
+        self.loaded = path is None
+        self.n_persisted = 0  # the number of records in the file
+
+    def load(self):
+        """
+        Load the most recent samples from the file (done once, before the history is first used).
+        """
+        self.loaded = True
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except (IOError, OSError):
+            return
+        n_records = len(data) // self.RECORD.size
+        self.n_persisted = n_records
+        for i in range(max(0, n_records - self.capacity), n_records):
+            self.push(*self.RECORD.unpack_from(data, i * self.RECORD.size))
+
+    def push(self, wall_time, model_time):
+        index = (self.start + self.count) % self.capacity
+        if self.count == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+        else:
+            self.count += 1
+        if 2 * index < len(self.samples):
+            self.samples[2 * index] = wall_time
+            self.samples[2 * index + 1] = model_time
+        else:
+            self.samples.append(wall_time)
+            self.samples.append(model_time)
+
+    def get(self, i):
+        """
+        :return: The i-th sample (wall time, model time), counted from the oldest one (negative: from the newest one).
+        """
+        index = (self.start + i % self.count) % self.capacity
+        return self.samples[2 * index], self.samples[2 * index + 1]
+
+    def add(self, wall_time, model_time):
+        """
+        Record a sample if the model time has changed since the last one. If the model time has decreased (e.g. the
+        simulation has been started again from scratch), the history is discarded.
+        """
+        if not self.loaded:
+            self.load()
+        model_time = float(model_time)
+        if self.count > 0:
+            last_model_time = self.get(-1)[1]
+            if model_time == last_model_time:
+                return
+            if model_time < last_model_time:
+                self.clear()
+        self.push(wall_time, model_time)
+        if self.path is not None:
+            try:
+                if self.n_persisted >= 4 * self.capacity:
+                    # compact the file, keeping only the samples in the buffer
+                    with open(self.path, "wb") as f:
+                        for i in range(self.count):
+                            f.write(self.RECORD.pack(*self.get(i)))
+                    self.n_persisted = self.count
+                else:
+                    with open(self.path, "ab") as f:
+                        f.write(self.RECORD.pack(wall_time, model_time))
+                    self.n_persisted += 1
+            except (IOError, OSError):
+                pass  # the history is still kept in memory
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+        if self.path is not None:
+            try:
+                open(self.path, "wb").close()
+            except (IOError, OSError):
+                pass
+            self.n_persisted = 0
+
+    def get_rate(self):
+        """
+        :return: The progress rate (model time per second of wall time) over the recorded history, or None if there are
+        not enough samples.
+        """
+        if not self.loaded:
+            self.load()
+        if self.count < 2:
+            return None
+        wall_first, model_first = self.get(0)
+        wall_last, model_last = self.get(-1)
+        if wall_last <= wall_first:
+            return None
+        return (model_last - model_first) / (wall_last - wall_first)
+
+    def get_last_update(self):
+        """
+        :return: The wall time at which the model time last changed, or None if there are no samples.
+        """
+        if not self.loaded:
+            self.load()
+        if self.count == 0:
+            return None
+        return self.get(-1)[0]
+
+    def get_max_interval(self):
+        """
+        :return: The longest wall time between two consecutive changes of the model time in the recorded history, or
+        None if there are fewer than two samples.
+        """
+        if not self.loaded:
+            self.load()
+        if self.count < 2:
+            return None
+        return max(self.get(i + 1)[0] - self.get(i)[0] for i in range(self.count - 1))
+
+    def get_eta(self, t_max):
+        """
+        :return: The estimated wall time (in seconds) until the model time reaches `t_max`, or None if it cannot be
+        estimated.
+        """
+        rate = self.get_rate()
+        if rate is None or rate <= 0:
+            return None
+        return max(t_max - self.get(-1)[1], 0.0) / rate
+
+def format_duration(seconds):
+    """
+    :return: A compact representation of a duration, e.g. '45s', '12m', '3h05m' or '2d04h'.
+    """
+    seconds = int(seconds)
+    if seconds < 60:
+        return "%ds" % seconds
+    if seconds < 3600:
+        return "%dm" % (seconds // 60)
+    if seconds < 86400:
+        return "%dh%02dm" % (seconds // 3600, seconds % 3600 // 60)
+    return "%dd%02dh" % (seconds // 86400, seconds % 86400 // 3600)
+
+FICLONE = 0x40049409  # the Linux ioctl to clone (reflink) a file on copy-on-write file systems (Btrfs, XFS)
+
+
+def _copy_file_clone(fsrc, fdst, size):
+    import fcntl
+    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def _copy_file_range(fsrc, fdst, size):
+    copied = 0
+    while copied < size:
+        n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - copied, copied, copied)
+        if n == 0:
+            break
+        copied += n
+
+
+def _copy_file_sendfile(fsrc, fdst, size):
+    copied = 0
+    while copied < size:
+        n = os.sendfile(fdst.fileno(), fsrc.fileno(), copied, size - copied)
+        if n == 0:
+            break
+        copied += n
+
+
+def copy_file(src, dst):
+    """
+    Copy a file in the kernel if possible: by cloning it (reflink) on copy-on-write file systems, otherwise with
+    copy_file_range() or sendfile(), and only as a last resort through user space. The copy is written to a temporary
+    file and renamed, so that `dst` is never left incomplete.
+
+    :return: The method used ('clone', 'copy_file_range', 'sendfile' or 'read').
+    """
+    tmp_fn = dst + ".tmp"
+    with open(src, "rb") as fsrc, open(tmp_fn, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        for method, func in (("clone", _copy_file_clone), ("copy_file_range", _copy_file_range),
+                             ("sendfile", _copy_file_sendfile)):
+            try:
+                func(fsrc, fdst, size)
+                break
+            except (AttributeError, ImportError, OSError):
+                # not supported here (e.g. different file systems or old kernel), start over with the next method
+                fdst.seek(0)
+                fdst.truncate()
+        else:
+            method = "read"
+            fsrc.seek(0)
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+    os.replace(tmp_fn, dst)
+    return method
+
+
+def file_signature(path, fast_hash=False, sample_size=1024 * 1024):
+    """
+    Get a cheap signature of a file to tell whether it has changed: its size and modification time, and optionally a
+    hash of three samples of the file (head, middle and tail), which catches rewrites that preserve the modification
+    time without reading the whole file.
+
+    :return: A dictionary with the keys 'size', 'mtime_ns' and (optionally) 'hash', or None if the file does not exist.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    sig = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if fast_hash:
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for offset in sorted({0, max(st.st_size // 2 - sample_size // 2, 0), max(st.st_size - sample_size, 0)}):
+                f.seek(offset)
+                h.update(f.read(sample_size))
+        sig["hash"] = h.hexdigest()
+    return sig
+
+
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def open_compressed(path, mode, compression):
+    """
+    Open a compressed file as a stream.
+
+    :param compression: 'gzip' or 'zstd' (the latter requires the zstandard package).
+    """
+    if compression == "zstd":
+        import zstandard
+        f = open(path, mode)
+        if "w" in mode:
+            return zstandard.ZstdCompressor(threads=-1).stream_writer(f, closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(f, closefd=True)
+    import gzip
+    return gzip.open(path, mode, compresslevel=6)
+
+
+def compress_file(src, dst, compression, chunk_size=4 * 1024 * 1024):
+    """
+    Compress a file in chunks of `chunk_size` bytes (the file is never loaded into memory as a whole). The compressed
+    file is written to a temporary file and renamed.
+    """
+    with open(src, "rb") as fsrc, open_compressed(dst + ".tmp", "wb", compression) as fdst:
+        shutil.copyfileobj(fsrc, fdst, chunk_size)
+    os.replace(dst + ".tmp", dst)
+
+
+def decompress_file(src, dst, chunk_size=4 * 1024 * 1024):
+    """
+    Decompress a file compressed by compress_file(), or copy it if it is not compressed (according to its suffix).
+    """
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if src.endswith(suffix):
+            with open_compressed(src, "rb", compression) as fsrc, open(dst + ".tmp", "wb") as fdst:
+                shutil.copyfileobj(fsrc, fdst, chunk_size)
+            os.replace(dst + ".tmp", dst)
+            return
+    copy_file(src, dst)
+
+
+def select_retained(timestamps, now, tiers):
+    """
+    Apply a time-tiered retention policy to a list of backups.
+
+    Each tier is a pair (max_age, spacing): among the backups younger than max_age seconds (0: no age limit) that are
+    not covered by a previous tier, only the first backup of each time bucket of `spacing` seconds is kept (0: all
+    are kept). Backups older than all the tiers are dropped. The newest backup is always kept. As the buckets are
+    aligned to absolute time, a backup that is kept keeps being kept as it ages into coarser tiers.
+
+    :param timestamps: The creation times of the backups.
+    :param now: The current time.
+    :param tiers: The list of (max_age, spacing) pairs, in the order of increasing age.
+    :return: The set of the indices of the backups to keep.
+    """
+    keep = set()
+    seen_buckets = set()
+    order = sorted(range(len(timestamps)), key=lambda i: timestamps[i])
+    for i in order:
+        age = now - timestamps[i]
+        for tier, (max_age, spacing) in enumerate(tiers):
+            if max_age <= 0 or age <= max_age:
+                if spacing <= 0:
+                    keep.add(i)
+                else:
+                    bucket = (tier, int(timestamps[i] // spacing))
+                    if bucket not in seen_buckets:
+                        seen_buckets.add(bucket)
+                        keep.add(i)
+                break
+    if len(order) > 0:
+        keep.add(order[-1])
+    return keep
+
+
+def read_proc_stat(pid):
+    """
+    :return: The fields of /proc/<pid>/stat following the command name (starting with the state), or None if procfs is
+    not available.
+    """
+    try:
+        with open("/proc/%d/stat" % pid) as f_stat:
+            # the command name is enclosed in parentheses and may contain spaces
+            return f_stat.read().rsplit(")", 1)[1].split()
+    except (IOError, IndexError):
+        return None
+
+def get_process_start_time(pid):
+    """
+    :return: The start time of the process (in clock ticks since boot), or None if it cannot be determined. Together
+    with the PID, it identifies a process even if the PID is reused later.
+    """
+    fields = read_proc_stat(pid)
+    if fields is None or len(fields) < 20:
+        return None
+    return int(fields[19])
+
+def check_pid(pid, start_time=None):
+    """
+    Check whether a process is running, like ``os.kill(pid, 0)``. A process that has exited but has not been reaped by
+    its parent yet (a zombie) is not considered running.
+
+    :param pid: The process ID.
+    :param start_time: The start time of the process as returned by get_process_start_time(). If given, a different
+    process that has been assigned the same PID is not considered running.
+
+    :raise OSError: If the process is not running.
+    """
+    os.kill(pid, 0)
+    fields = read_proc_stat(pid)
+    if fields is None:
+        return  # no procfs on this platform
+    if fields[0] in ("Z", "X"):
+        raise OSError("Process %d has exited" % pid)
+    if start_time is not None and len(fields) >= 20 and int(fields[19]) != start_time:
+        raise OSError("Process %d has exited, its PID has been reused" % pid)
+
+def get_system_load():
+    """
+    Read the load of the node from procfs (Linux only).
+
+    :return: A dictionary with the 1-minute load average per CPU ('load'), the fraction of the memory that is available
+    ('mem_available') and the pressure stall information, i.e. the percentage of the last 10 seconds in which some
+    tasks were stalled on the resource ('cpu_pressure', 'memory_pressure', 'io_pressure'). Values that cannot be
+    determined are None.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    system_load = dict()
+    try:
+        with open("/proc/loadavg") as f_load:
+            system_load['load'] = float(f_load.read().split()[0]) / cpus
+    except (IOError, ValueError, IndexError):
+        system_load['load'] = None
+
+    system_load['mem_available'] = None
+    try:
+        meminfo = dict()
+        with open("/proc/meminfo") as f_mem:
+            for line in f_mem:
+                key, value = line.split(":", 1)
+                meminfo[key] = float(value.split()[0])
+        system_load['mem_available'] = meminfo['MemAvailable'] / meminfo['MemTotal']
+    except (IOError, ValueError, KeyError, ZeroDivisionError):
+        pass
+
+    for resource in ("cpu", "memory", "io"):
+        system_load['%s_pressure' % resource] = None
+        try:
+            with open("/proc/pressure/%s" % resource) as f_psi:
+                for line in f_psi:
+                    fields = line.split()
+                    if fields[0] == "some":
+                        system_load['%s_pressure' % resource] = float(fields[1].split("=")[1])
+        except (IOError, ValueError, IndexError):
+            pass
+    return system_load
 
 def get_logger(log_level='INFO', log_dir=None, log_file='SiMon.log'):    
     if config.current_config is not None:
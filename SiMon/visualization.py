@@ -1,16 +1,19 @@
 import os
+import glob
 import matplotlib
 matplotlib.use('Agg')
 
 import matplotlib.pyplot as plt
 import numpy as np
 import math
+from collections import deque
 from datetime import datetime
 from matplotlib.colors import ListedColormap, BoundaryNorm
 from matplotlib.collections import LineCollection
 from matplotlib import cm
 from SiMon.simulation import Simulation
 from SiMon.callback import Callback
+from SiMon import utilities
 from matplotlib.ticker import MaxNLocator
 import time
 
@@ -18,105 +21,113 @@ import time
 
 class VisualizationCallback(Callback):
 
+    PLOT_NAME_FORMAT = "%d_%m_%Y-%H_%M_%S"  # the file name of the plots (strftime format)
+
     def __init__(self, **kwargs) -> None:
         super().__init__(**kwargs)
+        self.fig = None  # the figure is created once and updated in place
+        self.ax = None
+        self.scatters = []  # one scatter artist per status
+        self.annotations = []
+        self.grid_shape = None
+        self.last_ids = None  # the simulations shown in the last plot
+        self.last_status = None
+        self.last_progresses = None
+        self.saved_plots = None  # the plots written so far (oldest first), loaded from the plot directory on demand
 
     def run(self):
         self.plot_progress()
 
+    def create_figure(self):
+        symbols = ['o', 's', '>',  '^', '*',  'x']
+        self.fig = plt.figure(figsize=(12, 12))
+        self.ax = self.fig.gca()
+        self.ax.xaxis.tick_top()                                     # move the X-Axis
+        self.ax.yaxis.set_major_locator(MaxNLocator(integer=True))   # set to integers
+        self.ax.yaxis.tick_left()                                    # remove right y-Ticks
+        self.scatters = [
+            self.ax.scatter(
+                [], [],
+                marker=symbol,
+                s=500,
+                c=[],
+                cmap=cm.RdYlBu,
+                vmin=0., vmax=1.,
+                label=Simulation.STATUS_LABEL[i])
+            for i, symbol in enumerate(symbols)
+        ]
+        self.fig.colorbar(self.scatters[0], ax=self.ax)
+
+    def update_layout(self, sim_ids, num_sim):
+        """
+        Place the simulations on the grid, and annotate them with their IDs.
+
+        :return: The x and y coordinates of the simulations.
+        """
+        grid_shape = utilities.get_grid_shape(num_sim)
+        number, y_num = grid_shape
+        x_sim = sim_ids % number
+        y_sim = sim_ids // number
+        if grid_shape != self.grid_shape:
+            self.grid_shape = grid_shape
+            self.ax.set_xlim(-0.5, number - 0.5)
+            self.ax.set_ylim(y_num - 0.5, -0.5)                      # inverted axis
+        if self.last_ids is None or not np.array_equal(sim_ids, self.last_ids):
+            for annotation in self.annotations:
+                annotation.remove()
+            self.annotations = [
+                self.ax.annotate(
+                    text=str(sim_id),
+                    xy=(x, y),
+                    color='black',
+                    weight='bold',
+                    size=15
+                )
+                for sim_id, x, y in zip(sim_ids, x_sim, y_sim)
+            ]
+        return x_sim, y_sim
+
     def plot_progress(self):
         """
-        Creates a graph showing the progress of the simulations
-        :param num_sim: number of simulations
+        Creates a graph showing the progress of the simulations. The status collected in the last scheduling cycle is
+        used, and the graph is only rendered again when the status or the progress of a simulation has changed.
         :return:
         """
         if 'container' in self.kwargs:
-            sim_inst_dict = self.kwargs['container'].sim_inst_dict
-        else:
-            return 
-        
-        num_sim = len(sim_inst_dict)
-        status = np.array([])
-        progresses = np.array([])
-        sim_idx = np.array([])
-        for i, sim_name in enumerate(sim_inst_dict):
-            sim = sim_inst_dict[sim_name]
-            sim_id = sim.id 
-            if sim_id == 0:
-                continue # skip the root simulation instance, which is only a place holder
-            
-            # only plot level=1 simulations
-            if sim.level > 1:
-                continue
-
-            s = sim.sim_get_status()
-            if sim.t_max > 0:
-                p = sim.t / sim.t_max
-            else:
-                p = 0.0
-            status = np.append(s, status)
-            progresses = np.append(p, progresses)
-            sim_idx = np.append(sim_id, sim_idx)
-
-        # Checks if num_sim has a square
-        if int(math.sqrt(num_sim) + 0.5) ** 2 == num_sim:
-            number = int(math.sqrt(num_sim))
-            y_num = num_sim // number
-
-        # If not square, find divisible number to get rectangle
+            table = self.kwargs['container'].get_status_table()
         else:
-            number = int(math.sqrt(num_sim))
-            while num_sim % number != 0:
-                number = number - 1
-            y_num = num_sim // number                               # Y-axis limit
-
-            # If prime number
-            if number == 1:
-                number = int(math.sqrt(num_sim)) + 1                # Make sure graph fits all num_sim
-                y_num = number
-                # 'Removes' extra white line if graph is too big
-                if (y_num * number) > num_sim and ((y_num - 1) * number) >= num_sim:
-                    y_num = y_num - 1
-
-        x_sim = sim_idx % number
-        y_sim = sim_idx // number
-
-        plt.figure(1, figsize=(12, 12))
-        ax = plt.gca()                                          # get the axis
-        ax.set_ylim(ax.get_ylim()[::-1])                        # invert the axis
-        ax.xaxis.tick_top()                                     # and move the X-Axis
-        ax.yaxis.set_ticks(np.arange(-0.5, y_num))              # set y-ticks
-        ax.yaxis.set_major_locator(MaxNLocator(integer=True))   # set to integers
-        ax.yaxis.tick_left()                                    # remove right y-Ticks
-
-        symbols = ['o', 's', '>',  '^', '*',  'x']
-        labels = ['NEW', 'STOP', 'RUN', 'STALL', 'DONE', 'ERROR']
-
-        
-        for i, symbol in enumerate(symbols):
-            if (status == i).sum() == 0:
-                continue
-            else:
-                plt.scatter(
-                    x_sim[status == i],
-                    y_sim[status == i],
-                    marker=symbol,
-                    s=500,
-                    c=progresses[status == i],
-                    cmap=cm.RdYlBu,
-                    vmin = 0., vmax = 1.,
-                    label=labels[i])
-
-        for i in range(sim_idx.shape[0]):
-            plt.annotate(
-                text=str(sim_inst_dict[i].id),
-                xy=(x_sim[i], y_sim[i]),
-                color='black',
-                weight='bold',
-                size=15
-            )
-
-        plt.legend(
+            return
+
+        num_sim = len(table) + 1  # including the root simulation instance
+        # only plot level=1 simulations (the root simulation instance is only a place holder)
+        sims = table[table['level'] <= 1]
+        sim_ids = sims['id']
+        status = sims['status'].astype(np.int64)
+        progresses = np.divide(sims['t'], sims['t_max'], out=np.zeros(len(sims)), where=sims['t_max'] > 0)
+        if (
+            self.last_ids is not None
+            and np.array_equal(sim_ids, self.last_ids)
+            and np.array_equal(status, self.last_status)
+            and np.array_equal(progresses, self.last_progresses)
+        ):
+            return  # nothing has changed since the last plot
+        if len(sim_ids) == 0:
+            return
+
+        if self.fig is None:
+            self.create_figure()
+        x_sim, y_sim = self.update_layout(sim_ids, num_sim)
+        self.last_ids, self.last_status, self.last_progresses = sim_ids, status, progresses
+
+        for i, scatter in enumerate(self.scatters):
+            selected = status == i
+            scatter.set_offsets(np.column_stack((x_sim[selected], y_sim[selected])))
+            scatter.set_array(progresses[selected])
+
+        if self.ax.get_legend() is not None:
+            self.ax.get_legend().remove()
+        self.ax.legend(
+            handles=[scatter for i, scatter in enumerate(self.scatters) if (status == i).any()],
             bbox_to_anchor=(0., -.15, 1., .102),
             loc='lower center',
             ncol=4,
@@ -126,13 +137,6 @@ class VisualizationCallback(Callback):
             labelspacing=3
         )
 
-        plt.colorbar()
-
-        # # Save file with a new name
-        # if os.path.exists('progress.pdf'):
-        #     plt.savefig('progress_{}.pdf'.format(int(time.time())))
-        # else:
-        #     print('saving figure')
         if 'plot_dir' in self.kwargs:
             plot_dir = self.kwargs['plot_dir']
         else:
@@ -141,12 +145,40 @@ class VisualizationCallback(Callback):
         if not os.path.isdir(plot_dir):
             os.mkdir(plot_dir)
 
-        fn = datetime.now().strftime("%d_%m_%Y-%H_%M_%S")
+        fn = datetime.now().strftime(VisualizationCallback.PLOT_NAME_FORMAT)
         if 'format' in self.kwargs:
             fmt = self.kwargs['format']
         else:
             fmt = 'png'
         fullpath = os.path.join(plot_dir, '%s.%s' % (fn, fmt))
         print('Progress plot saved on %s' % fullpath)
-        plt.savefig(fullpath)
-        plt.close(1)
\ No newline at end of file
+        self.fig.savefig(fullpath)
+        self.prune_plots(plot_dir, fmt, fullpath)
+
+    def prune_plots(self, plot_dir, fmt, fullpath):
+        """
+        Delete the oldest plots, so that at most `max_plots` of them are kept (all of them if `max_plots` is 0).
+        """
+        max_plots = self.kwargs.get('max_plots', 10)
+        if self.saved_plots is None:
+            # the plots written by earlier runs of the daemon, oldest first
+            existing = glob.glob(os.path.join(plot_dir, '*.%s' % fmt))
+            self.saved_plots = deque(sorted(
+                (fn for fn in existing if self.is_plot_file(fn)), key=os.path.getmtime
+            ))
+        if fullpath in self.saved_plots:
+            self.saved_plots.remove(fullpath)  # overwritten within the same second
+        self.saved_plots.append(fullpath)
+        while 0 < max_plots < len(self.saved_plots):
+            try:
+                os.remove(self.saved_plots.popleft())
+            except OSError:
+                pass
+
+    @staticmethod
+    def is_plot_file(fn):
+        try:
+            datetime.strptime(os.path.splitext(os.path.basename(fn))[0], VisualizationCallback.PLOT_NAME_FORMAT)
+            return True
+        except ValueError:
+            return False
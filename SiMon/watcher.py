@@ -0,0 +1,236 @@
+"""
+File system watchers used by the event-driven daemon loop.
+
+A watcher observes the simulation directories and reports which of them have seen a relevant change (a new PID
+file, the output file being closed by an exiting process, STOP/ERROR markers, new restart directories, ...), so that
+only the affected simulations need to be re-evaluated.
+"""
+
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from fnmatch import fnmatch
+from SiMon import utilities
+
+# inotify event masks (see inotify(7))
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class PollingWatcher(object):
+    """
+    Fallback watcher for platforms or file systems without inotify (e.g. NFS/Lustre mounts). The watched directories
+    are polled every `poll_interval` seconds; a change of the directory entries, of any watched file or of the
+    liveness of the process recorded in the PID file marks the directory as changed.
+    """
+
+    def __init__(self, poll_interval=5.0) -> None:
+        self.poll_interval = poll_interval
+        self.watches = dict()  # path => (filenames, subdir_pattern)
+        self.signatures = dict()  # path => signature at the last poll
+
+    def watch(self, path, filenames=(), subdir_pattern=None):
+        if path not in self.watches:
+            self.signatures[path] = self.get_signature(path, filenames)
+        self.watches[path] = (tuple(filenames), subdir_pattern)
+
+    def unwatch(self, path):
+        self.watches.pop(path, None)
+        self.signatures.pop(path, None)
+
+    def watched_paths(self):
+        return set(self.watches)
+
+    @staticmethod
+    def get_signature(path, filenames):
+        signature = []
+        for fn in (path,) + tuple(os.path.join(path, fn) for fn in filenames):
+            try:
+                st = os.stat(fn)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        # a process that exits does not necessarily leave a trace on the file system
+        try:
+            with open(os.path.join(path, ".process.pid")) as f_pid:
+                pid = int(f_pid.readline().strip())
+            utilities.check_pid(pid)
+            signature.append(True)
+        except (OSError, ValueError):
+            signature.append(False)
+        return tuple(signature)
+
+    def poll(self):
+        changed_dirs = set()
+        for path, (filenames, _) in list(self.watches.items()):
+            signature = self.get_signature(path, filenames)
+            if signature != self.signatures.get(path):
+                self.signatures[path] = signature
+                changed_dirs.add(path)
+        return changed_dirs
+
+    def wait(self, timeout, wakeup_fds=()):
+        """
+        Block until at least one watched directory has changed, or until `timeout` seconds have passed.
+
+        :param wakeup_fds: Additional file descriptors (or objects with a fileno() method) which end the wait as soon
+        as they become readable.
+
+        :return: A set with the paths of the changed directories (empty on timeout), or None if changes may have been
+        missed and a full scan is needed.
+        """
+        deadline = time.time() + max(timeout, 0)
+        while True:
+            changed_dirs = self.poll()
+            remaining = deadline - time.time()
+            if len(changed_dirs) > 0 or remaining <= 0:
+                return changed_dirs
+            readable, _, _ = select.select(list(wakeup_fds), [], [], min(self.poll_interval, remaining))
+            if len(readable) > 0:
+                return self.poll()
+
+    def close(self):
+        self.watches.clear()
+        self.signatures.clear()
+
+
+class InotifyWatcher(object):
+    """
+    Watcher based on the Linux inotify API (accessed through ctypes, no third-party package is needed).
+    """
+
+    def __init__(self, settle_time=0.5) -> None:
+        libc_name = ctypes.util.find_library("c")
+        self.libc = ctypes.CDLL(libc_name or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.settle_time = settle_time  # coalesce bursts of events within this period (in seconds)
+        self.watches = dict()  # path => (wd, filenames, subdir_pattern)
+        self.wd_paths = dict()  # wd => path
+
+    def watch(self, path, filenames=(), subdir_pattern=None):
+        if path in self.watches:
+            wd = self.watches[path][0]
+        else:
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                raise OSError(err, "Cannot watch %s: %s" % (path, os.strerror(err)))
+            self.wd_paths[wd] = path
+        self.watches[path] = (wd, tuple(filenames), subdir_pattern)
+
+    def unwatch(self, path):
+        if path in self.watches:
+            wd = self.watches.pop(path)[0]
+            self.wd_paths.pop(wd, None)
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def watched_paths(self):
+        return set(self.watches)
+
+    def fileno(self):
+        return self.fd
+
+    def read_events(self):
+        """
+        Read and filter all pending events.
+
+        :return: The set of changed directories, or None if the kernel event queue has overflown.
+        """
+        changed_dirs = set()
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except OSError as err:
+                if err.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return changed_dirs
+                raise
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _, name_len = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(buf[offset:offset + name_len].rstrip(b"\0"))
+                offset += name_len
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                path = self.wd_paths.get(wd)
+                if path is None:
+                    continue
+                if mask & (IN_IGNORED | IN_DELETE_SELF):
+                    # the directory itself is gone
+                    self.watches.pop(path, None)
+                    self.wd_paths.pop(wd, None)
+                    changed_dirs.add(path)
+                    continue
+                _, filenames, subdir_pattern = self.watches[path]
+                if mask & IN_ISDIR:
+                    if subdir_pattern is not None and fnmatch(name, subdir_pattern):
+                        changed_dirs.add(path)
+                elif name in filenames:
+                    changed_dirs.add(path)
+
+    def wait(self, timeout, wakeup_fds=()):
+        """
+        Block until at least one watched directory has changed, or until `timeout` seconds have passed.
+
+        :param wakeup_fds: Additional file descriptors (or objects with a fileno() method) which end the wait as soon
+        as they become readable.
+
+        :return: A set with the paths of the changed directories (empty on timeout), or None if changes may have been
+        missed and a full scan is needed.
+        """
+        deadline = time.time() + max(timeout, 0)
+        changed_dirs = set()
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return changed_dirs
+            readable, _, _ = select.select([self.fd] + list(wakeup_fds), [], [], remaining)
+            if len(readable) == 0:
+                return changed_dirs
+            if self.fd not in readable:
+                return changed_dirs
+            new_dirs = self.read_events()
+            if new_dirs is None:
+                return None
+            changed_dirs |= new_dirs
+            if len(changed_dirs) > 0:
+                # give related events (e.g. a new restart directory and its PID file) the chance to arrive together
+                deadline = min(deadline, time.time() + self.settle_time)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        self.watches.clear()
+        self.wd_paths.clear()
+
+
+def create_watcher(poll_interval=5.0, use_inotify=True):
+    """
+    Create the best watcher available on this platform: inotify if possible, polling otherwise.
+    """
+    if use_inotify:
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError):
+            # no inotify support (not Linux, or the inotify instance limit is reached)
+            pass
+    return PollingWatcher(poll_interval=poll_interval)